@@ -0,0 +1,344 @@
+"""Admission control for chat and upload requests.
+
+Every client (or conversation) has two token buckets: one for requests and
+one for estimated model tokens (prompt plus the completion allowance).
+An optional global token bucket models the deployment's whole TPM quota.
+A request that finds its buckets empty waits in a bounded queue; waiting
+clients are served round-robin, so one busy script cannot hold the queue
+or the global quota while others wait. When the queue is full, or the
+wait would exceed the limit, the request is rejected straight away with
+a Retry-After hint.
+
+Buckets are kept in memory for a single process, or in the shared SQLite
+state database so that limits hold across all worker processes. Either
+way the controller takes tokens through the buckets' async take(); the
+SQLite buckets run their transaction in a worker thread, so a worker
+waiting on another worker's write lock never blocks its event loop.
+"""
+import asyncio
+import time
+from collections import OrderedDict, deque
+from contextlib import closing
+from typing import Deque, Dict, List, Optional, Tuple
+
+from starlette.requests import Request
+
+from .config import settings
+from .counters import connect_shared, init_shared_db
+from .metrics import ADMISSION_DECISIONS, ADMISSION_QUEUE_DEPTH, ADMISSION_WAIT_SECONDS
+
+# (bucket name, capacity, refill per second, cost)
+Cost = Tuple[str, float, float, float]
+
+
+class AdmissionRejected(Exception):
+    """The request was not admitted; the client should retry after retry_after seconds"""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def _refill(level: float, updated_at: float, capacity: float, rate: float, now: float) -> float:
+    return min(capacity, level + (now - updated_at) * rate)
+
+
+def _plan(levels: Dict[str, float], costs: List[Cost]) -> float:
+    """Seconds until every bucket can pay its cost, 0 if all can now"""
+    wait = 0.0
+    for name, capacity, rate, cost in costs:
+        # A cost above capacity could never be paid; it takes the whole bucket instead
+        shortfall = min(cost, capacity) - levels[name]
+        if shortfall > 0:
+            wait = max(wait, shortfall / rate)
+    return wait
+
+
+class MemoryBuckets:
+    """Token buckets for one process"""
+
+    def __init__(self, max_buckets: int = 100_000):
+        self.max_buckets = max_buckets
+        # name -> [level, updated_at, full_at]
+        self._buckets: Dict[str, List[float]] = {}
+
+    def acquire(self, costs: List[Cost]) -> float:
+        """Take every cost atomically and return 0, or return the seconds to wait and take nothing"""
+        now = time.monotonic()
+        levels = {}
+        for name, capacity, rate, _ in costs:
+            state = self._buckets.get(name)
+            levels[name] = capacity if state is None else _refill(state[0], state[1], capacity, rate, now)
+        wait = _plan(levels, costs)
+        if wait > 0:
+            return wait
+
+        for name, capacity, rate, cost in costs:
+            level = levels[name] - min(cost, capacity)
+            self._buckets[name] = [level, now, now + (capacity - level) / rate]
+        if len(self._buckets) > self.max_buckets:
+            self._prune(now)
+        return 0.0
+
+    def refund(self, costs: List[Cost]):
+        """Give back costs taken by acquire() for a request that did not go ahead"""
+        now = time.monotonic()
+        for name, capacity, rate, cost in costs:
+            state = self._buckets.get(name)
+            if state is None:
+                # Refilled completely and pruned since
+                continue
+            level = min(capacity, _refill(state[0], state[1], capacity, rate, now) + min(cost, capacity))
+            self._buckets[name] = [level, now, now + (capacity - level) / rate]
+
+    def _prune(self, now: float):
+        # Buckets that have refilled completely are the same as absent ones
+        for name in [name for name, state in self._buckets.items() if state[2] <= now]:
+            del self._buckets[name]
+
+    async def take(self, costs: List[Cost]) -> float:
+        """acquire() for the event loop; in-memory buckets never block"""
+        return self.acquire(costs)
+
+    async def give_back(self, costs: List[Cost]):
+        """refund() for the event loop"""
+        self.refund(costs)
+
+
+class SQLiteBuckets:
+    """Token buckets in the shared state database, consistent across worker processes"""
+
+    def __init__(self, path: str):
+        self.path = path
+        init_shared_db(path)
+        with closing(connect_shared(path)) as conn, conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS token_buckets ("
+                "name TEXT PRIMARY KEY, level REAL NOT NULL, updated_at REAL NOT NULL, full_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS token_buckets_full ON token_buckets(full_at)")
+        self._acquires = 0
+
+    def acquire(self, costs: List[Cost]) -> float:
+        # Wall-clock time, since the rows are shared with other processes
+        now = time.time()
+        names = [name for name, _, _, _ in costs]
+        with closing(connect_shared(self.path)) as conn, conn:
+            # Take the write lock before reading, so two workers never spend the same tokens
+            conn.execute("BEGIN IMMEDIATE")
+            rows = conn.execute(
+                f"SELECT name, level, updated_at FROM token_buckets WHERE name IN ({','.join('?' * len(names))})",
+                names
+            ).fetchall()
+            stored = {name: (level, updated_at) for name, level, updated_at in rows}
+            levels = {
+                name: _refill(*stored[name], capacity, rate, now) if name in stored else capacity
+                for name, capacity, rate, _ in costs
+            }
+            wait = _plan(levels, costs)
+            if wait > 0:
+                return wait
+
+            updates = []
+            for name, capacity, rate, cost in costs:
+                level = levels[name] - min(cost, capacity)
+                updates.append((name, level, now, now + (capacity - level) / rate))
+            conn.executemany(
+                "INSERT INTO token_buckets (name, level, updated_at, full_at) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(name) DO UPDATE SET level = excluded.level, "
+                "updated_at = excluded.updated_at, full_at = excluded.full_at",
+                updates
+            )
+            self._acquires += 1
+            if self._acquires % 1000 == 0:
+                conn.execute("DELETE FROM token_buckets WHERE full_at <= ?", (now,))
+        return 0.0
+
+    def refund(self, costs: List[Cost]):
+        """Give back costs taken by acquire() for a request that did not go ahead"""
+        now = time.time()
+        with closing(connect_shared(self.path)) as conn, conn:
+            conn.execute("BEGIN IMMEDIATE")
+            for name, capacity, rate, cost in costs:
+                row = conn.execute("SELECT level, updated_at FROM token_buckets WHERE name = ?", (name,)).fetchone()
+                if row is None:
+                    continue
+                level = min(capacity, _refill(*row, capacity, rate, now) + min(cost, capacity))
+                conn.execute(
+                    "UPDATE token_buckets SET level = ?, updated_at = ?, full_at = ? WHERE name = ?",
+                    (level, now, now + (capacity - level) / rate, name)
+                )
+
+    async def take(self, costs: List[Cost]) -> float:
+        """acquire() in a worker thread, off the event loop"""
+        return await asyncio.to_thread(self.acquire, costs)
+
+    async def give_back(self, costs: List[Cost]):
+        """refund() in a worker thread, off the event loop"""
+        await asyncio.to_thread(self.refund, costs)
+
+
+class _Waiter:
+    __slots__ = ("costs", "future", "enqueued_at")
+
+    def __init__(self, costs: List[Cost], future: asyncio.Future):
+        self.costs = costs
+        self.future = future
+        self.enqueued_at = time.perf_counter()
+
+
+class AdmissionController:
+    """Token-bucket limits per client with a bounded, round-robin wait queue"""
+
+    def __init__(self, buckets, requests_per_minute: float, request_burst: float, tokens_per_minute: float,
+                 global_tokens_per_minute: float = 0, queue_size: int = 100, queue_per_client: int = 10,
+                 max_wait_seconds: float = 10.0):
+        self.buckets = buckets
+        self.requests_per_minute = requests_per_minute
+        self.request_burst = request_burst
+        self.tokens_per_minute = tokens_per_minute
+        self.global_tokens_per_minute = global_tokens_per_minute
+        self.queue_size = queue_size
+        self.queue_per_client = queue_per_client
+        self.max_wait_seconds = max_wait_seconds
+
+        # client -> waiters, in the order clients are next served
+        self._queues: "OrderedDict[str, Deque[_Waiter]]" = OrderedDict()
+        self._waiting = 0
+        self._wakeup: Optional[asyncio.Event] = None
+        self._scheduler: Optional[asyncio.Task] = None
+
+    def _costs(self, client: str, tokens: int) -> List[Cost]:
+        costs: List[Cost] = [(f"requests:{client}", self.request_burst, self.requests_per_minute / 60, 1)]
+        if tokens:
+            # A minute's worth of tokens may be spent in one burst
+            costs.append((f"tokens:{client}", self.tokens_per_minute, self.tokens_per_minute / 60, tokens))
+            if self.global_tokens_per_minute:
+                costs.append(("tokens:*", self.global_tokens_per_minute, self.global_tokens_per_minute / 60, tokens))
+        return costs
+
+    async def admit(self, client: str, tokens: int = 0):
+        """Return once the request may proceed, or raise AdmissionRejected"""
+        costs = self._costs(client, tokens)
+        # Skip the queue only when nobody is waiting, so arrivals cannot overtake it
+        wait = await self.buckets.take(costs) if not self._waiting else None
+        if wait == 0:
+            ADMISSION_DECISIONS.inc(result="admitted")
+            return
+
+        queue = self._queues.get(client)
+        if (wait is not None and wait > self.max_wait_seconds) or self._waiting >= self.queue_size \
+                or (queue is not None and len(queue) >= self.queue_per_client):
+            ADMISSION_DECISIONS.inc(result="rejected")
+            raise AdmissionRejected("Too many requests", wait if wait else self.max_wait_seconds)
+
+        waiter = _Waiter(costs, asyncio.get_running_loop().create_future())
+        self._queues.setdefault(client, deque()).append(waiter)
+        self._waiting += 1
+        ADMISSION_QUEUE_DEPTH.set(self._waiting)
+        self._wake()
+        try:
+            await asyncio.wait_for(waiter.future, self.max_wait_seconds)
+        except asyncio.TimeoutError:
+            ADMISSION_DECISIONS.inc(result="timed_out")
+            raise AdmissionRejected("Timed out waiting for capacity", self.max_wait_seconds) from None
+        finally:
+            # Granted waiters were already removed by the scheduler
+            self._discard(client, waiter)
+        ADMISSION_DECISIONS.inc(result="queued")
+        ADMISSION_WAIT_SECONDS.observe(time.perf_counter() - waiter.enqueued_at)
+
+    def _discard(self, client: str, waiter: _Waiter):
+        queue = self._queues.get(client)
+        if queue is not None and waiter in queue:
+            queue.remove(waiter)
+            self._waiting -= 1
+            if not queue:
+                del self._queues[client]
+        ADMISSION_QUEUE_DEPTH.set(self._waiting)
+
+    def _wake(self):
+        if self._wakeup is None:
+            self._wakeup = asyncio.Event()
+        self._wakeup.set()
+        if self._scheduler is None or self._scheduler.done():
+            self._scheduler = asyncio.create_task(self._schedule())
+
+    async def _schedule(self):
+        """Grant queued requests, one per client per pass, as their buckets refill"""
+        while self._waiting:
+            self._wakeup.clear()
+            soonest = self.max_wait_seconds
+            granted = False
+            for client in list(self._queues):
+                queue = self._queues.get(client)
+                if not queue:
+                    continue
+                waiter = queue[0]
+                if waiter.future.done():
+                    # Timed out or cancelled; admit() removes it
+                    continue
+                wait = await self.buckets.take(waiter.costs)
+                if wait > 0:
+                    soonest = min(soonest, wait)
+                    continue
+                if waiter.future.done():
+                    # Timed out while its tokens were being taken: they belong to the requests still waiting
+                    await self.buckets.give_back(waiter.costs)
+                    continue
+                queue.remove(waiter)
+                waiter.future.set_result(None)
+                self._waiting -= 1
+                granted = True
+                if queue:
+                    # Served clients go to the back of the rotation
+                    self._queues.move_to_end(client)
+                else:
+                    del self._queues[client]
+            ADMISSION_QUEUE_DEPTH.set(self._waiting)
+            if granted:
+                # Let the granted requests start before the next pass
+                await asyncio.sleep(0)
+                continue
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), soonest)
+            except asyncio.TimeoutError:
+                pass
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "requests_per_minute": self.requests_per_minute,
+            "tokens_per_minute": self.tokens_per_minute,
+            "global_tokens_per_minute": self.global_tokens_per_minute,
+            "waiting": self._waiting,
+            "waiting_clients": len(self._queues),
+            "queue_size": self.queue_size,
+            "shared": isinstance(self.buckets, SQLiteBuckets)
+        }
+
+
+def client_identity(request: Request, conversation_id: Optional[str] = None) -> str:
+    """Rate-limit key: the conversation when so configured, otherwise the client address"""
+    if settings.rate_limit_key == "conversation" and conversation_id:
+        return f"conversation:{conversation_id}"
+    if settings.rate_limit_trust_forwarded_for and request.headers.get("x-forwarded-for"):
+        # The first address is the original client when a trusted proxy appends the rest
+        return request.headers["x-forwarded-for"].split(",")[0].strip()
+    return request.client.host if request.client else "unknown"
+
+
+def create_admission_controller() -> Optional[AdmissionController]:
+    """Controller configured from settings, or None when rate limiting is disabled"""
+    if not settings.rate_limit_enabled:
+        return None
+    buckets = SQLiteBuckets(settings.state_db_path) if settings.state_backend == "sqlite" else MemoryBuckets()
+    return AdmissionController(
+        buckets,
+        requests_per_minute=settings.rate_limit_requests_per_minute,
+        request_burst=settings.rate_limit_request_burst,
+        tokens_per_minute=settings.rate_limit_tokens_per_minute,
+        global_tokens_per_minute=settings.rate_limit_global_tokens_per_minute,
+        queue_size=settings.rate_limit_queue_size,
+        queue_per_client=settings.rate_limit_queue_per_client,
+        max_wait_seconds=settings.rate_limit_max_wait_seconds
+    )
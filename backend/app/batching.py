@@ -0,0 +1,80 @@
+import asyncio
+import time
+from typing import Any, Callable, Dict, Generic, List, Optional, Sequence, Tuple, TypeVar
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+class MicroBatcher(Generic[T, R]):
+    """Gathers concurrent single-item requests into one vectorized call.
+
+    The first request to arrive opens a window of max_wait_ms; everything
+    submitted before it closes, or until max_batch_size items are waiting,
+    is passed to batch_fn as one list and each caller's future is resolved
+    with its own result. batch_fn must return one result per item, in order,
+    and should be a short CPU-bound pass (it runs on the event loop).
+    """
+
+    def __init__(self, batch_fn: Callable[[List[T]], Sequence[R]], max_batch_size: int, max_wait_ms: float):
+        self.batch_fn = batch_fn
+        self.max_batch_size = max(max_batch_size, 1)
+        self.max_wait_ms = max_wait_ms
+        self._pending: List[Tuple[T, asyncio.Future, float]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+
+        self.batches = 0
+        self.items = 0
+        self.largest_batch = 0
+        self._wait_seconds = 0.0
+        self._run_seconds = 0.0
+
+    async def submit(self, item: T) -> R:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((item, future, time.perf_counter()))
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait_ms / 1000, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if not batch:
+            return
+
+        started = time.perf_counter()
+        try:
+            results = self.batch_fn([item for item, _, _ in batch])
+        except Exception as e:
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        finished = time.perf_counter()
+
+        for (_, future, _), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+        self.batches += 1
+        self.items += len(batch)
+        self.largest_batch = max(self.largest_batch, len(batch))
+        self._wait_seconds += sum(started - enqueued for _, _, enqueued in batch)
+        self._run_seconds += finished - started
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait_ms,
+            "batches": self.batches,
+            "items": self.items,
+            "average_batch_size": round(self.items / self.batches, 2) if self.batches else 0.0,
+            "largest_batch": self.largest_batch,
+            "average_wait_ms": round(self._wait_seconds / self.items * 1000, 3) if self.items else 0.0,
+            "average_batch_ms": round(self._run_seconds / self.batches * 1000, 3) if self.batches else 0.0
+        }
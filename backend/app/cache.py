@@ -0,0 +1,413 @@
+import asyncio
+import json
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import closing
+from typing import Any, Dict, List, Optional, Sequence, Set, Tuple
+import numpy as np
+from .config import settings
+from .counters import SharedCounters, connect_shared
+
+_SHINGLE_SIZE = 4
+_NUM_PERMUTATIONS = 64
+_ROWS_PER_BAND = 4
+
+_NON_WORD = re.compile(r"[^a-z0-9]+")
+
+# Common contractions in questions, expanded so "what's" and "what is" share a key
+_CONTRACTIONS = {
+    "what's": "what is", "whats": "what is", "where's": "where is", "how's": "how is",
+    "who's": "who is", "it's": "it is", "i'm": "i am", "can't": "cannot",
+    "don't": "do not", "doesn't": "does not", "isn't": "is not", "i've": "i have"
+}
+_CONTRACTION_PATTERN = re.compile(r"\b(" + "|".join(re.escape(c) for c in _CONTRACTIONS) + r")\b")
+
+CacheKey = Tuple[str, str, str]
+
+
+def normalise_message(message: str) -> str:
+    """Lowercase, expand contractions, drop punctuation and collapse whitespace"""
+    message = _CONTRACTION_PATTERN.sub(lambda m: _CONTRACTIONS[m.group(1)], message.lower().replace("\u2019", "'"))
+    return " ".join(_NON_WORD.sub(" ", message).split())
+
+
+class MinHasher:
+    """MinHash signatures over character shingles for near-duplicate detection.
+
+    Each permutation is x -> (a*x + b) mod 2^32 with an odd multiplier,
+    which is a bijection on 32-bit shingles; it runs as wrapping uint32
+    arithmetic, so the signatures of a whole batch of texts come out of one
+    numpy pass.
+    """
+
+    def __init__(self, num_permutations: int = _NUM_PERMUTATIONS, seed: int = 1):
+        # Deterministic coefficients so signatures are stable across processes
+        state = seed
+        a, b = [], []
+        for _ in range(num_permutations):
+            state = (state * 6364136223846793005 + 1442695040888963407) % (1 << 64)
+            a.append((state >> 32) | 1)  # An odd multiplier keeps the map a bijection
+            state = (state * 6364136223846793005 + 1442695040888963407) % (1 << 64)
+            b.append(state >> 32)
+        self._a = np.array(a, dtype=np.uint32)[:, None]
+        self._b = np.array(b, dtype=np.uint32)[:, None]
+
+    def signatures(self, texts: Sequence[str]) -> List[Tuple[int, ...]]:
+        """Signatures for many texts at once.
+
+        Shingles are the 4-byte windows of each UTF-8 text read as 32-bit
+        integers (texts shorter than a shingle are zero-padded), gathered
+        from one concatenated buffer, so no per-character Python work is done.
+        """
+        encoded = [text.encode().ljust(_SHINGLE_SIZE, b"\0") for text in texts]
+        lengths = np.array([len(data) for data in encoded], dtype=np.int64)
+        counts = lengths - (_SHINGLE_SIZE - 1)
+        starts = np.cumsum(lengths) - lengths
+        offsets = np.cumsum(counts) - counts
+
+        data = np.frombuffer(b"".join(encoded), dtype=np.uint8).astype(np.uint32)
+        windows = data[:-3] << np.uint32(24) | data[1:-2] << np.uint32(16) | data[2:-1] << np.uint32(8) | data[3:]
+        # Keep only windows that start and end inside the same text
+        positions = np.arange(counts.sum()) + np.repeat(starts - offsets, counts)
+        shingles = windows[positions]
+
+        # (permutations x shingles); uint32 arithmetic wraps, i.e. is taken mod 2^32
+        hashed = self._a * shingles
+        hashed += self._b
+        minima = np.minimum.reduceat(hashed, offsets, axis=1).T
+        return [tuple(row) for row in minima.tolist()]
+
+    def signature(self, text: str) -> Tuple[int, ...]:
+        return self.signatures([text])[0]
+
+    @staticmethod
+    def similarity(left: Tuple[int, ...], right: Tuple[int, ...]) -> float:
+        """Estimated Jaccard similarity of the underlying shingle sets"""
+        return sum(1 for x, y in zip(left, right) if x == y) / len(left)
+
+
+class ResponseCache:
+    """LRU/TTL cache of LLM replies keyed on (agent, normalised message, deployment).
+
+    An optional near-duplicate tier finds cached replies for rephrasings of a
+    cached question ("what's the vacation policy?" vs "what is the vacation
+    policy") using MinHash signatures bucketed with locality-sensitive hashing.
+    Callers are responsible for only storing replies that are safe to replay,
+    i.e. never ones that executed tools.
+    """
+
+    def __init__(self, max_entries: int, ttl_seconds: int, near_duplicates: bool = False,
+                 similarity_threshold: float = 0.8):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.near_duplicates = near_duplicates
+        self.similarity_threshold = similarity_threshold
+
+        # key -> (stored_at, value, signature)
+        self._entries: "OrderedDict[CacheKey, Tuple[float, Dict[str, Any], Optional[Tuple[int, ...]]]]" = OrderedDict()
+        # (agent, deployment, band index, band values) -> keys sharing that band
+        self._bands: Dict[Tuple, Set[CacheKey]] = {}
+        self.hasher = MinHasher() if near_duplicates else None
+
+        self.hits = 0
+        self.near_duplicate_hits = 0
+        self.misses = 0
+
+    def _band_keys(self, agent: str, deployment: str, signature: Tuple[int, ...]):
+        for i in range(0, len(signature), _ROWS_PER_BAND):
+            yield (agent, deployment, i, signature[i:i + _ROWS_PER_BAND])
+
+    def _remove(self, key: CacheKey):
+        _, _, signature = self._entries.pop(key)
+        if signature is not None:
+            for band_key in self._band_keys(key[0], key[2], signature):
+                bucket = self._bands.get(band_key)
+                if bucket is not None:
+                    bucket.discard(key)
+                    if not bucket:
+                        del self._bands[band_key]
+
+    def _live(self, key: CacheKey, now: float) -> Optional[Dict[str, Any]]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if now - entry[0] > self.ttl_seconds:
+            self._remove(key)
+            return None
+        self._entries.move_to_end(key)
+        return entry[1]
+
+    def get(self, agent: str, message: str, deployment: str,
+            signature: Optional[Tuple[int, ...]] = None) -> Optional[Dict[str, Any]]:
+        """Return a cached reply for this question, or None; signature may be precomputed by a batcher"""
+        now = time.monotonic()
+        normalised = normalise_message(message)
+        value = self._live((agent, normalised, deployment), now)
+        if value is not None:
+            self.hits += 1
+            return value
+
+        if self.hasher is not None:
+            signature = signature or self.hasher.signature(normalised)
+            candidates = set()
+            for band_key in self._band_keys(agent, deployment, signature):
+                candidates.update(self._bands.get(band_key, ()))
+            best_key, best_score = None, self.similarity_threshold
+            for key in candidates:
+                score = MinHasher.similarity(signature, self._entries[key][2])
+                if score >= best_score:
+                    best_key, best_score = key, score
+            if best_key is not None:
+                value = self._live(best_key, now)
+                if value is not None:
+                    self.hits += 1
+                    self.near_duplicate_hits += 1
+                    return value
+
+        self.misses += 1
+        return None
+
+    def put(self, agent: str, message: str, deployment: str, value: Dict[str, Any],
+            signature: Optional[Tuple[int, ...]] = None):
+        """Store a reply, evicting the least recently used entries beyond max_entries"""
+        normalised = normalise_message(message)
+        key = (agent, normalised, deployment)
+        if key in self._entries:
+            self._remove(key)
+
+        if self.hasher is None:
+            signature = None
+        elif signature is None:
+            signature = self.hasher.signature(normalised)
+        self._entries[key] = (time.monotonic(), value, signature)
+        if signature is not None:
+            for band_key in self._band_keys(agent, deployment, signature):
+                self._bands.setdefault(band_key, set()).add(key)
+
+        while len(self._entries) > self.max_entries:
+            self._remove(next(iter(self._entries)))
+
+    async def aget(self, agent: str, message: str, deployment: str,
+                   signature: Optional[Tuple[int, ...]] = None) -> Optional[Dict[str, Any]]:
+        """get() for async callers; in-memory lookups run on the event loop"""
+        return self.get(agent, message, deployment, signature)
+
+    async def aput(self, agent: str, message: str, deployment: str, value: Dict[str, Any],
+                   signature: Optional[Tuple[int, ...]] = None):
+        self.put(agent, message, deployment, value, signature)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "near_duplicate_hits": self.near_duplicate_hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0
+        }
+
+
+class SQLiteResponseCache:
+    """ResponseCache with the same interface, kept in a SQLite WAL database shared by all workers.
+
+    Entries, their MinHash band keys for near-duplicate lookup and the
+    hit/miss counters all live in the shared database, so a reply cached by
+    one worker process is served by every other one. Lookups are read-only
+    queries: the LRU touches and counter increments they make are buffered
+    and written in one transaction every flush_seconds (or with the next
+    put), so concurrent readers in other workers never queue on the write
+    lock. Async callers use aget()/aput(), which run off the event loop.
+    """
+
+    def __init__(self, path: str, max_entries: int, ttl_seconds: int, near_duplicates: bool = False,
+                 similarity_threshold: float = 0.8, flush_seconds: float = 1.0):
+        self.path = path
+        self.flush_seconds = flush_seconds
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.similarity_threshold = similarity_threshold
+        self.hasher = MinHasher() if near_duplicates else None
+        self.counters = SharedCounters(path)
+        # Buffered since the last flush: key -> latest access time, counter -> increment
+        self._lock = threading.Lock()
+        self._touched: Dict[CacheKey, float] = {}
+        self._counts: Dict[str, int] = {}
+        self._flushed_at = time.monotonic()
+        with closing(connect_shared(path)) as conn, conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS response_cache ("
+                "agent TEXT NOT NULL, message TEXT NOT NULL, deployment TEXT NOT NULL, value TEXT NOT NULL, "
+                "signature TEXT, stored_at REAL NOT NULL, last_access REAL NOT NULL, "
+                "PRIMARY KEY (agent, message, deployment))"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS response_cache_lru ON response_cache(last_access)")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS response_cache_bands ("
+                "band TEXT NOT NULL, agent TEXT NOT NULL, message TEXT NOT NULL, deployment TEXT NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS response_cache_band ON response_cache_bands(band)")
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS response_cache_band_owner "
+                "ON response_cache_bands(agent, message, deployment)"
+            )
+
+    @staticmethod
+    def _band_keys(agent: str, deployment: str, signature: Tuple[int, ...]) -> List[str]:
+        return [
+            f"{agent}|{deployment}|{i}|" + ",".join(map(str, signature[i:i + _ROWS_PER_BAND]))
+            for i in range(0, len(signature), _ROWS_PER_BAND)
+        ]
+
+    def _live(self, conn, key: CacheKey, now: float) -> Optional[Dict[str, Any]]:
+        row = conn.execute(
+            "SELECT value, stored_at FROM response_cache WHERE agent = ? AND message = ? AND deployment = ?", key
+        ).fetchone()
+        if row is None or now - row[1] > self.ttl_seconds:
+            return None
+        with self._lock:
+            self._touched[key] = now
+        return json.loads(row[0])
+
+    def _count(self, *names: str):
+        with self._lock:
+            for name in names:
+                self._counts[name] = self._counts.get(name, 0) + 1
+
+    def _flush_in(self, conn: sqlite3.Connection):
+        """Write the buffered LRU touches and counter increments inside the caller's transaction"""
+        with self._lock:
+            touched, self._touched = self._touched, {}
+            counts, self._counts = self._counts, {}
+            self._flushed_at = time.monotonic()
+        conn.executemany(
+            "UPDATE response_cache SET last_access = MAX(last_access, ?) WHERE agent = ? AND message = ? AND deployment = ?",
+            [(accessed, *key) for key, accessed in touched.items()]
+        )
+        for name, amount in counts.items():
+            self.counters.incr_in(conn, name, amount)
+
+    def flush(self):
+        with closing(connect_shared(self.path)) as conn, conn:
+            self._flush_in(conn)
+
+    def get(self, agent: str, message: str, deployment: str,
+            signature: Optional[Tuple[int, ...]] = None) -> Optional[Dict[str, Any]]:
+        """Return a cached reply for this question, or None; signature may be precomputed by a batcher"""
+        try:
+            return self._lookup(agent, message, deployment, signature)
+        finally:
+            if time.monotonic() - self._flushed_at >= self.flush_seconds:
+                self.flush()
+
+    def _lookup(self, agent: str, message: str, deployment: str,
+                signature: Optional[Tuple[int, ...]]) -> Optional[Dict[str, Any]]:
+        now = time.time()
+        normalised = normalise_message(message)
+        with closing(sqlite3.connect(self.path, timeout=5.0)) as conn:
+            value = self._live(conn, (agent, normalised, deployment), now)
+            if value is not None:
+                self._count("response_cache.hits")
+                return value
+
+            if self.hasher is not None:
+                signature = signature or self.hasher.signature(normalised)
+                bands = self._band_keys(agent, deployment, signature)
+                candidates = conn.execute(
+                    "SELECT DISTINCT c.agent, c.message, c.deployment, c.signature FROM response_cache_bands b "
+                    "JOIN response_cache c ON c.agent = b.agent AND c.message = b.message AND c.deployment = b.deployment "
+                    f"WHERE b.band IN ({','.join('?' * len(bands))})",
+                    bands
+                ).fetchall()
+                best_key, best_score = None, self.similarity_threshold
+                for candidate_agent, candidate_message, candidate_deployment, stored in candidates:
+                    score = MinHasher.similarity(signature, tuple(json.loads(stored)))
+                    if score >= best_score:
+                        best_key, best_score = (candidate_agent, candidate_message, candidate_deployment), score
+                if best_key is not None:
+                    value = self._live(conn, best_key, now)
+                    if value is not None:
+                        self._count("response_cache.hits", "response_cache.near_duplicate_hits")
+                        return value
+
+        self._count("response_cache.misses")
+        return None
+
+    async def aget(self, agent: str, message: str, deployment: str,
+                   signature: Optional[Tuple[int, ...]] = None) -> Optional[Dict[str, Any]]:
+        """get() in a worker thread, off the event loop"""
+        return await asyncio.to_thread(self.get, agent, message, deployment, signature)
+
+    async def aput(self, agent: str, message: str, deployment: str, value: Dict[str, Any],
+                   signature: Optional[Tuple[int, ...]] = None):
+        await asyncio.to_thread(self.put, agent, message, deployment, value, signature)
+
+    def _delete(self, conn, where: str, params: Tuple):
+        conn.execute(
+            "DELETE FROM response_cache_bands WHERE (agent, message, deployment) IN "
+            f"(SELECT agent, message, deployment FROM response_cache WHERE {where})", params
+        )
+        conn.execute(f"DELETE FROM response_cache WHERE {where}", params)
+
+    def put(self, agent: str, message: str, deployment: str, value: Dict[str, Any],
+            signature: Optional[Tuple[int, ...]] = None):
+        """Store a reply, evicting expired and least recently used entries beyond max_entries"""
+        now = time.time()
+        normalised = normalise_message(message)
+        key = (agent, normalised, deployment)
+        if self.hasher is None:
+            signature = None
+        elif signature is None:
+            signature = self.hasher.signature(normalised)
+        with closing(connect_shared(self.path)) as conn, conn:
+            # Recent hits count towards the LRU order used for eviction below
+            self._flush_in(conn)
+            self._delete(conn, "agent = ? AND message = ? AND deployment = ?", key)
+            conn.execute(
+                "INSERT INTO response_cache (agent, message, deployment, value, signature, stored_at, last_access) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (*key, json.dumps(value, default=str), json.dumps(signature) if signature else None, now, now)
+            )
+            if signature is not None:
+                conn.executemany(
+                    "INSERT INTO response_cache_bands (band, agent, message, deployment) VALUES (?, ?, ?, ?)",
+                    [(band, *key) for band in self._band_keys(agent, deployment, signature)]
+                )
+            self._delete(conn, "stored_at < ?", (now - self.ttl_seconds,))
+            overflow = conn.execute("SELECT COUNT(*) FROM response_cache").fetchone()[0] - self.max_entries
+            if overflow > 0:
+                self._delete(
+                    conn,
+                    "rowid IN (SELECT rowid FROM response_cache ORDER BY last_access LIMIT ?)",
+                    (overflow,)
+                )
+
+    def stats(self) -> Dict[str, Any]:
+        self.flush()
+        totals = self.counters.totals("response_cache.")
+        hits, misses = totals.get("response_cache.hits", 0), totals.get("response_cache.misses", 0)
+        with closing(connect_shared(self.path)) as conn:
+            entries = conn.execute("SELECT COUNT(*) FROM response_cache").fetchone()[0]
+        return {
+            "entries": entries,
+            "hits": hits,
+            "near_duplicate_hits": totals.get("response_cache.near_duplicate_hits", 0),
+            "misses": misses,
+            "hit_ratio": round(hits / (hits + misses), 4) if hits + misses else 0.0,
+            "shared": True
+        }
+
+
+def create_response_cache():
+    """Build the response cache for the configured state backend"""
+    options = {
+        "max_entries": settings.response_cache_max_entries,
+        "ttl_seconds": settings.response_cache_ttl_seconds,
+        "near_duplicates": settings.response_cache_near_duplicates,
+        "similarity_threshold": settings.response_cache_similarity_threshold
+    }
+    if settings.state_backend == "sqlite":
+        return SQLiteResponseCache(settings.state_db_path, flush_seconds=settings.state_flush_seconds, **options)
+    return ResponseCache(**options)
@@ -0,0 +1,75 @@
+"""Cheap-first model tiers for chat turns.
+
+Each turn starts at one of three tiers:
+
+    template  a local canned reply (greetings, thanks), no model call
+    small     the small deployment, answering without running tools
+    large     the main deployment with the full tool loop
+
+The starting tier is the first matching message rule, otherwise the
+agent's configured tier; long messages always start at the large model. A
+small-tier answer is kept only when the model's own confidence (the
+geometric mean of its token probabilities, from logprobs) reaches the
+threshold and it did not ask for a tool; otherwise the turn escalates to
+the large model. Every tier's latency and estimated cost is recorded.
+"""
+import math
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+from .metrics import cached_prompt_tokens
+
+TIERS = ("template", "small", "large")
+
+_GREETING = re.compile(r"^\s*(hi|hello|hey|good (morning|afternoon|evening))\b", re.IGNORECASE)
+_THANKS = re.compile(r"\b(thanks|thank you|cheers)\b", re.IGNORECASE)
+
+
+class CascadeRules:
+    """Chooses the starting tier of a chat turn"""
+
+    def __init__(self, agent_tiers: Dict[str, str], rules: List[Dict[str, str]], max_simple_words: int):
+        unknown = {tier for tier in [*agent_tiers.values(), *(rule["tier"] for rule in rules)] if tier not in TIERS}
+        if unknown:
+            raise ValueError(f"Unknown cascade tiers {sorted(unknown)}, expected one of {TIERS}")
+        self.agent_tiers = agent_tiers
+        self.rules: List[Tuple[re.Pattern, str]] = [
+            (re.compile(rule["pattern"], re.IGNORECASE), rule["tier"]) for rule in rules
+        ]
+        self.max_simple_words = max_simple_words
+
+    def start_tier(self, agent: str, message: str) -> str:
+        for pattern, tier in self.rules:
+            if pattern.search(message):
+                return tier
+        if len(message.split()) > self.max_simple_words:
+            return "large"
+        return self.agent_tiers.get(agent, "large")
+
+
+def template_reply(agent_name: str, message: str) -> Optional[str]:
+    """Canned reply for small talk, None when no template fits"""
+    if _THANKS.search(message):
+        return "You're welcome! Is there anything else I can help you with?"
+    if _GREETING.search(message):
+        return f"Hello! I'm your {agent_name}. How can I help you today?"
+    return None
+
+
+def answer_confidence(choice: Any) -> Optional[float]:
+    """Geometric mean token probability of a completion choice, None without logprobs"""
+    logprobs = getattr(choice, "logprobs", None)
+    tokens = getattr(logprobs, "content", None) if logprobs is not None else None
+    if not tokens:
+        return None
+    return math.exp(sum(token.logprob for token in tokens) / len(tokens))
+
+
+def usage_cost(prices: Optional[Dict[str, float]], usage: Optional[Any]) -> float:
+    """Estimated USD cost of one call from its usage and the tier's prices per million tokens"""
+    if not prices or usage is None:
+        return 0.0
+    cached = cached_prompt_tokens(usage)
+    prompt = (usage.prompt_tokens or 0) - cached
+    return (prompt * prices.get("prompt", 0.0) + cached * prices.get("cached_prompt", prices.get("prompt", 0.0))
+            + (usage.completion_tokens or 0) * prices.get("completion", 0.0)) / 1_000_000
@@ -0,0 +1,115 @@
+"""Single-flight coalescing of identical concurrent work.
+
+The first caller for a key starts the work as a task; callers arriving with
+the same key while it runs share that task instead of starting their own.
+Streams are fanned out the same way: each subscriber gets the events
+produced so far, then every new one as it arrives. The work runs detached
+from its callers, so one client disconnecting does not cancel it for the
+others. A key is released as soon as its work finishes; replaying finished
+results is the response cache's job.
+"""
+import asyncio
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Hashable, List, Optional, Tuple, TypeVar
+
+T = TypeVar("T")
+
+
+class _Broadcast:
+    """Events of one in-flight stream, kept until it ends so late subscribers can replay them"""
+
+    def __init__(self):
+        self.events: List[Any] = []
+        self.done = False
+        self.error: Optional[Exception] = None
+        self.changed = asyncio.Event()
+        self.task: Optional[asyncio.Task] = None
+
+    def _notify(self):
+        changed, self.changed = self.changed, asyncio.Event()
+        changed.set()
+
+    def publish(self, event: Any):
+        self.events.append(event)
+        self._notify()
+
+    def close(self, error: Optional[Exception] = None):
+        self.done = True
+        self.error = error
+        self._notify()
+
+    async def follow(self) -> AsyncIterator[Any]:
+        index = 0
+        while True:
+            while index < len(self.events):
+                yield self.events[index]
+                index += 1
+            if self.done:
+                if self.error is not None:
+                    raise self.error
+                return
+            await self.changed.wait()
+
+
+class SingleFlight:
+    """Deduplicates concurrent calls (do) and streams (stream) by key"""
+
+    def __init__(self):
+        self._calls: Dict[Hashable, asyncio.Task] = {}
+        self._streams: Dict[Hashable, _Broadcast] = {}
+        self.flights = 0
+        self.joined = 0
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> Tuple[T, bool]:
+        """Await fn(), or the identical call already in flight; returns (result, shared)"""
+        task = self._calls.get(key)
+        shared = task is not None
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._calls[key] = task
+            task.add_done_callback(lambda done: self._release(self._calls, key, done))
+            self.flights += 1
+        else:
+            self.joined += 1
+        # Shielded so a cancelled caller leaves the call running for the others
+        return await asyncio.shield(task), shared
+
+    def stream(self, key: Hashable, factory: Callable[[], AsyncIterator[Any]]) -> Tuple[AsyncIterator[Any], bool]:
+        """Subscribe to factory()'s events, or to the identical stream already in flight; returns (events, shared)"""
+        broadcast = self._streams.get(key)
+        shared = broadcast is not None
+        if broadcast is None:
+            broadcast = self._streams[key] = _Broadcast()
+            broadcast.task = asyncio.ensure_future(self._produce(broadcast, factory))
+            broadcast.task.add_done_callback(lambda done: self._release(self._streams, key, broadcast))
+            self.flights += 1
+        else:
+            self.joined += 1
+        return broadcast.follow(), shared
+
+    @staticmethod
+    async def _produce(broadcast: _Broadcast, factory: Callable[[], AsyncIterator[Any]]):
+        try:
+            async for event in factory():
+                broadcast.publish(event)
+        except Exception as e:
+            broadcast.close(e)
+        else:
+            broadcast.close()
+        finally:
+            if not broadcast.done:
+                broadcast.close()
+
+    @staticmethod
+    def _release(flights: Dict[Hashable, Any], key: Hashable, flight: Any):
+        if flights.get(key) is flight:
+            del flights[key]
+        # Mark a failed call's exception as retrieved when every caller went away
+        if isinstance(flight, asyncio.Task) and not flight.cancelled():
+            flight.exception()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "in_flight": len(self._calls) + len(self._streams),
+            "flights": self.flights,
+            "joined": self.joined
+        }
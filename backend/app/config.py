@@ -2,7 +2,8 @@ try:
     from pydantic_settings import BaseSettings  # For newer pydantic versions
 except ImportError:
     from pydantic import BaseSettings  # For older pydantic versions
-from typing import List
+from typing import Dict, List
+import logging
 import os
 
 class Settings(BaseSettings):
@@ -12,11 +13,147 @@ class Settings(BaseSettings):
     azure_openai_api_version: str = "2025-04-01-preview"
     azure_openai_deployment_name: str = "gpt-4o"
     
+    # Model client resilience
+    llm_timeout_seconds: float = 60.0
+    llm_connect_timeout_seconds: float = 5.0
+    llm_max_connections: int = 100
+    llm_max_keepalive_connections: int = 20
+    llm_keepalive_expiry_seconds: float = 30.0
+    llm_max_concurrency_per_deployment: int = 16  # In-flight calls per deployment
+    llm_max_retries: int = 3
+    llm_backoff_base_seconds: float = 0.5
+    llm_backoff_max_seconds: float = 20.0
+    llm_circuit_failure_threshold: int = 5  # Consecutive failed calls before the circuit opens
+    llm_circuit_reset_seconds: float = 30.0
+    
+    llm_max_completion_tokens: int = 800
+    
+    # Priority lanes sharing each deployment's concurrency slots (weighted fair queuing)
+    priority_enabled: bool = True
+    priority_lane_weights: Dict[str, float] = {"urgent": 8.0, "standard": 4.0, "routine": 1.0}
+    priority_lane_caps: Dict[str, int] = {"standard": 14, "routine": 12}  # Max slots per lane; urgent may use all
+    priority_agent_lanes: Dict[str, str] = {
+        "it": "standard", "general": "standard", "hr": "routine", "travel": "routine", "doc_chat": "routine"
+    }
+    priority_rules: List[Dict[str, str]] = [  # Regexes on the message; the most urgent match wins
+        {"pattern": r"patient (database|records?|charts?)|\b(outage|emergency|urgent)\b|clinical system", "lane": "urgent"}
+    ]
+    priority_ticket_lanes: Dict[str, str] = {"critical": "urgent", "high": "urgent"}  # create_it_ticket priority
+    
+    # Model cascade: simple turns are answered by a template or the small deployment first,
+    # escalating to azure_openai_deployment_name on low confidence or tool need. Without a
+    # small deployment only the template tier runs
+    cascade_enabled: bool = False
+    cascade_small_deployment: str = ""  # e.g. "gpt-4o-mini"
+    cascade_small_max_tokens: int = 300
+    cascade_min_confidence: float = 0.75  # Geometric mean token probability a small answer needs
+    cascade_max_simple_words: int = 40  # Longer messages start at the large model
+    cascade_agent_tiers: Dict[str, str] = {  # "template", "small" or "large"
+        "general": "small", "hr": "small", "travel": "small", "it": "large", "doc_chat": "large"
+    }
+    cascade_rules: List[Dict[str, str]] = [  # Regexes on the message; the first match sets the tier
+        {"pattern": r"^\W*(hi|hello|hey|good (morning|afternoon|evening)|thanks|thank you|cheers)( there)?\W*$", "tier": "template"},
+        {"pattern": r"\b(create|open|submit|file|raise|book|reset|ticket|expense)\b", "tier": "large"}
+    ]
+    cascade_prices_per_million: Dict[str, Dict[str, float]] = {  # USD per million tokens, for cost accounting
+        "small": {"prompt": 0.15, "cached_prompt": 0.075, "completion": 0.6},
+        "large": {"prompt": 2.5, "cached_prompt": 1.25, "completion": 10.0}
+    }
+    
+    # Model backend: "azure" for EYQ Incubator, "fake" for the offline simulator used in load tests
+    llm_backend: str = "azure"
+    fake_llm_seed: int = 0
+    fake_llm_latency_distribution: str = "lognormal"  # "constant", "uniform" or "lognormal"
+    fake_llm_latency_ms: float = 300.0  # Median time to first token
+    fake_llm_latency_jitter: float = 0.5  # Lognormal sigma, or +/- fraction for uniform
+    fake_llm_tokens_per_second: float = 80.0
+    fake_llm_tool_call_rate: float = 0.0  # Share of tool-enabled user turns answered with a tool call
+    fake_llm_throttle_rate: float = 0.0  # Share of calls failing with 429
+    fake_llm_error_rate: float = 0.0  # Share of calls failing with 500
+    fake_llm_small_latency_scale: float = 0.4  # The small deployment's time to first token, relative to the large
+    fake_llm_small_speed_scale: float = 2.5  # The small deployment's token rate, relative to the large
+    fake_llm_small_low_confidence_rate: float = 0.2  # Share of small-deployment answers with low logprobs
+    
     # App settings
     debug: bool = True
+    log_level: str = "INFO"  # DEBUG shows per-request model call details
+    log_format: str = "text"  # "text" (key=value) or "json"
+    startup_warmup: bool = True  # Build the orchestrator and indexes at startup rather than on the first request
+    static_cache_max_age_seconds: int = 300  # Cache-Control for /api/agents and /api/quick-actions
     cors_origins: List[str] = ["http://localhost:5173", "http://localhost:5174", "http://localhost:5175", "http://localhost:5176", "http://localhost:5177", "http://localhost:*"]
     upload_dir: str = "./uploads"
     max_file_size: int = 10 * 1024 * 1024  # 10MB
+    upload_store_max_bytes: int = 2 * 1024 * 1024 * 1024  # 2GB of deduplicated uploads
+    upload_pin_seconds: int = 60 * 60  # Longest an upload is kept from eviction while its job is pending
+    extraction_workers: int = 2  # Processes used for document text extraction
+    document_chunk_words: int = 200
+    document_top_k: int = 4  # Chunks added to the Document Analyst prompt
+    spreadsheet_top_n: int = 10  # Categories, employees and flagged rows listed per sheet summary
+    # Uploads are processed in the background; the request returns a job id
+    upload_jobs_db_path: str = "./data/jobs.db"
+    upload_job_workers: int = 2  # Jobs processed at once per worker process
+    upload_job_max_pending: int = 32  # Queued jobs per worker process before uploads get 503
+    upload_job_poll_seconds: float = 0.5  # Progress poll for jobs running in another worker process
+    upload_job_retention_seconds: int = 24 * 60 * 60
+    max_tool_iterations: int = 4  # Model/tool round trips per chat turn
+    
+    # Retrieval of policy and knowledge-base passages for agent prompts
+    retrieval_index_dir: str = "./data/retrieval"
+    retrieval_top_k: int = 3
+    retrieval_token_budget: int = 500  # Prompt tokens spent on retrieved passages
+    
+    # Production server and state shared between worker processes
+    server_host: str = "0.0.0.0"
+    server_port: int = 8000
+    server_workers: int = 1
+    state_backend: str = "memory"  # "memory" (one process) or "sqlite" (shared by all workers)
+    state_db_path: str = "./data/state.db"  # Response cache and shared counters
+    state_flush_seconds: float = 1.0  # How often buffered cache hits and uploaded-file checks reach SQLite
+    
+    # Durable outbox for ticket and expense side effects, delivered in the background
+    outbox_db_path: str = "./data/outbox.db"
+    outbox_batch_size: int = 50
+    outbox_poll_seconds: float = 5.0  # Idle poll interval; new entries are dispatched immediately
+    outbox_max_attempts: int = 8
+    outbox_backoff_base_seconds: float = 1.0
+    outbox_backoff_max_seconds: float = 300.0
+    outbox_retention_seconds: int = 7 * 24 * 60 * 60  # Delivered entries are kept for a week
+    outbox_stub_latency_ms: float = 50.0  # Local stub ticketing/expense backend
+    outbox_stub_failure_rate: float = 0.0
+    
+    # Admission control: token buckets per client (or conversation) on requests and estimated tokens
+    rate_limit_enabled: bool = True
+    rate_limit_key: str = "client"  # "client" (address) or "conversation"
+    rate_limit_trust_forwarded_for: bool = False  # Use X-Forwarded-For behind a trusted proxy
+    rate_limit_requests_per_minute: float = 60.0
+    rate_limit_request_burst: float = 20.0
+    rate_limit_tokens_per_minute: float = 40000.0  # Prompt + completion allowance per client
+    rate_limit_global_tokens_per_minute: float = 0.0  # Whole deployment quota; 0 disables
+    rate_limit_queue_size: int = 100  # Requests waiting for capacity, per worker
+    rate_limit_queue_per_client: int = 10
+    rate_limit_max_wait_seconds: float = 10.0
+    
+    # Micro-batching of intent scoring and MinHash signatures across concurrent requests
+    batching_enabled: bool = True
+    batch_max_size: int = 32
+    batch_max_wait_ms: float = 2.0
+    
+    # Identical concurrent requests share one in-flight model call (single-flight)
+    coalescing_enabled: bool = True
+    
+    # Conversation memory
+    conversation_backend: str = "memory"  # "memory" or "sqlite"
+    conversation_db_path: str = "./data/conversations.db"
+    conversation_token_budget: int = 2000  # Prompt tokens of history kept per conversation
+    conversation_max_conversations: int = 5000
+    conversation_ttl_seconds: int = 4 * 60 * 60  # 4 hours
+    
+    # Response cache for repeated questions
+    response_cache_enabled: bool = True
+    response_cache_max_entries: int = 1000
+    response_cache_ttl_seconds: int = 15 * 60  # 15 minutes
+    response_cache_near_duplicates: bool = False  # MinHash matching of rephrased questions
+    response_cache_similarity_threshold: float = 0.8
     
     class Config:
         env_file = ".env"
@@ -25,7 +162,7 @@ class Settings(BaseSettings):
         """Validates the endpoint URL format"""
         if self.azure_openai_endpoint and "://" not in self.azure_openai_endpoint:
             self.azure_openai_endpoint = f"https://{self.azure_openai_endpoint}"
-            print(f"WARNING: Added https:// to endpoint: {self.azure_openai_endpoint}")
+            logging.getLogger(__name__).warning("Added https:// to endpoint", extra={"endpoint": self.azure_openai_endpoint})
         return self.azure_openai_endpoint
 
 settings = Settings()
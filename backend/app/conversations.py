@@ -0,0 +1,221 @@
+import asyncio
+import os
+import sqlite3
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from contextlib import closing
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+from .config import settings
+
+# Rough chars-per-token ratio for English chat text; good enough for budgeting
+CHARS_PER_TOKEN = 4
+
+# Share of the budget that a summary of trimmed turns may occupy
+SUMMARY_BUDGET_RATIO = 0.1
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate used for prompt budgeting"""
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+class ConversationStore(ABC):
+    """Base class for conversation history backends with a per-conversation token budget"""
+
+    def __init__(self, token_budget: int, max_conversations: int, ttl_seconds: int):
+        self.token_budget = token_budget
+        self.max_conversations = max_conversations
+        self.ttl_seconds = ttl_seconds
+        # Awaited with the ids of conversations dropped by TTL or size eviction
+        self.on_evict: Optional[Callable[[List[str]], Awaitable[None]]] = None
+
+    async def _evicted(self, conversation_ids: List[str]):
+        if conversation_ids and self.on_evict is not None:
+            await self.on_evict(conversation_ids)
+
+    @abstractmethod
+    async def get_history(self, conversation_id: str) -> List[Dict[str, str]]:
+        """Return prior turns as chat messages, oldest first"""
+
+    @abstractmethod
+    async def append(self, conversation_id: str, turns: List[Dict[str, str]]):
+        """Append turns and trim the conversation back under its token budget"""
+
+    def _trim(self, summary: str, turns: List[Tuple[str, str, int]]) -> Tuple[str, List[Tuple[str, str, int]]]:
+        """Drop the oldest turns until the conversation fits the token budget.
+
+        Dropped user turns are folded into a short summary line so the model
+        still knows what was discussed earlier.
+        """
+        summary_budget = int(self.token_budget * SUMMARY_BUDGET_RATIO)
+        total = sum(tokens for _, _, tokens in turns) + estimate_tokens(summary)
+        dropped = []
+        while turns and total > self.token_budget:
+            role, content, tokens = turns.pop(0)
+            total -= tokens
+            if role == "user":
+                dropped.append(content[:80])
+        # Never start the kept history with an assistant reply to a dropped question
+        while turns and turns[0][0] == "assistant" and dropped:
+            turns.pop(0)
+
+        if dropped:
+            topics = [summary] if summary else []
+            topics.extend(dropped)
+            summary = "; ".join(topics)
+            max_chars = summary_budget * CHARS_PER_TOKEN
+            if len(summary) > max_chars:
+                summary = summary[-max_chars:]
+        return summary, turns
+
+    @staticmethod
+    def _to_messages(summary: str, turns: List[Tuple[str, str, int]]) -> List[Dict[str, str]]:
+        messages = []
+        if summary:
+            messages.append({"role": "system", "content": f"Earlier in this conversation the user asked about: {summary}"})
+        messages.extend({"role": role, "content": content} for role, content, _ in turns)
+        return messages
+
+
+class InMemoryConversationStore(ConversationStore):
+    """Per-process LRU/TTL conversation store"""
+
+    def __init__(self, token_budget: int, max_conversations: int, ttl_seconds: int):
+        super().__init__(token_budget, max_conversations, ttl_seconds)
+        # conversation_id -> (updated_at, summary, [(role, content, tokens)])
+        self._conversations: "OrderedDict[str, Tuple[float, str, List[Tuple[str, str, int]]]]" = OrderedDict()
+
+    def _expire(self, now: float) -> List[str]:
+        # Entries are kept in recency order, so expired ones sit at the front
+        expired = []
+        while self._conversations:
+            conversation_id, (updated_at, _, _) = next(iter(self._conversations.items()))
+            if now - updated_at <= self.ttl_seconds:
+                break
+            del self._conversations[conversation_id]
+            expired.append(conversation_id)
+        return expired
+
+    async def get_history(self, conversation_id: str) -> List[Dict[str, str]]:
+        await self._evicted(self._expire(time.monotonic()))
+        entry = self._conversations.get(conversation_id)
+        if entry is None:
+            return []
+        self._conversations.move_to_end(conversation_id)
+        _, summary, turns = entry
+        return self._to_messages(summary, turns)
+
+    async def append(self, conversation_id: str, turns: List[Dict[str, str]]):
+        now = time.monotonic()
+        evicted = self._expire(now)
+        _, summary, stored = self._conversations.get(conversation_id, (now, "", []))
+        stored = stored + [(t["role"], t["content"], estimate_tokens(t["content"])) for t in turns]
+        summary, stored = self._trim(summary, stored)
+        self._conversations[conversation_id] = (now, summary, stored)
+        self._conversations.move_to_end(conversation_id)
+        while len(self._conversations) > self.max_conversations:
+            evicted.append(self._conversations.popitem(last=False)[0])
+        await self._evicted(evicted)
+
+
+class SQLiteConversationStore(ConversationStore):
+    """On-disk conversation store so history survives restarts and stays off the heap"""
+
+    def __init__(self, path: str, token_budget: int, max_conversations: int, ttl_seconds: int):
+        super().__init__(token_budget, max_conversations, ttl_seconds)
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with closing(self._connect()) as conn, conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS conversations ("
+                "id TEXT PRIMARY KEY, summary TEXT NOT NULL DEFAULT '', updated_at REAL NOT NULL)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS turns ("
+                "conversation_id TEXT NOT NULL, seq INTEGER NOT NULL, role TEXT NOT NULL, "
+                "content TEXT NOT NULL, tokens INTEGER NOT NULL, PRIMARY KEY (conversation_id, seq))"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS conversations_updated ON conversations(updated_at)")
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=5.0)
+
+    def _load(self, conn: sqlite3.Connection, conversation_id: str) -> Optional[Tuple[str, List[Tuple[str, str, int]]]]:
+        row = conn.execute(
+            "SELECT summary, updated_at FROM conversations WHERE id = ?", (conversation_id,)
+        ).fetchone()
+        if row is None or time.time() - row[1] > self.ttl_seconds:
+            return None
+        turns = conn.execute(
+            "SELECT role, content, tokens FROM turns WHERE conversation_id = ? ORDER BY seq", (conversation_id,)
+        ).fetchall()
+        return row[0], [tuple(t) for t in turns]
+
+    def _get_history_sync(self, conversation_id: str) -> List[Dict[str, str]]:
+        with closing(self._connect()) as conn, conn:
+            loaded = self._load(conn, conversation_id)
+        if loaded is None:
+            return []
+        return self._to_messages(*loaded)
+
+    def _append_sync(self, conversation_id: str, turns: List[Dict[str, str]]) -> List[str]:
+        now = time.time()
+        with closing(self._connect()) as conn, conn:
+            # Take the write lock before reading, so a concurrent append from another worker is not lost
+            conn.execute("BEGIN IMMEDIATE")
+            summary, stored = self._load(conn, conversation_id) or ("", [])
+            stored = stored + [(t["role"], t["content"], estimate_tokens(t["content"])) for t in turns]
+            summary, stored = self._trim(summary, stored)
+
+            conn.execute("DELETE FROM turns WHERE conversation_id = ?", (conversation_id,))
+            conn.executemany(
+                "INSERT INTO turns (conversation_id, seq, role, content, tokens) VALUES (?, ?, ?, ?, ?)",
+                [(conversation_id, seq, role, content, tokens) for seq, (role, content, tokens) in enumerate(stored)]
+            )
+            conn.execute(
+                "INSERT INTO conversations (id, summary, updated_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(id) DO UPDATE SET summary = excluded.summary, updated_at = excluded.updated_at",
+                (conversation_id, summary, now)
+            )
+            return self._evict(conn, now)
+
+    def _evict(self, conn: sqlite3.Connection, now: float) -> List[str]:
+        """Delete expired conversations and the oldest ones over max_conversations; returns their ids"""
+        evicted = [row[0] for row in conn.execute(
+            "SELECT id FROM conversations WHERE updated_at < ?", (now - self.ttl_seconds,)
+        )]
+        overflow = conn.execute("SELECT COUNT(*) FROM conversations").fetchone()[0] - len(evicted) - self.max_conversations
+        if overflow > 0:
+            evicted.extend(row[0] for row in conn.execute(
+                "SELECT id FROM conversations WHERE updated_at >= ? ORDER BY updated_at LIMIT ?",
+                (now - self.ttl_seconds, overflow)
+            ))
+        conn.executemany("DELETE FROM turns WHERE conversation_id = ?", [(id_,) for id_ in evicted])
+        conn.executemany("DELETE FROM conversations WHERE id = ?", [(id_,) for id_ in evicted])
+        return evicted
+
+    async def get_history(self, conversation_id: str) -> List[Dict[str, str]]:
+        return await asyncio.to_thread(self._get_history_sync, conversation_id)
+
+    async def append(self, conversation_id: str, turns: List[Dict[str, str]]):
+        await self._evicted(await asyncio.to_thread(self._append_sync, conversation_id, turns))
+
+
+def create_conversation_store() -> ConversationStore:
+    """Build the conversation store selected in settings"""
+    if settings.conversation_backend == "sqlite":
+        return SQLiteConversationStore(
+            path=settings.conversation_db_path,
+            token_budget=settings.conversation_token_budget,
+            max_conversations=settings.conversation_max_conversations,
+            ttl_seconds=settings.conversation_ttl_seconds
+        )
+    return InMemoryConversationStore(
+        token_budget=settings.conversation_token_budget,
+        max_conversations=settings.conversation_max_conversations,
+        ttl_seconds=settings.conversation_ttl_seconds
+    )
@@ -0,0 +1,81 @@
+import os
+import sqlite3
+import time
+from contextlib import closing
+from typing import Dict, Optional
+
+
+def connect_shared(path: str, timeout: float = 5.0) -> sqlite3.Connection:
+    """Connection to a SQLite database shared between worker processes"""
+    conn = sqlite3.connect(path, timeout=timeout, isolation_level="IMMEDIATE")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+
+def init_shared_db(path: str):
+    """Create the directory and switch the database to WAL so readers never block writers"""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with closing(sqlite3.connect(path, timeout=5.0)) as conn:
+        conn.execute("PRAGMA journal_mode=WAL")
+
+
+class SharedCounters:
+    """Named integer counters in SQLite, shared by every worker process.
+
+    Counters are either running totals or fixed-window rate counters: with
+    window_seconds set, each window gets its own row that expires once the
+    window has passed.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        init_shared_db(path)
+        with closing(connect_shared(path)) as conn, conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS counters ("
+                "name TEXT PRIMARY KEY, value INTEGER NOT NULL, expires_at REAL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS counters_expiry ON counters(expires_at)")
+
+    @staticmethod
+    def _key(name: str, window_seconds: Optional[float], now: float):
+        if window_seconds is None:
+            return name, None
+        window = int(now // window_seconds)
+        return f"{name}@{window}", (window + 1) * window_seconds
+
+    def incr(self, name: str, amount: int = 1, window_seconds: Optional[float] = None) -> int:
+        """Add amount and return the new value (for the current window, if windowed)"""
+        with closing(connect_shared(self.path)) as conn, conn:
+            return self.incr_in(conn, name, amount, window_seconds)
+
+    def incr_in(self, conn: sqlite3.Connection, name: str, amount: int = 1,
+                window_seconds: Optional[float] = None) -> int:
+        """incr() inside the caller's transaction on the same database"""
+        now = time.time()
+        key, expires_at = self._key(name, window_seconds, now)
+        conn.execute(
+            "INSERT INTO counters (name, value, expires_at) VALUES (?, ?, ?) "
+            "ON CONFLICT(name) DO UPDATE SET value = value + excluded.value",
+            (key, amount, expires_at)
+        )
+        if expires_at is not None:
+            conn.execute("DELETE FROM counters WHERE expires_at < ?", (now,))
+        return conn.execute("SELECT value FROM counters WHERE name = ?", (key,)).fetchone()[0]
+
+    def get(self, name: str, window_seconds: Optional[float] = None) -> int:
+        key, _ = self._key(name, window_seconds, time.time())
+        with closing(sqlite3.connect(self.path, timeout=5.0)) as conn:
+            row = conn.execute("SELECT value FROM counters WHERE name = ?", (key,)).fetchone()
+        return row[0] if row else 0
+
+    def totals(self, prefix: str = "") -> Dict[str, int]:
+        """Running (non-windowed) counters whose names start with prefix"""
+        with closing(sqlite3.connect(self.path, timeout=5.0)) as conn:
+            rows = conn.execute(
+                "SELECT name, value FROM counters WHERE expires_at IS NULL AND substr(name, 1, ?) = ?",
+                (len(prefix), prefix)
+            ).fetchall()
+        return dict(rows)
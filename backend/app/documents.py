@@ -0,0 +1,247 @@
+import asyncio
+import re
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from .config import settings
+from .search import SearchIndex
+
+_executor: Optional[ProcessPoolExecutor] = None
+
+
+class DocumentExtractionError(Exception):
+    """Raised when an uploaded file cannot be turned into text"""
+
+
+def _chunk_sections(sections: Iterable[Tuple[Dict[str, Any], str]], chunk_words: int) -> List[Dict[str, Any]]:
+    """Split (location, text) sections into chunks of at most chunk_words words.
+
+    Chunks never straddle sections, so every chunk keeps the page, section
+    or sheet it came from for citations.
+    """
+    chunks = []
+    for location, text in sections:
+        words = text.split()
+        for start in range(0, len(words), chunk_words):
+            chunks.append({
+                **location,
+                "chunk": len(chunks),
+                "text": " ".join(words[start:start + chunk_words])
+            })
+    return chunks
+
+
+def _text_sections(path: str):
+    with open(path, "r", encoding="utf-8", errors="ignore") as f:
+        text = f.read()
+    # Blank lines separate sections in plain text
+    for number, block in enumerate(re.split(r"\n\s*\n", text), start=1):
+        if block.strip():
+            yield {"section": number}, block
+
+
+def _pdf_sections(path: str):
+    try:
+        from pypdf import PdfReader
+    except ImportError:
+        raise DocumentExtractionError("PDF extraction requires the 'pypdf' package")
+    reader = PdfReader(path)
+    for number, page in enumerate(reader.pages, start=1):
+        yield {"page": number}, page.extract_text() or ""
+
+
+def _docx_sections(path: str):
+    try:
+        import docx
+    except ImportError:
+        raise DocumentExtractionError("Word extraction requires the 'python-docx' package")
+    document = docx.Document(path)
+    heading, lines = "Introduction", []
+    for paragraph in document.paragraphs:
+        if paragraph.style is not None and paragraph.style.name.startswith("Heading"):
+            if lines:
+                yield {"section": heading}, "\n".join(lines)
+            heading, lines = paragraph.text.strip() or heading, []
+        elif paragraph.text.strip():
+            lines.append(paragraph.text)
+    if lines:
+        yield {"section": heading}, "\n".join(lines)
+
+
+def _spreadsheet_sections(path: str, file_ext: str, travel_limits: Dict[str, Dict[str, Any]]):
+    """Precomputed aggregates of every sheet rather than its raw rows"""
+    try:
+        from .spreadsheets import SpreadsheetError, load_workbook, summarize_sheet, summary_sections
+    except ImportError:
+        raise DocumentExtractionError("Spreadsheet analysis requires the 'pandas' package")
+    try:
+        sheets = load_workbook(path, file_ext)
+    except SpreadsheetError as e:
+        raise DocumentExtractionError(str(e))
+    for name, frame in sheets.items():
+        yield from summary_sections(summarize_sheet(name, frame, travel_limits, settings.spreadsheet_top_n))
+
+
+# Types we can turn into text; other allowed uploads are stored but not indexed
+_EXTRACTORS = {
+    ".txt": _text_sections,
+    ".pdf": _pdf_sections,
+    ".docx": _docx_sections,
+}
+SPREADSHEET_TYPES = (".xlsx", ".xls")
+
+
+def extract_chunks(path: str, file_ext: str, chunk_words: int,
+                   travel_limits: Optional[Dict[str, Dict[str, Any]]] = None) -> List[Dict[str, Any]]:
+    """Extract location-aware text chunks from a document (runs in a worker process).
+
+    Spreadsheets are summarised instead, with hotel and meal rows checked
+    against travel_limits (MockDataService.get_travel_limits()).
+    """
+    if file_ext in SPREADSHEET_TYPES:
+        return _chunk_sections(_spreadsheet_sections(path, file_ext, travel_limits or {}), chunk_words)
+    extractor = _EXTRACTORS.get(file_ext)
+    if extractor is None:
+        raise DocumentExtractionError(f"Text extraction is not supported for {file_ext} files")
+    return _chunk_sections(extractor(path), chunk_words)
+
+
+async def extract_document(path: str, file_ext: str) -> List[Dict[str, Any]]:
+    """Extract chunks off the event loop in the shared process pool"""
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=settings.extraction_workers)
+    # Read here rather than in the worker, which would otherwise import the services module and its stores
+    from .services import MockDataService
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        _executor, extract_chunks, path, file_ext, settings.document_chunk_words, MockDataService.get_travel_limits()
+    )
+
+
+def shutdown_extraction_pool():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+def describe_location(chunk: Dict[str, Any]) -> str:
+    """Human readable citation for a chunk"""
+    if "page" in chunk:
+        return f"page {chunk['page']}"
+    if "sheet" in chunk:
+        return f"sheet {chunk['sheet']} ({chunk['section']})" if "section" in chunk else f"sheet {chunk['sheet']}"
+    return f"section {chunk['section']}"
+
+
+class DocumentStore:
+    """Chunks of uploaded documents per conversation, with BM25 retrieval.
+
+    With a source (the shared UploadStore) the in-memory indexes act as a
+    cache of what every worker process has uploaded: before answering for a
+    conversation, its file list is compared with the source and new or
+    replaced files are loaded from the shared extraction cache. The source
+    is read off the event loop, at most once every sync_seconds per
+    conversation (a turn asks twice, for routing and for retrieval), and
+    the replacement index is built in a worker thread. Installed indexes
+    are never modified, so searches use the previous one until the swap.
+    """
+
+    def __init__(self, max_conversations: int, source: Optional[Any] = None, sync_seconds: float = 1.0):
+        self.max_conversations = max_conversations
+        self.source = source
+        self.sync_seconds = sync_seconds
+        # conversation_id -> when its file list was last compared with the source
+        self._synced_at: "OrderedDict[str, float]" = OrderedDict()
+        # conversation_id -> index of (filename, chunk number) -> chunk
+        self._indexes: "OrderedDict[str, SearchIndex]" = OrderedDict()
+        # conversation_id -> {filename: content sha256} of the indexed files
+        self._versions: Dict[str, Dict[str, Optional[str]]] = {}
+
+    async def add(self, conversation_id: str, filename: str, chunks: List[Dict[str, Any]],
+                  version: Optional[str] = None):
+        """Index a file's chunks, replacing any earlier upload with the same name"""
+        await self._replace_file(conversation_id, filename, chunks, version)
+
+    def drop(self, conversation_id: str):
+        """Forget a conversation's documents"""
+        self._indexes.pop(conversation_id, None)
+        self._versions.pop(conversation_id, None)
+        self._synced_at.pop(conversation_id, None)
+
+    async def _replace_file(self, conversation_id: str, filename: str, chunks: Optional[List[Dict[str, Any]]],
+                            version: Optional[str] = None):
+        """Swap in an index where filename has chunks (None removes the file), built off the event loop"""
+        while True:
+            current = self._indexes.get(conversation_id)
+            if current is None and chunks is None:
+                self._versions.get(conversation_id, {}).pop(filename, None)
+                return
+            kept = [] if current is None else [(key, chunk) for key, chunk in current.documents() if key[0] != filename]
+            index = await asyncio.to_thread(self._build, kept, filename, chunks or [])
+            # Another upload to the conversation finished meanwhile: rebuild on top of it
+            if self._indexes.get(conversation_id) is current:
+                break
+        self._indexes[conversation_id] = index
+        versions = self._versions.setdefault(conversation_id, {})
+        if chunks is None:
+            versions.pop(filename, None)
+        else:
+            versions[filename] = version
+        self._indexes.move_to_end(conversation_id)
+        while len(self._indexes) > self.max_conversations:
+            evicted, _ = self._indexes.popitem(last=False)
+            self._versions.pop(evicted, None)
+
+    @staticmethod
+    def _build(kept: List[Tuple[Any, Dict[str, Any]]], filename: str, chunks: List[Dict[str, Any]]) -> SearchIndex:
+        index = SearchIndex({"text": 1})
+        for key, chunk in kept:
+            index.add(key, chunk)
+        for chunk in chunks:
+            index.add((filename, chunk["chunk"]), chunk)
+        return index
+
+    async def _sync(self, conversation_id: str):
+        """Pick up files uploaded through other worker processes"""
+        if self.source is None or not conversation_id:
+            return
+        now = time.monotonic()
+        if now - self._synced_at.get(conversation_id, -self.sync_seconds) < self.sync_seconds:
+            return
+        self._synced_at[conversation_id] = now
+        self._synced_at.move_to_end(conversation_id)
+        while len(self._synced_at) > self.max_conversations:
+            self._synced_at.popitem(last=False)
+
+        files = await asyncio.to_thread(self.source.conversation_files, conversation_id)
+        known = dict(self._versions.get(conversation_id, {}))
+        if files == known:
+            return
+        for filename, sha256 in files.items():
+            if known.get(filename) != sha256:
+                chunks = await asyncio.to_thread(self.source.load_chunks, filename, sha256)
+                if chunks is not None:
+                    await self._replace_file(conversation_id, filename, chunks, sha256)
+        for filename in set(known) - set(files):
+            await self._replace_file(conversation_id, filename, None)
+
+    async def has_documents(self, conversation_id: Optional[str]) -> bool:
+        await self._sync(conversation_id)
+        return bool(conversation_id) and bool(self._indexes.get(conversation_id))
+
+    async def search(self, conversation_id: str, query: str, top_k: int) -> List[Dict[str, Any]]:
+        """Top-k chunks for a question, each with filename and score"""
+        await self._sync(conversation_id)
+        index = self._indexes.get(conversation_id)
+        if not index:
+            return []
+        self._indexes.move_to_end(conversation_id)
+
+        top = [(hit.score, hit.key[0], hit.document) for hit in index.search(query, top_k).hits]
+        if not top:
+            # Questions like "summarise this" share no terms; fall back to the opening chunks
+            top = [(0.0, key[0], chunk) for key, chunk in index.documents()[:top_k]]
+        return [{**chunk, "filename": filename, "score": score} for score, filename, chunk in top]
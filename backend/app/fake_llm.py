@@ -0,0 +1,274 @@
+import asyncio
+import hashlib
+import json
+import math
+import random
+import time
+from collections import OrderedDict
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+import httpx
+import openai
+from openai.types.chat import ChatCompletion, ChatCompletionChunk
+from .config import settings
+from .conversations import estimate_tokens
+from .llm import LLMBackend
+
+LATENCY_DISTRIBUTIONS = ("constant", "uniform", "lognormal")
+
+# Prompt caching as the service applies it: prompts of at least 1024 tokens,
+# cached in 128-token increments of a previously seen prefix
+PROMPT_CACHE_MIN_TOKENS = 1024
+PROMPT_CACHE_INCREMENT = 128
+PROMPT_CACHE_MAX_PREFIXES = 10000
+
+# Placeholder values used to fill required tool arguments
+_ARGUMENT_DEFAULTS = {"string": "sample", "number": 100, "integer": 1, "boolean": True, "array": [], "object": {}}
+
+
+def _api_error(status_code: int, message: str, headers: Optional[Dict[str, str]] = None) -> openai.APIStatusError:
+    """Build the same exception the SDK raises for an HTTP error response"""
+    request = httpx.Request("POST", "http://fake-llm/chat/completions")
+    response = httpx.Response(status_code, headers=headers, request=request)
+    error_class = openai.RateLimitError if status_code == 429 else openai.InternalServerError
+    return error_class(message, response=response, body={"error": {"code": str(status_code), "message": message}})
+
+
+class FakeLLMBackend(LLMBackend):
+    """Deterministic offline stand-in for Azure OpenAI chat completions.
+
+    Returns real SDK ChatCompletion / ChatCompletionChunk objects, so the
+    orchestrator runs exactly as it does against a live deployment. Latency
+    (time to first token) follows a configurable distribution and the answer
+    is then produced at a fixed token rate. Tool calls and throttling/server
+    errors are injected at configurable rates. All randomness comes from one
+    seeded generator, so a sequential run is reproducible, and reply text
+    depends only on the request. Usage reports cached prompt tokens for
+    prefixes (tools, then messages) that earlier requests already sent.
+
+    model_profiles simulate deployments of different sizes: per model name,
+    latency_scale and speed_scale adjust time to first token and token rate,
+    and low_confidence_rate is the share of answers whose logprobs (returned
+    when requested) show low confidence.
+    """
+
+    requires_credentials = False
+
+    def __init__(self, seed: int = 0, latency_distribution: str = "lognormal", latency_ms: float = 300.0,
+                 latency_jitter: float = 0.5, tokens_per_second: float = 80.0, tool_call_rate: float = 0.0,
+                 throttle_rate: float = 0.0, error_rate: float = 0.0, retry_after: float = 1.0,
+                 model_profiles: Optional[Dict[str, Dict[str, float]]] = None):
+        if latency_distribution not in LATENCY_DISTRIBUTIONS:
+            raise ValueError(f"Unknown latency distribution '{latency_distribution}', expected one of {LATENCY_DISTRIBUTIONS}")
+        self.latency_distribution = latency_distribution
+        self.latency_ms = latency_ms
+        self.latency_jitter = latency_jitter
+        self.tokens_per_second = tokens_per_second
+        self.tool_call_rate = tool_call_rate
+        self.throttle_rate = throttle_rate
+        self.error_rate = error_rate
+        self.retry_after = retry_after
+        self.model_profiles = model_profiles or {}
+        self._random = random.Random(seed)
+        self.counters = {"requests": 0, "throttled": 0, "errors": 0, "tool_calls": 0, "completion_tokens": 0,
+                         "prompt_tokens": 0, "cached_tokens": 0}
+        self._prefixes: "OrderedDict[str, None]" = OrderedDict()
+
+    @classmethod
+    def from_settings(cls) -> "FakeLLMBackend":
+        return cls(
+            seed=settings.fake_llm_seed,
+            latency_distribution=settings.fake_llm_latency_distribution,
+            latency_ms=settings.fake_llm_latency_ms,
+            latency_jitter=settings.fake_llm_latency_jitter,
+            tokens_per_second=settings.fake_llm_tokens_per_second,
+            tool_call_rate=settings.fake_llm_tool_call_rate,
+            throttle_rate=settings.fake_llm_throttle_rate,
+            error_rate=settings.fake_llm_error_rate,
+            model_profiles={settings.cascade_small_deployment: {
+                "latency_scale": settings.fake_llm_small_latency_scale,
+                "speed_scale": settings.fake_llm_small_speed_scale,
+                "low_confidence_rate": settings.fake_llm_small_low_confidence_rate
+            }}
+        )
+
+    def _first_token_delay(self, latency_scale: float = 1.0) -> float:
+        """Seconds before the first token, drawn from the configured distribution"""
+        if self.latency_distribution == "constant":
+            delay = self.latency_ms
+        elif self.latency_distribution == "uniform":
+            delay = self.latency_ms * self._random.uniform(1 - self.latency_jitter, 1 + self.latency_jitter)
+        else:
+            # latency_ms is the median; jitter is the sigma of the underlying normal
+            delay = self._random.lognormvariate(math.log(max(self.latency_ms, 1e-3)), self.latency_jitter)
+        return max(delay, 0.0) * latency_scale / 1000
+
+    @staticmethod
+    def _request_id(messages: List[Dict[str, Any]]) -> str:
+        digest = hashlib.sha1(json.dumps(messages, sort_keys=True, default=str).encode()).hexdigest()
+        return f"chatcmpl-fake-{digest[:24]}"
+
+    def _tool_call(self, tools: List[Dict[str, Any]], message: str, request_id: str) -> Dict[str, Any]:
+        # Prefer a tool whose name shares a word with the question ("ticket", "expense", "travel")
+        words = set(message.lower().split())
+        relevant = [t for t in tools if words & set(t["function"]["name"].split("_")[1:])]
+        function = self._random.choice(relevant or tools)["function"]
+        schema = function.get("parameters", {})
+        arguments = {}
+        for name in schema.get("required", []):
+            spec = schema.get("properties", {}).get(name, {})
+            arguments[name] = spec["enum"][0] if spec.get("enum") else _ARGUMENT_DEFAULTS.get(spec.get("type"), "sample")
+        return {
+            "id": f"call_{request_id[-12:]}_{self.counters['tool_calls']}",
+            "type": "function",
+            "function": {"name": function["name"], "arguments": json.dumps(arguments)}
+        }
+
+    @staticmethod
+    def _reply_text(messages: List[Dict[str, Any]], max_tokens: Optional[int]) -> str:
+        last = messages[-1] if messages else {}
+        if last.get("role") == "tool":
+            text = "I have completed that for you. The details are included above."
+        else:
+            question = " ".join(str(last.get("content") or "").split()[:12])
+            text = (f"This is a simulated answer to: {question}. "
+                    "In production this reply comes from the configured model deployment.")
+        words = text.split(" ")
+        if max_tokens:
+            words = words[:max_tokens]
+        return " ".join(words)
+
+    def _plan(self, kwargs: Dict[str, Any]):
+        """Decide the outcome of one call: raise an injected error or return (text, tool call)"""
+        self.counters["requests"] += 1
+        roll = self._random.random()
+        if roll < self.throttle_rate:
+            self.counters["throttled"] += 1
+            raise _api_error(429, "Rate limit is exceeded.", {"retry-after": str(self.retry_after)})
+        if roll < self.throttle_rate + self.error_rate:
+            self.counters["errors"] += 1
+            raise _api_error(500, "Internal server error")
+
+        messages = kwargs.get("messages", [])
+        request_id = self._request_id(messages)
+        tools = kwargs.get("tools")
+        # Only answer a user turn with a tool call, so tool loops always terminate
+        if (tools and kwargs.get("tool_choice") != "none" and messages and messages[-1].get("role") == "user"
+                and self._random.random() < self.tool_call_rate):
+            call = self._tool_call(tools, str(messages[-1].get("content") or ""), request_id)
+            self.counters["tool_calls"] += 1
+            return request_id, None, call
+        return request_id, self._reply_text(messages, kwargs.get("max_tokens")), None
+
+    def _logprobs(self, text: str, low_confidence_rate: float) -> Dict[str, Any]:
+        """Per-word token logprobs, low for a low_confidence_rate share of answers"""
+        low, high = (0.3, 0.65) if self._random.random() < low_confidence_rate else (0.85, 0.99)
+        return {"content": [
+            {"token": word, "logprob": math.log(self._random.uniform(low, high)), "bytes": None, "top_logprobs": []}
+            for word in text.split(" ")
+        ]}
+
+    def _prompt_usage(self, kwargs: Dict[str, Any]) -> Tuple[int, int]:
+        """Prompt tokens and how many of them the longest previously seen prefix covers"""
+        segments = [json.dumps(kwargs.get("tools"), sort_keys=True)] if kwargs.get("tools") else []
+        segments += [json.dumps(message, sort_keys=True, default=str) for message in kwargs.get("messages", [])]
+        digest = hashlib.sha1(str(kwargs.get("model")).encode())
+        prompt_tokens = seen_tokens = 0
+        for segment in segments:
+            digest.update(segment.encode())
+            prompt_tokens += estimate_tokens(segment)
+            key = digest.hexdigest()
+            if key in self._prefixes:
+                seen_tokens = prompt_tokens
+                self._prefixes.move_to_end(key)
+            else:
+                self._prefixes[key] = None
+        while len(self._prefixes) > PROMPT_CACHE_MAX_PREFIXES:
+            self._prefixes.popitem(last=False)
+
+        cached_tokens = 0
+        if prompt_tokens >= PROMPT_CACHE_MIN_TOKENS and seen_tokens >= PROMPT_CACHE_MIN_TOKENS:
+            cached_tokens = seen_tokens // PROMPT_CACHE_INCREMENT * PROMPT_CACHE_INCREMENT
+        self.counters["prompt_tokens"] += prompt_tokens
+        self.counters["cached_tokens"] += cached_tokens
+        return prompt_tokens, cached_tokens
+
+    @staticmethod
+    def _usage(prompt_usage: Tuple[int, int], completion_tokens: int) -> Dict[str, Any]:
+        prompt_tokens, cached_tokens = prompt_usage
+        return {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+            "prompt_tokens_details": {"cached_tokens": cached_tokens}
+        }
+
+    async def create(self, **kwargs) -> Any:
+        request_id, text, call = self._plan(kwargs)
+        prompt_usage = self._prompt_usage(kwargs)
+        profile = self.model_profiles.get(kwargs["model"], {})
+        tokens_per_second = self.tokens_per_second * profile.get("speed_scale", 1.0)
+        await asyncio.sleep(self._first_token_delay(profile.get("latency_scale", 1.0)))
+        if kwargs.get("stream"):
+            # Like the service, usage is only sent when requested through stream_options
+            include_usage = (kwargs.get("stream_options") or {}).get("include_usage")
+            return self._stream(kwargs["model"], request_id, text, call, prompt_usage if include_usage else None,
+                                tokens_per_second)
+
+        completion_tokens = len(text.split(" ")) if text else estimate_tokens(call["function"]["arguments"])
+        self.counters["completion_tokens"] += completion_tokens
+        if tokens_per_second > 0:
+            await asyncio.sleep(completion_tokens / tokens_per_second)
+        logprobs = None
+        if kwargs.get("logprobs") and text:
+            logprobs = self._logprobs(text, profile.get("low_confidence_rate", 0.0))
+        return ChatCompletion.model_validate({
+            "id": request_id,
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": kwargs["model"],
+            "choices": [{
+                "index": 0,
+                "finish_reason": "tool_calls" if call else "stop",
+                "message": {"role": "assistant", "content": text, "tool_calls": [call] if call else None},
+                "logprobs": logprobs
+            }],
+            "usage": self._usage(prompt_usage, completion_tokens)
+        })
+
+    async def _stream(self, model: str, request_id: str, text: Optional[str], call: Optional[Dict[str, Any]],
+                      prompt_usage: Optional[Tuple[int, int]] = None,
+                      tokens_per_second: float = 0.0) -> AsyncIterator[ChatCompletionChunk]:
+        created = int(time.time())
+
+        def chunk(delta: Dict[str, Any], finish_reason: Optional[str] = None) -> ChatCompletionChunk:
+            return ChatCompletionChunk.model_validate({
+                "id": request_id, "object": "chat.completion.chunk", "created": created, "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]
+            })
+
+        yield chunk({"role": "assistant", "content": ""})
+        if call:
+            # Mirror the service: id and name first, then the arguments
+            yield chunk({"tool_calls": [{"index": 0, "id": call["id"], "type": "function",
+                                         "function": {"name": call["function"]["name"], "arguments": ""}}]})
+            yield chunk({"tool_calls": [{"index": 0, "function": {"arguments": call["function"]["arguments"]}}]})
+            completion_tokens = estimate_tokens(call["function"]["arguments"])
+            yield chunk({}, "tool_calls")
+        else:
+            words = text.split(" ")
+            for i, word in enumerate(words):
+                if tokens_per_second > 0:
+                    await asyncio.sleep(1 / tokens_per_second)
+                yield chunk({"content": word if i == len(words) - 1 else word + " "})
+            completion_tokens = len(words)
+            yield chunk({}, "stop")
+        self.counters["completion_tokens"] += completion_tokens
+
+        if prompt_usage is not None:
+            yield ChatCompletionChunk.model_validate({
+                "id": request_id, "object": "chat.completion.chunk", "created": created, "model": model,
+                "choices": [], "usage": self._usage(prompt_usage, completion_tokens)
+            })
+
+    def stats(self) -> Dict[str, Any]:
+        return dict(self.counters)
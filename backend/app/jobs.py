@@ -0,0 +1,384 @@
+"""Background processing of uploaded documents.
+
+The upload request only streams the file into the upload store and queues
+a job; extraction, indexing and the analysis summary run afterwards on a
+bounded pool of runner tasks, with the CPU-heavy parsing in the extraction
+process pool. A full queue rejects new uploads instead of piling up work.
+
+Job records (status, current stage, per-stage timings, result) live in
+SQLite, so any worker process can report on or cancel a job, while the
+process that accepted the upload runs it. Cancellation is checked at every
+stage boundary; a job running in this process is also interrupted at once.
+"""
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import time
+from contextlib import asynccontextmanager, closing
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from .config import settings
+from .counters import connect_shared, init_shared_db
+from .metrics import STAGE_SECONDS, UPLOAD_JOBS
+from .outbox import new_ulid
+
+logger = logging.getLogger(__name__)
+
+FINISHED = ("completed", "failed", "cancelled")
+_FINISHED_PARAMS = f"({', '.join('?' for _ in FINISHED)})"
+
+_COLUMNS = ("id", "conversation_id", "filename", "status", "stage", "progress", "timings_ms", "result",
+            "error", "cancel_requested", "owner", "created_at", "updated_at")
+_SELECT = f"SELECT {', '.join(_COLUMNS)} FROM upload_jobs"
+
+# Identifies this process among workers and across restarts that reuse its pid (pid 1 in a container)
+_OWNER = f"{os.getpid()}:{new_ulid()}"
+
+
+class JobCancelled(Exception):
+    """The job was cancelled while it was queued or between stages"""
+
+
+class JobQueueFullError(Exception):
+    """Too many uploads are waiting to be processed; the client should retry later"""
+
+
+class JobStore:
+    """Upload job records in SQLite, shared by every worker process"""
+
+    def __init__(self, path: str):
+        self.path = path
+        init_shared_db(path)
+        with closing(connect_shared(path)) as conn, conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS upload_jobs ("
+                "id TEXT PRIMARY KEY, conversation_id TEXT NOT NULL, filename TEXT NOT NULL, "
+                "status TEXT NOT NULL, stage TEXT, progress REAL NOT NULL DEFAULT 0, timings_ms TEXT NOT NULL, "
+                "result TEXT, error TEXT, cancel_requested INTEGER NOT NULL DEFAULT 0, owner TEXT NOT NULL, "
+                "created_at REAL NOT NULL, updated_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS upload_jobs_status ON upload_jobs(status, updated_at)")
+
+    def create(self, conversation_id: str, filename: str, timings_ms: Dict[str, float]) -> Dict[str, Any]:
+        now = time.time()
+        job_id = new_ulid()
+        with closing(connect_shared(self.path)) as conn, conn:
+            conn.execute(
+                "INSERT INTO upload_jobs (id, conversation_id, filename, status, timings_ms, owner, "
+                "created_at, updated_at) VALUES (?, ?, ?, 'queued', ?, ?, ?, ?)",
+                (job_id, conversation_id, filename, json.dumps(timings_ms), _OWNER, now, now)
+            )
+        return self.get(job_id)
+
+    def update(self, job_id: str, **fields: Any):
+        """Set columns of a job; timings_ms and result are stored as JSON"""
+        for name in ("timings_ms", "result"):
+            if name in fields and fields[name] is not None:
+                fields[name] = json.dumps(fields[name])
+        fields["updated_at"] = time.time()
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        with closing(connect_shared(self.path)) as conn, conn:
+            conn.execute(f"UPDATE upload_jobs SET {assignments} WHERE id = ?", (*fields.values(), job_id))
+
+    def request_cancel(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Flag an unfinished job for cancellation; returns the job, None if unknown"""
+        with closing(connect_shared(self.path)) as conn, conn:
+            conn.execute(
+                f"UPDATE upload_jobs SET cancel_requested = 1, updated_at = ? "
+                f"WHERE id = ? AND status NOT IN {_FINISHED_PARAMS}", (time.time(), job_id, *FINISHED)
+            )
+        return self.get(job_id)
+
+    def cancel_requested(self, job_id: str) -> bool:
+        with closing(sqlite3.connect(self.path, timeout=5.0)) as conn:
+            row = conn.execute("SELECT cancel_requested FROM upload_jobs WHERE id = ?", (job_id,)).fetchone()
+        return bool(row and row[0])
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with closing(sqlite3.connect(self.path, timeout=5.0)) as conn:
+            row = conn.execute(f"{_SELECT} WHERE id = ?", (job_id,)).fetchone()
+        return self._job(row) if row else None
+
+    def fail_orphans(self) -> int:
+        """Fail unfinished jobs whose owning process is gone, e.g. after a restart"""
+        with closing(connect_shared(self.path)) as conn, conn:
+            rows = conn.execute(
+                f"SELECT id, owner FROM upload_jobs WHERE status NOT IN {_FINISHED_PARAMS}", FINISHED
+            ).fetchall()
+            orphans = [job_id for job_id, owner in rows if not _owner_alive(owner)]
+            conn.executemany(
+                "UPDATE upload_jobs SET status = 'failed', error = ?, updated_at = ? WHERE id = ?",
+                [("Processing was interrupted by a restart; please upload the file again", time.time(), job_id)
+                 for job_id in orphans]
+            )
+        return len(orphans)
+
+    def prune(self, retention_seconds: float) -> int:
+        """Delete finished jobs last updated more than retention_seconds ago"""
+        with closing(connect_shared(self.path)) as conn, conn:
+            return conn.execute(
+                f"DELETE FROM upload_jobs WHERE status IN {_FINISHED_PARAMS} AND updated_at < ?",
+                (*FINISHED, time.time() - retention_seconds)
+            ).rowcount
+
+    def stats(self) -> Dict[str, int]:
+        with closing(sqlite3.connect(self.path, timeout=5.0)) as conn:
+            counts = dict(conn.execute("SELECT status, COUNT(*) FROM upload_jobs GROUP BY status").fetchall())
+        return {status: counts.get(status, 0) for status in ("queued", "running", *FINISHED)}
+
+    @staticmethod
+    def _job(row: Tuple) -> Dict[str, Any]:
+        job = dict(zip(_COLUMNS, row))
+        job["timings_ms"] = json.loads(job["timings_ms"])
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        job["cancel_requested"] = bool(job["cancel_requested"])
+        return job
+
+
+def _owner_alive(owner: str) -> bool:
+    pid = int(owner.split(":", 1)[0])
+    if pid == os.getpid():
+        return owner == _OWNER
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class JobProgress:
+    """Handed to a job's handler: times each stage and checks for cancellation between them"""
+
+    def __init__(self, store: JobStore, job: Dict[str, Any], stages: Tuple[str, ...], notify: Callable[[], None]):
+        self.store = store
+        self.job = job
+        self.stages = stages
+        self.timings_ms: Dict[str, float] = dict(job["timings_ms"])
+        self._notify = notify
+        self._done = 0
+
+    @asynccontextmanager
+    async def stage(self, name: str) -> AsyncIterator[None]:
+        if await asyncio.to_thread(self.store.cancel_requested, self.job["id"]):
+            raise JobCancelled()
+        await asyncio.to_thread(self.store.update, self.job["id"], stage=name, progress=self._done / len(self.stages))
+        self._notify()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self.timings_ms[name] = round(elapsed * 1000, 1)
+            STAGE_SECONDS.observe(elapsed, stage=f"upload_{name}")
+        self._done += 1
+        await asyncio.to_thread(
+            self.store.update, self.job["id"], progress=self._done / len(self.stages), timings_ms=self.timings_ms
+        )
+        self._notify()
+
+
+Handler = Callable[[Dict[str, Any], Dict[str, Any], JobProgress], Awaitable[Dict[str, Any]]]
+
+
+class JobQueue:
+    """Bounded queue of upload jobs run by a fixed number of runner tasks in this process"""
+
+    def __init__(self, store: JobStore, stages: Tuple[str, ...], workers: int, max_pending: int,
+                 poll_seconds: float, retention_seconds: float):
+        self.store = store
+        self.stages = stages
+        self.workers = max(workers, 1)
+        self.max_pending = max_pending
+        self.poll_seconds = poll_seconds
+        self.retention_seconds = retention_seconds
+        self.handler: Optional[Handler] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._runners: List[asyncio.Task] = []
+        # Jobs of this process: job id -> task running it (None while queued)
+        self._local: Dict[str, Optional[asyncio.Task]] = {}
+        self._changed: Dict[str, asyncio.Event] = {}
+        # Submissions holding a queue place while their record is written
+        self._reserved = 0
+
+    def start(self, handler: Handler):
+        """Start the runners; handler(job, payload, progress) returns the job's result"""
+        if self._runners:
+            return
+        self.handler = handler
+        self._queue = asyncio.Queue(self.max_pending)
+        try:
+            failed = self.store.fail_orphans()
+            pruned = self.store.prune(self.retention_seconds)
+            if failed or pruned:
+                logger.info("Upload jobs cleaned up", extra={"interrupted": failed, "pruned": pruned})
+        except Exception:
+            logger.exception("Upload job cleanup failed")
+        self._runners = [asyncio.create_task(self._run()) for _ in range(self.workers)]
+
+    async def stop(self):
+        tasks = [*self._runners, *(task for task in self._local.values() if task is not None)]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._runners = []
+        # Whatever is still queued will not run; say so rather than leaving it queued forever
+        for job_id in list(self._local):
+            await self._finish(job_id, "failed", error="The server shut down before the document was processed")
+        self._queue = None
+
+    def full(self) -> bool:
+        return self._queue is not None and self._queue.qsize() + self._reserved >= self.max_pending
+
+    async def submit(self, conversation_id: str, filename: str, payload: Dict[str, Any],
+                     timings_ms: Dict[str, float]) -> Dict[str, Any]:
+        """Queue a job; raises JobQueueFullError when max_pending jobs are already waiting"""
+        if self._queue is None:
+            raise RuntimeError("Upload job queue is not running")
+        if self.full():
+            UPLOAD_JOBS.inc(status="rejected")
+            raise JobQueueFullError(f"{self.max_pending} documents are already waiting to be processed")
+        self._reserved += 1
+        try:
+            job = await asyncio.to_thread(self.store.create, conversation_id, filename, timings_ms)
+        finally:
+            self._reserved -= 1
+        if self._queue is None:
+            # Stopped while the record was written
+            await asyncio.to_thread(
+                self.store.update, job["id"], status="failed",
+                error="The server shut down before the document was processed"
+            )
+            raise RuntimeError("Upload job queue is not running")
+        self._local[job["id"]] = None
+        self._changed[job["id"]] = asyncio.Event()
+        self._queue.put_nowait((job, payload, time.perf_counter()))
+        UPLOAD_JOBS.inc(status="queued")
+        return job
+
+    async def cancel(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Cancel a job wherever it runs; returns the job, None if unknown"""
+        job = await asyncio.to_thread(self.store.request_cancel, job_id)
+        if job is None or job["status"] in FINISHED:
+            return job
+        task = self._local.get(job_id)
+        if task is not None:
+            task.cancel()
+        elif job_id in self._local:
+            # Still queued here: finish it now, the runner skips it when dequeued
+            await self._finish(job_id, "cancelled")
+        return await asyncio.to_thread(self.store.get, job_id)
+
+    async def watch(self, job_id: str) -> AsyncIterator[Dict[str, Any]]:
+        """Yield the job whenever it changes, ending with its finished state"""
+        last = None
+        while True:
+            job = await asyncio.to_thread(self.store.get, job_id)
+            if job is None:
+                return
+            if job != last:
+                yield job
+                last = job
+            if job["status"] in FINISHED:
+                return
+            changed = self._changed.get(job_id)
+            if changed is None:
+                # Running in another worker process: poll its record
+                await asyncio.sleep(self.poll_seconds)
+                continue
+            try:
+                await asyncio.wait_for(changed.wait(), self.poll_seconds)
+            except asyncio.TimeoutError:
+                pass
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "workers": self.workers,
+            "max_pending": self.max_pending,
+            "pending": self._queue.qsize() if self._queue else 0,
+            # A copy, since stats may be read from a worker thread (health checks, metrics scrapes)
+            "running": sum(task is not None for task in list(self._local.values())),
+            "jobs": self.store.stats()
+        }
+
+    def _notify(self, job_id: str):
+        changed = self._changed.pop(job_id, None)
+        if changed is not None:
+            changed.set()
+        if job_id in self._local:
+            self._changed[job_id] = asyncio.Event()
+
+    async def _finish(self, job_id: str, status: str, **fields: Any):
+        # Forget the job first, so a runner dequeuing it meanwhile skips it
+        self._local.pop(job_id, None)
+        await asyncio.to_thread(self.store.update, job_id, status=status, stage=None, **fields)
+        UPLOAD_JOBS.inc(status=status)
+        self._notify(job_id)
+
+    async def _run(self):
+        while True:
+            job, payload, queued_at = await self._queue.get()
+            if job["id"] not in self._local:
+                # Cancelled while queued
+                continue
+            progress = JobProgress(self.store, job, self.stages, lambda: self._notify(job["id"]))
+            progress.timings_ms["queued"] = round((time.perf_counter() - queued_at) * 1000, 1)
+            task = asyncio.ensure_future(self._execute(job, payload, progress))
+            self._local[job["id"]] = task
+            try:
+                await asyncio.shield(task)
+            except asyncio.CancelledError:
+                if not task.done():
+                    # The runner itself is stopping
+                    task.cancel()
+                    raise
+
+    async def _execute(self, job: Dict[str, Any], payload: Dict[str, Any], progress: JobProgress):
+        job_id = job["id"]
+        start = time.perf_counter()
+        try:
+            # Inside the try: a cancel arriving while the record is written still finishes the job
+            await asyncio.to_thread(self.store.update, job_id, status="running", timings_ms=progress.timings_ms)
+            self._notify(job_id)
+            result = await self.handler(job, payload, progress)
+        except (JobCancelled, asyncio.CancelledError):
+            progress.timings_ms["total"] = round((time.perf_counter() - start) * 1000, 1)
+            await self._finish(job_id, "cancelled", timings_ms=progress.timings_ms)
+        except Exception as e:
+            logger.exception("Upload job failed", extra={"job_id": job_id})
+            progress.timings_ms["total"] = round((time.perf_counter() - start) * 1000, 1)
+            await self._finish(job_id, "failed", error=str(e), timings_ms=progress.timings_ms)
+        else:
+            progress.timings_ms["total"] = round((time.perf_counter() - start) * 1000, 1)
+            await self._finish(job_id, "completed", progress=1.0, result=result, timings_ms=progress.timings_ms)
+
+
+# Process-wide job store and queue, built on first use so importing the app creates no files
+_job_store: Optional[JobStore] = None
+_upload_jobs: Optional[JobQueue] = None
+
+
+def get_job_store() -> JobStore:
+    """The global upload job store, created on first call"""
+    global _job_store
+    if _job_store is None:
+        _job_store = JobStore(settings.upload_jobs_db_path)
+    return _job_store
+
+
+def get_upload_jobs() -> JobQueue:
+    """The global upload job queue, created on first call"""
+    global _upload_jobs
+    if _upload_jobs is None:
+        _upload_jobs = JobQueue(
+            get_job_store(),
+            stages=("extract", "index", "analyze"),
+            workers=settings.upload_job_workers,
+            max_pending=settings.upload_job_max_pending,
+            poll_seconds=settings.upload_job_poll_seconds,
+            retention_seconds=settings.upload_job_retention_seconds
+        )
+    return _upload_jobs
@@ -0,0 +1,320 @@
+import asyncio
+import random
+import time
+from contextlib import AsyncExitStack, contextmanager
+from email.utils import parsedate_to_datetime
+from typing import Any, AsyncIterator, Dict, Iterator, Optional, Tuple, Type
+from .config import settings
+from .metrics import LLM_CALL_SECONDS, LLM_IN_FLIGHT, STAGE_SECONDS, record_usage
+from .scheduling import DEFAULT_LANE, LaneScheduler
+
+
+def retryable_errors() -> Tuple[Type[Exception], ...]:
+    """Errors worth retrying: throttling, server faults and transport problems.
+
+    The openai SDK is imported here rather than at module level so importing
+    the app does not pay for it until the first model client is built.
+    """
+    import openai
+    return (
+        openai.RateLimitError,
+        openai.InternalServerError,
+        openai.APITimeoutError,
+        openai.APIConnectionError,
+    )
+
+
+class LLMUnavailableError(Exception):
+    """The model deployment is throttled or failing; callers should back off"""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """Consecutive-failure circuit breaker with a single half-open probe"""
+
+    def __init__(self, failure_threshold: int, reset_seconds: float):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._probing = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_seconds:
+            return "half_open"
+        return "open"
+
+    def before_call(self) -> bool:
+        """Raise LLMUnavailableError unless a call may go through now; True if the call is the half-open probe"""
+        state = self.state
+        if state == "closed":
+            return False
+        if state == "half_open" and not self._probing:
+            # Let exactly one request test whether the deployment recovered
+            self._probing = True
+            return True
+        retry_after = max(self.reset_seconds - (time.monotonic() - self.opened_at), 1.0)
+        raise LLMUnavailableError("Model deployment is temporarily unavailable", retry_after)
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self._probing = False
+
+    def record_failure(self):
+        self.failures += 1
+        if self._probing or self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+        self._probing = False
+
+    def end_probe(self):
+        """The probe call is over; let the next call probe if it recorded no outcome"""
+        self._probing = False
+
+
+def retry_after_seconds(error: Exception) -> Optional[float]:
+    """Server-requested delay from retry-after-ms / retry-after headers, if any"""
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    headers = response.headers
+    try:
+        if "retry-after-ms" in headers:
+            return float(headers["retry-after-ms"]) / 1000
+        if "retry-after" in headers:
+            value = headers["retry-after"]
+            try:
+                return float(value)
+            except ValueError:
+                return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+    return None
+
+
+class LLMBackend:
+    """Source of chat completions; LLMClient adds concurrency limits, retries and circuit breaking on top.
+
+    create() takes chat.completions.create arguments and returns a
+    ChatCompletion, or an async iterator of ChatCompletionChunk when
+    stream=True. Failures are raised as the openai SDK's exceptions.
+    """
+
+    # Whether the orchestrator should insist on endpoint credentials
+    requires_credentials = True
+
+    async def create(self, **kwargs) -> Any:
+        raise NotImplementedError
+
+    def stats(self) -> Dict[str, Any]:
+        return {}
+
+    async def aclose(self):
+        pass
+
+
+class AzureOpenAIBackend(LLMBackend):
+    """EYQ Incubator / Azure OpenAI over one tuned, shared httpx connection pool"""
+
+    def __init__(self):
+        import httpx
+        from openai import AsyncAzureOpenAI
+        endpoint = settings.validate_endpoint()
+        self.http_client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=settings.llm_max_connections,
+                max_keepalive_connections=settings.llm_max_keepalive_connections,
+                keepalive_expiry=settings.llm_keepalive_expiry_seconds
+            ),
+            timeout=httpx.Timeout(settings.llm_timeout_seconds, connect=settings.llm_connect_timeout_seconds)
+        )
+        self.client = AsyncAzureOpenAI(
+            azure_endpoint=endpoint,
+            api_key=settings.azure_openai_api_key,
+            api_version=settings.azure_openai_api_version,
+            http_client=self.http_client,
+            # Retries are handled by LLMClient so they share the breaker and semaphore
+            max_retries=0
+        )
+
+    async def create(self, **kwargs) -> Any:
+        return await self.client.chat.completions.create(**kwargs)
+
+    async def aclose(self):
+        await self.http_client.aclose()
+
+
+def create_backend() -> LLMBackend:
+    """Backend selected by settings.llm_backend"""
+    if settings.llm_backend == "azure":
+        return AzureOpenAIBackend()
+    if settings.llm_backend == "fake":
+        from .fake_llm import FakeLLMBackend
+        return FakeLLMBackend.from_settings()
+    raise ValueError(f"Unknown LLM backend '{settings.llm_backend}', expected 'azure' or 'fake'")
+
+
+class LLMClient:
+    """Model client with per-deployment concurrency caps, retries and circuit breaking.
+
+    Completions come from a pluggable LLMBackend (Azure OpenAI or the offline
+    fake). Each deployment gets its own lane scheduler and circuit breaker, so
+    a throttled deployment cannot starve or trip the others; within a
+    deployment, slots are shared between priority lanes by weighted fair
+    queuing. Retries use exponential backoff with full jitter and honour the
+    server's retry-after headers.
+    """
+
+    def __init__(self, backend: Optional[LLMBackend] = None):
+        import openai
+        self.backend = backend or create_backend()
+        self._retryable = retryable_errors()
+        self._status_error = openai.APIStatusError
+        self._schedulers: Dict[str, LaneScheduler] = {}
+        self._breakers: Dict[str, CircuitBreaker] = {}
+
+    def scheduler(self, deployment: str) -> LaneScheduler:
+        if deployment not in self._schedulers:
+            priority = settings.priority_enabled
+            self._schedulers[deployment] = LaneScheduler(
+                settings.llm_max_concurrency_per_deployment,
+                settings.priority_lane_weights if priority else {},
+                settings.priority_lane_caps if priority else {}
+            )
+        return self._schedulers[deployment]
+
+    def breaker(self, deployment: str) -> CircuitBreaker:
+        if deployment not in self._breakers:
+            self._breakers[deployment] = CircuitBreaker(
+                settings.llm_circuit_failure_threshold, settings.llm_circuit_reset_seconds
+            )
+        return self._breakers[deployment]
+
+    @staticmethod
+    def _backoff(attempt: int, error: Exception) -> float:
+        requested = retry_after_seconds(error)
+        if requested is not None:
+            return min(requested, settings.llm_backoff_max_seconds)
+        ceiling = min(settings.llm_backoff_base_seconds * (2 ** attempt), settings.llm_backoff_max_seconds)
+        return random.uniform(0, ceiling)
+
+    async def _create(self, kwargs: Dict[str, Any], lane: str, hold: Optional[AsyncExitStack] = None):
+        """backend.create with retries, each attempt in one of the deployment's lane slots.
+
+        The slot is released while backing off, so a retrying call does not
+        keep other lanes waiting. With hold, the slot of the successful
+        attempt is handed to that exit stack (a stream keeps it until drained).
+        """
+        deployment = kwargs["model"]
+        scheduler = self.scheduler(deployment)
+        breaker = self.breaker(deployment)
+        probe = breaker.before_call()
+        try:
+            for attempt in range(settings.llm_max_retries + 1):
+                slot = AsyncExitStack()
+                await slot.enter_async_context(scheduler.slot(lane))
+                try:
+                    result = await self.backend.create(**kwargs)
+                except self._retryable as e:
+                    await slot.aclose()
+                    if attempt == settings.llm_max_retries:
+                        breaker.record_failure()
+                        raise LLMUnavailableError(
+                            f"Model deployment '{deployment}' failed after {attempt + 1} attempts: {e}",
+                            retry_after_seconds(e) or settings.llm_backoff_base_seconds * (2 ** attempt)
+                        ) from e
+                    await asyncio.sleep(self._backoff(attempt, e))
+                except BaseException:
+                    await slot.aclose()
+                    raise
+                else:
+                    if hold is None:
+                        await slot.aclose()
+                    else:
+                        hold.push_async_exit(slot)
+                    breaker.record_success()
+                    return result
+        except LLMUnavailableError:
+            raise
+        except self._status_error as e:
+            # Client errors (bad request, auth) are not the deployment's fault, but a
+            # missing deployment (404) is: every call to it fails the same way
+            if e.status_code == 404:
+                breaker.record_failure()
+            else:
+                breaker.record_success()
+            raise
+        except BaseException as e:
+            # An unexpected error, or a cancelled probe, says nothing good about the deployment;
+            # an ordinary caller giving up (client disconnect) is not the deployment's fault
+            if probe or not isinstance(e, asyncio.CancelledError):
+                breaker.record_failure()
+            raise
+        finally:
+            if probe:
+                breaker.end_probe()
+
+    @contextmanager
+    def _instrument(self, deployment: str) -> Iterator[None]:
+        """Track the call as in flight and record its latency and outcome"""
+        start = time.perf_counter()
+        outcome = "success"
+        LLM_IN_FLIGHT.inc(deployment=deployment)
+        try:
+            yield
+        except LLMUnavailableError:
+            outcome = "unavailable"
+            raise
+        except (asyncio.CancelledError, GeneratorExit):
+            outcome = "cancelled"
+            raise
+        except BaseException:
+            outcome = "error"
+            raise
+        finally:
+            LLM_IN_FLIGHT.dec(deployment=deployment)
+            elapsed = time.perf_counter() - start
+            LLM_CALL_SECONDS.observe(elapsed, deployment=deployment, outcome=outcome)
+            STAGE_SECONDS.observe(elapsed, stage="llm")
+
+    async def chat_completion(self, lane: str = DEFAULT_LANE, **kwargs) -> Any:
+        """chat.completions.create with pooling, concurrency limits, retries and circuit breaking"""
+        deployment = kwargs["model"]
+        with self._instrument(deployment):
+            response = await self._create(kwargs, lane)
+        record_usage(deployment, getattr(response, "usage", None))
+        return response
+
+    async def stream_chat_completion(self, lane: str = DEFAULT_LANE, **kwargs) -> AsyncIterator[Any]:
+        """Streaming variant; the deployment slot is held until the stream is drained"""
+        deployment = kwargs["model"]
+        async with AsyncExitStack() as slot:
+            with self._instrument(deployment):
+                # Retries only cover opening the stream, never a partially delivered answer;
+                # usage arrives in a final chunk without choices
+                stream = await self._create(
+                    {**kwargs, "stream": True, "stream_options": {"include_usage": True}}, lane, hold=slot
+                )
+                async for chunk in stream:
+                    record_usage(deployment, getattr(chunk, "usage", None))
+                    yield chunk
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            deployment: {
+                "circuit": breaker.state,
+                "consecutive_failures": breaker.failures,
+                "in_flight": self.scheduler(deployment).in_flight,
+                "lanes": self.scheduler(deployment).stats()
+            }
+            for deployment, breaker in self._breakers.items()
+        }
+
+    async def aclose(self):
+        await self.backend.aclose()
@@ -0,0 +1,72 @@
+"""Application logging that never blocks the event loop.
+
+Records from the `app` loggers are put on an in-memory queue by a
+QueueHandler and written to stderr by a QueueListener thread, so a slow
+terminal or log pipe cannot stall request handling. Records are formatted
+as key=value pairs (or one JSON object per line with LOG_FORMAT=json), and
+anything passed through `extra=` is included as additional fields.
+"""
+import json
+import logging
+import logging.handlers
+import queue
+from typing import Optional
+
+from .config import settings
+
+# Attributes every LogRecord has; anything else came from `extra=`
+_STANDARD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_queue_handler: Optional[logging.handlers.QueueHandler] = None
+
+
+class StructuredFormatter(logging.Formatter):
+    """key=value (or JSON) lines with the record's extra fields"""
+
+    def __init__(self, json_lines: bool = False):
+        super().__init__()
+        self.json_lines = json_lines
+
+    def format(self, record: logging.LogRecord) -> str:
+        fields = {
+            "time": self.formatTime(record, "%Y-%m-%dT%H:%M:%S"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        fields.update((key, value) for key, value in vars(record).items() if key not in _STANDARD_ATTRIBUTES)
+        if record.exc_info:
+            fields["exception"] = self.formatException(record.exc_info)
+        if self.json_lines:
+            return json.dumps(fields, default=str)
+        return " ".join(f"{key}={json.dumps(value, default=str) if ' ' in str(value) else value}" for key, value in fields.items())
+
+
+def configure_logging():
+    """Route the `app` loggers through a background listener; safe to call more than once"""
+    global _listener, _queue_handler
+    if _listener is not None:
+        return
+
+    handler = logging.StreamHandler()
+    handler.setFormatter(StructuredFormatter(json_lines=settings.log_format == "json"))
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    _listener = logging.handlers.QueueListener(log_queue, handler, respect_handler_level=True)
+    _queue_handler = logging.handlers.QueueHandler(log_queue)
+
+    logger = logging.getLogger("app")
+    logger.setLevel(settings.log_level.upper())
+    logger.addHandler(_queue_handler)
+    # Uvicorn configures the root logger separately; keep app records out of it
+    logger.propagate = False
+    _listener.start()
+
+
+def shutdown_logging():
+    """Flush queued records and stop the listener thread"""
+    global _listener, _queue_handler
+    if _listener is not None:
+        logging.getLogger("app").removeHandler(_queue_handler)
+        _listener.stop()
+        _listener = _queue_handler = None
@@ -1,31 +1,85 @@
-from fastapi import FastAPI, HTTPException, UploadFile, File, Form
+from fastapi import FastAPI, HTTPException, UploadFile, File, Form, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
-import uvicorn
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import PlainTextResponse, StreamingResponse
 import os
-import aiofiles
-from typing import Optional
+import math
+import time
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from typing import Any, Dict, List, Optional
 
 from .config import settings
 from .models import ChatRequest, ChatResponse, AgentType
-from .agents import orchestrator
+from .agents import close_orchestrator, get_orchestrator
+from .llm import LLMUnavailableError
+from .admission import AdmissionController, AdmissionRejected, client_identity, create_admission_controller
+from .conversations import estimate_tokens
+from .uploads import stream_to_disk, UploadTooLargeError
+from .storage import get_upload_store
+from .outbox import get_dispatcher, get_outbox, outbox_backend
+from .jobs import FINISHED, JobProgress, JobQueueFullError, get_job_store, get_upload_jobs
+from .documents import extract_document, describe_location, shutdown_extraction_pool, DocumentExtractionError, SPREADSHEET_TYPES
+from .logs import configure_logging, shutdown_logging
+from .metrics import registry, stage, STAGE_SECONDS, UPLOADS, UPLOAD_BYTES
+from .responses import DefaultJSONResponse, PrecomputedJSON, dumps
 
-# Create FastAPI app
+configure_logging()
+logger = logging.getLogger(__name__)
+
+def log_configuration():
+    """Report whether EYQ Incubator credentials are configured"""
+    if not settings.azure_openai_endpoint or not settings.azure_openai_api_key:
+        logger.warning("EYQ Incubator credentials not configured, please update the .env file")
+    else:
+        logger.info("EYQ Incubator configured", extra={
+            "endpoint": settings.azure_openai_endpoint[:30] + "...",
+            "deployment": settings.azure_openai_deployment_name
+        })
+
+def warm_up():
+    """Build the orchestrator and run routing, retrieval and response encoding once,
+    so the first request does not pay for them"""
+    start = time.perf_counter()
+    orchestrator = get_orchestrator()
+    orchestrator.detect_agent_intent("How many vacation days do I get?")
+    orchestrator.passages.search("vacation policy", AgentType.HR.value, settings.retrieval_top_k)
+    agents_response.refresh()
+    quick_actions_response.refresh()
+    logger.info("Warm-up finished", extra={"seconds": round(time.perf_counter() - start, 3)})
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global admission
+    log_configuration()
+    admission = create_admission_controller()
+    # The upload directory and store, outbox and job databases are created here rather than at import
+    get_upload_store()
+    if settings.startup_warmup:
+        warm_up()
+    # Deliver tickets and expenses recorded by tool calls, including any left from a previous run
+    get_dispatcher().start()
+    get_upload_jobs().start(process_upload)
+    try:
+        yield
+    finally:
+        await get_upload_jobs().stop()
+        await get_dispatcher().stop()
+        shutdown_extraction_pool()
+        await close_orchestrator()
+        shutdown_logging()
+
+# Create FastAPI app; the orchestrator and model client are built by the
+# startup warm-up or on first use, so importing this module stays cheap
 app = FastAPI(
     title="Healthcare Multi-Agent Chatbot",
     description="AI-powered healthcare assistant with specialized agents",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=DefaultJSONResponse,
+    lifespan=lifespan
 )
 
-# Validate EYQ Incubator credentials
-if not settings.azure_openai_endpoint or not settings.azure_openai_api_key:
-    print("⚠️ WARNING: EYQ Incubator credentials not configured!")
-    print("Please update the .env file with your EYQ Incubator credentials.")
-else:
-    print(f"✅ EYQ Incubator endpoint: {settings.azure_openai_endpoint[:30]}...")
-    print(f"✅ EYQ Incubator API key: {settings.azure_openai_api_key[:5]}******")
-    print(f"✅ Using model deployment: {settings.azure_openai_deployment_name}")
-
 # Configure CORS
 app.add_middleware(
     CORSMiddleware,
@@ -35,8 +89,71 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Create upload directory
-os.makedirs(settings.upload_dir, exist_ok=True)
+# Allowance for multipart boundaries and part headers around the file itself
+MULTIPART_OVERHEAD = 64 * 1024
+# Suggested wait when the upload job queue is full
+UPLOAD_RETRY_AFTER_SECONDS = 5
+
+# Per-client token buckets and wait queue, built at startup; None when rate limiting is disabled
+admission: Optional[AdmissionController] = None
+
+async def admit(request: Request, conversation_id: Optional[str], tokens: int = 0):
+    """Wait for rate-limit capacity, or fail fast with 429 and Retry-After"""
+    if admission is None:
+        return
+    try:
+        await admission.admit(client_identity(request, conversation_id), tokens)
+    except AdmissionRejected as e:
+        raise HTTPException(
+            status_code=429,
+            detail="Too many requests. Please slow down and retry shortly.",
+            headers={"Retry-After": str(max(math.ceil(e.retry_after), 1))}
+        )
+
+def chat_token_estimate(message: str) -> int:
+    """Prompt tokens of the message plus the completion allowance"""
+    return estimate_tokens(message) + settings.llm_max_completion_tokens
+
+def component_metrics():
+    """Metric families read from the cache, batchers, model client and upload store at scrape time"""
+    orchestrator = get_orchestrator()
+    cache = orchestrator.response_cache.stats()
+    batchers = {"intent": orchestrator.intent_batcher, "minhash": orchestrator.signature_batcher}
+    batch_stats = {name: batcher.stats() for name, batcher in batchers.items() if batcher is not None}
+    store = get_upload_store().stats()
+    pending = get_outbox().stats()
+    jobs = get_upload_jobs().stats()
+    circuit_states = ("closed", "half_open", "open")
+    return [
+        ("response_cache_lookups_total", "counter", "Response cache lookups by result", [
+            ({"result": "hit"}, cache["hits"] - cache["near_duplicate_hits"]),
+            ({"result": "near_duplicate_hit"}, cache["near_duplicate_hits"]),
+            ({"result": "miss"}, cache["misses"])
+        ]),
+        ("response_cache_hit_ratio", "gauge", "Share of response cache lookups that were hits", [({}, cache["hit_ratio"])]),
+        ("response_cache_entries", "gauge", "Replies held in the response cache", [({}, cache["entries"])]),
+        ("batcher_items_total", "counter", "Items scored through each micro-batcher",
+         [({"batcher": name}, stats["items"]) for name, stats in batch_stats.items()]),
+        ("batcher_batches_total", "counter", "Batches run by each micro-batcher",
+         [({"batcher": name}, stats["batches"]) for name, stats in batch_stats.items()]),
+        ("llm_circuit_state", "gauge", "1 for the current circuit breaker state of each deployment", [
+            ({"deployment": deployment, "state": state}, int(stats["circuit"] == state))
+            for deployment, stats in orchestrator.llm.stats().items() for state in circuit_states
+        ]),
+        ("outbox_entries", "gauge", "Outbox entries by status", [
+            ({"status": status}, pending[status]) for status in ("pending", "delivered", "failed")
+        ]),
+        ("outbox_oldest_pending_seconds", "gauge", "Age of the oldest undelivered outbox entry",
+         [({}, pending["oldest_pending_seconds"])]),
+        ("upload_jobs", "gauge", "Upload jobs by status", [
+            ({"status": status}, count) for status, count in jobs["jobs"].items()
+        ]),
+        ("upload_job_queue_depth", "gauge", "Upload jobs waiting for a runner in this process", [({}, jobs["pending"])]),
+        ("upload_store_bytes", "gauge", "Bytes of deduplicated uploads on disk", [({}, store["bytes"])]),
+        ("upload_store_blobs", "gauge", "Distinct uploaded files on disk", [({}, store["blobs"])])
+    ]
+
+registry.add_collector(component_metrics)
 
 @app.get("/")
 async def root():
@@ -50,39 +167,232 @@ async def root():
 @app.get("/health")
 async def health_check():
     """Detailed health check"""
+    orchestrator = get_orchestrator()
     return {
         "status": "healthy",
         "azure_openai_configured": bool(settings.azure_openai_endpoint and settings.azure_openai_api_key),
         "upload_dir": settings.upload_dir,
-        "max_file_size_mb": settings.max_file_size / (1024 * 1024)
+        "max_file_size_mb": settings.max_file_size / (1024 * 1024),
+        "response_cache": await asyncio.to_thread(orchestrator.response_cache.stats),
+        "upload_store": await asyncio.to_thread(get_upload_store().stats),
+        "llm_backend": {"name": settings.llm_backend, **orchestrator.llm.backend.stats()},
+        "llm_deployments": orchestrator.llm.stats(),
+        "admission": admission.stats() if admission else None,
+        "outbox": {**await asyncio.to_thread(get_outbox().stats), "backend": outbox_backend.stats()},
+        "upload_jobs": await asyncio.to_thread(get_upload_jobs().stats),
+        "coalescing": orchestrator.flights.stats(),
+        "batching": {
+            "intent": orchestrator.intent_batcher.stats(),
+            "minhash": orchestrator.signature_batcher.stats() if orchestrator.signature_batcher else None
+        }
     }
 
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Prometheus scrape endpoint"""
+    # Collectors query SQLite-backed stores, so render off the event loop
+    body = await asyncio.to_thread(registry.render)
+    return PlainTextResponse(body, media_type="text/plain; version=0.0.4")
+
 @app.post("/api/chat", response_model=ChatResponse)
-async def chat_endpoint(request: ChatRequest):
+async def chat_endpoint(request: ChatRequest, http_request: Request):
     """Main chat endpoint for agent interactions"""
+    await admit(http_request, request.conversation_id, chat_token_estimate(request.message))
     try:
-        response = await orchestrator.chat(
+        response = await get_orchestrator().chat(
             message=request.message,
-            conversation_id=request.conversation_id
+            conversation_id=request.conversation_id,
+            agent_hint=request.agent_hint
         )
-        return response
+        # Serialized here rather than by FastAPI after returning, so the stage can be timed
+        with stage("serialization"):
+            return DefaultJSONResponse(jsonable_encoder(response))
     
+    except LLMUnavailableError as e:
+        raise HTTPException(
+            status_code=503,
+            detail="The assistant is temporarily overloaded. Please retry shortly.",
+            headers={"Retry-After": str(max(int(e.retry_after + 0.5), 1))}
+        )
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Chat processing error: {str(e)}")
 
-@app.post("/api/upload")
+@app.post("/api/chat/stream")
+async def chat_stream_endpoint(request: ChatRequest, http_request: Request):
+    """Streaming chat endpoint forwarding completion deltas as Server-Sent Events"""
+    await admit(http_request, request.conversation_id, chat_token_estimate(request.message))
+    
+    async def event_stream():
+        serialization_seconds = 0.0
+        async for event in get_orchestrator().chat_stream(
+            message=request.message,
+            conversation_id=request.conversation_id,
+            agent_hint=request.agent_hint
+        ):
+            start = time.perf_counter()
+            frame = f"event: {event['event']}\ndata: {dumps(jsonable_encoder(event['data'])).decode()}\n\n"
+            serialization_seconds += time.perf_counter() - start
+            yield frame
+        STAGE_SECONDS.observe(serialization_seconds, stage="serialization")
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+async def process_upload(job: Dict[str, Any], upload: Dict[str, Any], progress: JobProgress) -> Dict[str, Any]:
+    """Extract, index and summarise an uploaded document (runs as a background job)"""
+    try:
+        return await analyze_upload(job, upload, progress)
+    finally:
+        # The blob was pinned against eviction until its job finished
+        await asyncio.to_thread(get_upload_store().unpin, upload["sha256"])
+
+async def analyze_upload(job: Dict[str, Any], upload: Dict[str, Any], progress: JobProgress) -> Dict[str, Any]:
+    filename, file_ext = job["filename"], upload["file_ext"]
+    
+    # Extract page/section-aware chunks in the process pool; content seen before
+    # is served from the extraction cache
+    async with progress.stage("extract"):
+        cached = await asyncio.to_thread(
+            get_upload_store().get_extraction, upload["sha256"], file_ext, settings.document_chunk_words
+        )
+        if cached is not None:
+            chunks, extraction_error = cached["chunks"], cached["error"]
+        else:
+            try:
+                chunks = await extract_document(upload["path"], file_ext)
+                extraction_error = None
+            except DocumentExtractionError as e:
+                chunks, extraction_error = [], str(e)
+            await asyncio.to_thread(
+                get_upload_store().put_extraction, upload["sha256"], file_ext, settings.document_chunk_words,
+                chunks, extraction_error
+            )
+    
+    # Index for DOC_CHAT (built in a worker thread); other worker processes load the chunks
+    # from the extraction cache
+    async with progress.stage("index"):
+        await get_orchestrator().documents.add(job["conversation_id"], filename, chunks, version=upload["sha256"])
+    
+    async with progress.stage("analyze"):
+        if extraction_error:
+            findings = f"- Text could not be extracted: {extraction_error}"
+        else:
+            locations = sorted({describe_location(chunk) for chunk in chunks}, key=lambda l: (len(l), l))
+            preview = chunks[0]["text"][:300] + ("..." if len(chunks[0]["text"]) > 300 else "") if chunks else "(no text found)"
+            if file_ext in SPREADSHEET_TYPES:
+                contents = "- Totals, category and employee breakdowns and travel policy checks precomputed for every sheet"
+            else:
+                contents = f"- Document contains {upload['word_count']} words (estimated)"
+            findings = f"""{contents}
+- {len(locations)} {"location" if len(locations) == 1 else "locations"} indexed ({", ".join(locations[:5])}{", ..." if len(locations) > 5 else ""})
+- {len(chunks)} searchable {"passage" if len(chunks) == 1 else "passages"} created
+
+**Opening excerpt:**
+> {preview}"""
+        
+        analysis_response = f"""📄 **Document Analysis Complete**
+
+**File:** {filename}
+**Size:** {upload["size"] / 1024:.1f} KB
+**Type:** {file_ext.upper()} document
+
+**Key Findings:**
+{findings}
+
+**Available Actions:**
+- Ask specific questions about the content
+- Request detailed summaries
+- Extract specific information
+- Compare with other documents
+
+What would you like to know about this document?"""
+        
+        response = upload_response(job["conversation_id"], filename, upload, analysis_response, [
+            "Ask questions about content",
+            "Request summary",
+            "Extract key information",
+            "Upload another document"
+        ], {
+            "chunks_indexed": len(chunks),
+            "extraction_cached": cached is not None,
+            "extraction_error": extraction_error
+        })
+    return jsonable_encoder(response)
+
+def upload_response(conversation_id: str, filename: str, upload: Dict[str, Any], message: str,
+                    suggested_actions: List[str], metadata: Dict[str, Any]) -> ChatResponse:
+    """Chat response about an uploaded document"""
+    return ChatResponse(
+        message=message,
+        agent=AgentType.DOC_CHAT,
+        conversation_id=conversation_id,
+        sources=[
+            {
+                "title": filename,
+                "type": "Uploaded Document",
+                "size": f"{upload['size'] / 1024:.1f} KB",
+                "confidence": 1.0
+            }
+        ],
+        suggested_actions=suggested_actions,
+        metadata={
+            "file_uploaded": True,
+            "filename": filename,
+            "file_size": upload["size"],
+            "file_type": upload["file_ext"],
+            "sha256": upload["sha256"],
+            **metadata
+        }
+    )
+
+def job_payload(job: Dict[str, Any]) -> Dict[str, Any]:
+    """Public view of an upload job"""
+    return {
+        "job_id": job["id"],
+        "status": job["status"],
+        "stage": job["stage"],
+        "progress": round(job["progress"], 3),
+        "conversation_id": job["conversation_id"],
+        "filename": job["filename"],
+        "timings_ms": job["timings_ms"],
+        "cancel_requested": job["cancel_requested"],
+        "error": job["error"],
+        "result": job["result"]
+    }
+
+@app.post("/api/upload", response_model=ChatResponse)
 async def upload_document(
+    request: Request,
     file: UploadFile = File(...),
     conversation_id: Optional[str] = Form(None)
 ):
-    """Document upload endpoint for document analysis"""
+    """Document upload endpoint: stores the file and queues it for analysis.
+
+    The response says the document was received and carries the job id in
+    metadata; poll GET /api/upload/{job_id} (or open it as an event stream)
+    for progress and the analysis, which arrives as the job's result.
+    """
+    await admit(request, conversation_id)
+    too_large = HTTPException(
+        status_code=413, 
+        detail=f"File too large. Maximum size: {settings.max_file_size / (1024 * 1024):.1f}MB"
+    )
+    busy = HTTPException(
+        status_code=503,
+        detail="Too many documents are being processed. Please retry shortly.",
+        headers={"Retry-After": str(UPLOAD_RETRY_AFTER_SECONDS)}
+    )
     try:
-        # Validate file size
-        if file.size > settings.max_file_size:
-            raise HTTPException(
-                status_code=413, 
-                detail=f"File too large. Maximum size: {settings.max_file_size / (1024 * 1024):.1f}MB"
-            )
+        # Reject obviously oversized bodies before touching the file
+        content_length = request.headers.get("content-length")
+        if content_length is not None:
+            if not content_length.strip().isdigit():
+                raise HTTPException(status_code=400, detail="Invalid Content-Length header")
+            if int(content_length) > settings.max_file_size + MULTIPART_OVERHEAD:
+                raise too_large
         
         # Validate file type
         allowed_types = [".pdf", ".docx", ".doc", ".txt", ".xlsx", ".xls"]
@@ -92,74 +402,134 @@ async def upload_document(
                 status_code=400,
                 detail=f"Unsupported file type. Allowed: {', '.join(allowed_types)}"
             )
+        if get_upload_jobs().full():
+            raise busy
         
-        # Save file
-        file_path = os.path.join(settings.upload_dir, file.filename)
-        async with aiofiles.open(file_path, 'wb') as f:
-            content = await file.read()
-            await f.write(content)
+        # Stream to disk in chunks; size, hash and word count come from the same pass
+        start = time.perf_counter()
+        try:
+            upload = await stream_to_disk(file, settings.upload_dir, settings.max_file_size)
+        except UploadTooLargeError:
+            raise too_large
+        filename = os.path.basename(file.filename)
+        conversation_id = conversation_id or get_orchestrator()._new_conversation_id()
+        UPLOADS.inc()
+        UPLOAD_BYTES.inc(upload.size)
         
-        # Simulate document analysis
-        analysis_response = f"""📄 **Document Analysis Complete**
+        # Identical content is stored once, addressed by its hash, and kept until its job has read it
+        file_path = await asyncio.to_thread(
+            get_upload_store().commit, upload.path, upload.sha256, upload.size, conversation_id, filename,
+            settings.upload_pin_seconds
+        )
+        received = {
+            "path": file_path, "file_ext": file_ext, "sha256": upload.sha256,
+            "size": upload.size, "word_count": upload.word_count
+        }
+        upload_seconds = time.perf_counter() - start
+        STAGE_SECONDS.observe(upload_seconds, stage="upload_receive")
+        
+        # Extraction, indexing and the summary run in the background
+        try:
+            job = await get_upload_jobs().submit(conversation_id, filename, received, {"receive": round(upload_seconds * 1000, 1)})
+        except JobQueueFullError:
+            await asyncio.to_thread(get_upload_store().unpin, upload.sha256)
+            raise busy
+        
+        return upload_response(
+            conversation_id, filename, received,
+            f"""📄 **Document Received**
 
-**File:** {file.filename}
-**Size:** {len(content) / 1024:.1f} KB
+**File:** {filename}
+**Size:** {upload.size / 1024:.1f} KB
 **Type:** {file_ext.upper()} document
 
-**Content Summary:**
-I've successfully analyzed your document. Based on the content structure and metadata, this appears to be a {file_ext.upper()} document containing structured information.
-
-**Key Findings:**
-- Document contains {len(content.decode('utf-8', errors='ignore').split())} words (estimated)
-- Multiple sections and subsections identified
-- Tables and structured data detected
-- No sensitive information flagged
-
-**Available Actions:**
-- Ask specific questions about the content
-- Request detailed summaries
-- Extract specific information
-- Compare with other documents
-
-What would you like to know about this document?"""
-        
-        # Create chat response for document analysis
-        response = ChatResponse(
-            message=analysis_response,
-            agent=AgentType.DOC_CHAT,
-            conversation_id=conversation_id or f"upload_{int(__import__('time').time())}",
-            sources=[
-                {
-                    "title": file.filename,
-                    "type": "Uploaded Document",
-                    "size": f"{len(content) / 1024:.1f} KB",
-                    "confidence": 1.0
-                }
-            ],
-            suggested_actions=[
-                "Ask questions about content",
-                "Request summary",
-                "Extract key information",
-                "Upload another document"
-            ],
-            metadata={
-                "file_uploaded": True,
-                "filename": file.filename,
-                "file_size": len(content),
-                "file_type": file_ext
+The document is being analyzed; the findings will follow shortly.""",
+            ["Upload another document"],
+            {
+                "job_id": job["id"],
+                "job_status": job["status"],
+                "status_url": f"/api/upload/{job['id']}"
             }
         )
         
-        return response
-        
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Upload processing error: {str(e)}")
 
-@app.get("/api/agents")
-async def get_agents():
-    """Get available agents information"""
+@app.get("/api/upload/{job_id}")
+async def upload_status(job_id: str, request: Request):
+    """Status, per-stage timings and result of an upload job.
+
+    With Accept: text/event-stream the job is streamed instead: a "progress"
+    event whenever it changes and a final "done" event once it has finished.
+    """
+    job = await asyncio.to_thread(get_job_store().get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Upload job not found")
+    if "text/event-stream" not in request.headers.get("accept", ""):
+        return job_payload(job)
+    
+    async def event_stream():
+        async for current in get_upload_jobs().watch(job_id):
+            event = "done" if current["status"] in FINISHED else "progress"
+            yield f"event: {event}\ndata: {dumps(job_payload(current)).decode()}\n\n"
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.delete("/api/upload/{job_id}")
+async def cancel_upload(job_id: str):
+    """Cancel a queued or running upload job"""
+    job = await get_upload_jobs().cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Upload job not found")
+    return job_payload(job)
+
+QUICK_ACTIONS = [
+    {
+        "label": "📄 Document Chat",
+        "action": "switch_agent",
+        "agent": "doc_chat",
+        "description": "Upload and analyze documents"
+    },
+    {
+        "label": "💰 Expense Reports", 
+        "action": "quick_message",
+        "message": "I need to create an expense report",
+        "description": "Create and manage expense reports"
+    },
+    {
+        "label": "🎫 IT Tickets",
+        "action": "quick_message", 
+        "message": "I'm having a technical issue",
+        "description": "Get IT support and create tickets"
+    },
+    {
+        "label": "✈️ Travel Requests",
+        "action": "quick_message",
+        "message": "I need to plan a business trip",
+        "description": "Travel policies and booking assistance"
+    },
+    {
+        "label": "📚 HR Policies",
+        "action": "quick_message",
+        "message": "I have a question about company policies",
+        "description": "Employee handbook and HR policies"
+    },
+    {
+        "label": "🔍 Knowledge Base",
+        "action": "external_link",
+        "url": "https://company.sharepoint.com/knowledge",
+        "description": "Search company knowledge base"
+    }
+]
+
+def agents_payload():
+    orchestrator = get_orchestrator()
     return {
         "agents": [
             {
@@ -167,57 +537,31 @@ async def get_agents():
                 "name": config["name"],
                 "icon": config["icon"],
                 "color": config["color"],
-                "description": config["system_prompt"][:100] + "..."
+                "description": orchestrator.prompt_bundles[agent_type].system_prompt[:100] + "..."
             }
             for agent_type, config in orchestrator.agent_configs.items()
         ]
     }
 
+# Encoded on first use (or at warm-up) and revalidated by ETag; call .refresh()
+# after changing agent configs or QUICK_ACTIONS
+agents_response = PrecomputedJSON(agents_payload, settings.static_cache_max_age_seconds)
+quick_actions_response = PrecomputedJSON(lambda: {"actions": QUICK_ACTIONS}, settings.static_cache_max_age_seconds)
+
+@app.get("/api/agents")
+async def get_agents(request: Request):
+    """Get available agents information"""
+    return agents_response.response(request)
+
 @app.get("/api/quick-actions")
-async def get_quick_actions():
+async def get_quick_actions(request: Request):
     """Get quick action links for sidebar"""
-    return {
-        "actions": [
-            {
-                "label": "📄 Document Chat",
-                "action": "switch_agent",
-                "agent": "doc_chat",
-                "description": "Upload and analyze documents"
-            },
-            {
-                "label": "💰 Expense Reports", 
-                "action": "quick_message",
-                "message": "I need to create an expense report",
-                "description": "Create and manage expense reports"
-            },
-            {
-                "label": "🎫 IT Tickets",
-                "action": "quick_message", 
-                "message": "I'm having a technical issue",
-                "description": "Get IT support and create tickets"
-            },
-            {
-                "label": "✈️ Travel Requests",
-                "action": "quick_message",
-                "message": "I need to plan a business trip",
-                "description": "Travel policies and booking assistance"
-            },
-            {
-                "label": "📚 HR Policies",
-                "action": "quick_message",
-                "message": "I have a question about company policies",
-                "description": "Employee handbook and HR policies"
-            },
-            {
-                "label": "🔍 Knowledge Base",
-                "action": "external_link",
-                "url": "https://company.sharepoint.com/knowledge",
-                "description": "Search company knowledge base"
-            }
-        ]
-    }
+    return quick_actions_response.response(request)
 
 if __name__ == "__main__":
+    import uvicorn
+    
+    # Development server; run `python -m app.server` for multiple workers
     uvicorn.run(
         "app.main:app", 
         host="0.0.0.0", 
@@ -0,0 +1,257 @@
+"""Process metrics in the Prometheus text exposition format, served at /metrics.
+
+Counters, gauges and histograms live in this process; values that other
+components already track (response cache, batchers, upload store) are read
+through collectors when the endpoint is scraped. With several worker
+processes each scrape is answered by one worker, so the usual setup is to
+scrape every worker port, or to run one worker per container.
+"""
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+# Seconds; covers in-process stages (sub-millisecond) up to slow model calls
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+LabelValues = Tuple[str, ...]
+# name, type, help, [(labels, value)]
+Family = Tuple[str, str, str, List[Tuple[Dict[str, str], float]]]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(str(value))}"' for name, value in labels.items()) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    type = ""
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        if set(labels) != set(self.labels):
+            raise ValueError(f"{self.name} expects labels {self.labels}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labels)
+
+    def _labels(self, key: LabelValues) -> Dict[str, str]:
+        return dict(zip(self.labels, key))
+
+
+class Counter(_Metric):
+    """Monotonically increasing total"""
+    type = "counter"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        super().__init__(name, help, labels)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1, **labels: str):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def samples(self) -> List[Tuple[str, Dict[str, str], float]]:
+        with self._lock:
+            return [(self.name, self._labels(key), value) for key, value in self._values.items()]
+
+
+class Gauge(Counter):
+    """Value that can go up and down"""
+    type = "gauge"
+
+    def dec(self, amount: float = 1, **labels: str):
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels: str):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    @contextmanager
+    def track(self, **labels: str) -> Iterator[None]:
+        """Count the enclosed block as in progress"""
+        self.inc(1, **labels)
+        try:
+            yield
+        finally:
+            self.dec(1, **labels)
+
+
+class Histogram(_Metric):
+    """Cumulative-bucket histogram of observed values"""
+    type = "histogram"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: per-bucket counts (the last one is +Inf), sum, count
+        self._series: Dict[LabelValues, List] = {}
+
+    def observe(self, value: float, **labels: str):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    @contextmanager
+    def time(self, **labels: str) -> Iterator[None]:
+        """Observe the wall-clock duration of the enclosed block in seconds"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def count(self, **labels: str) -> int:
+        series = self._series.get(self._key(labels))
+        return series[2] if series else 0
+
+    def samples(self) -> List[Tuple[str, Dict[str, str], float]]:
+        samples = []
+        with self._lock:
+            for key, (counts, total, count) in self._series.items():
+                labels = self._labels(key)
+                cumulative = 0
+                for bound, bucket_count in zip((*self.buckets, float("inf")), counts):
+                    cumulative += bucket_count
+                    samples.append((f"{self.name}_bucket", {**labels, "le": _format_value(bound)}, cumulative))
+                samples.append((f"{self.name}_sum", labels, total))
+                samples.append((f"{self.name}_count", labels, count))
+        return samples
+
+
+class Registry:
+    """Named metrics plus collectors evaluated at scrape time"""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._collectors: List[Callable[[], List[Family]]] = []
+
+    def _register(self, metric: _Metric) -> _Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help: str, labels: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, help, labels))
+
+    def gauge(self, name: str, help: str, labels: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge(name, help, labels))
+
+    def histogram(self, name: str, help: str, labels: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, help, labels, buckets))
+
+    def add_collector(self, collector: Callable[[], List[Family]]):
+        """Register a function returning metric families computed on demand"""
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        lines: List[str] = []
+
+        def family(name: str, type: str, help: str, samples):
+            lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} {type}")
+            for sample_name, labels, value in samples:
+                lines.append(f"{sample_name}{_format_labels(labels)} {_format_value(value)}")
+
+        for metric in self._metrics.values():
+            family(metric.name, metric.type, metric.help, metric.samples())
+        for collector in self._collectors:
+            for name, type, help, samples in collector():
+                family(name, type, help, [(name, labels, value) for labels, value in samples])
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+STAGE_SECONDS = registry.histogram(
+    "chat_stage_duration_seconds",
+    "Time spent in each stage of a chat request (routing, retrieval, llm, tool_execution, serialization)",
+    ["stage"]
+)
+LLM_CALL_SECONDS = registry.histogram(
+    "llm_call_duration_seconds", "Model call latency including retries, until the last chunk for streams",
+    ["deployment", "outcome"]
+)
+LLM_IN_FLIGHT = registry.gauge("llm_in_flight_calls", "Model calls currently in progress", ["deployment"])
+LLM_QUEUE_WAIT_SECONDS = registry.histogram(
+    "llm_queue_wait_seconds", "Time model calls waited for a deployment slot, by priority lane", ["lane"]
+)
+MODEL_TIER_SECONDS = registry.histogram(
+    "model_tier_duration_seconds", "Time each cascade tier (template, small, large) spent on a turn, including escalated attempts",
+    ["tier"]
+)
+MODEL_TIER_TURNS = registry.counter("model_tier_turns_total", "Turns answered by each cascade tier", ["tier"])
+MODEL_TIER_COST = registry.counter("model_tier_cost_usd_total", "Estimated model spend by cascade tier", ["tier"])
+CASCADE_ESCALATIONS = registry.counter(
+    "cascade_escalations_total", "Turns passed from a cheaper tier to the large model, by reason", ["tier", "reason"]
+)
+LLM_TOKENS = registry.counter("llm_tokens_total", "Tokens reported in response.usage", ["deployment", "kind"])
+COALESCED_CALLS = registry.counter(
+    "llm_calls_coalesced_total", "Model calls saved by sharing an identical in-flight request", ["agent", "mode"]
+)
+TOOL_CALLS = registry.counter("tool_calls_total", "Tool executions by tool and result", ["tool", "success"])
+ADMISSION_DECISIONS = registry.counter(
+    "admission_decisions_total", "Admission outcomes: admitted, queued (then admitted), rejected, timed_out", ["result"]
+)
+ADMISSION_QUEUE_DEPTH = registry.gauge("admission_queue_depth", "Requests waiting for rate-limit capacity")
+ADMISSION_WAIT_SECONDS = registry.histogram("admission_wait_seconds", "Time queued requests waited before admission")
+OUTBOX_DELIVERIES = registry.counter(
+    "outbox_deliveries_total", "Outbox delivery attempts by kind and outcome: delivered, retry, failed", ["kind", "outcome"]
+)
+UPLOADS = registry.counter("uploads_total", "Uploaded documents accepted")
+UPLOAD_BYTES = registry.counter("upload_bytes_total", "Bytes of uploaded documents accepted")
+UPLOAD_JOBS = registry.counter(
+    "upload_jobs_total", "Upload job transitions: queued, rejected, completed, failed, cancelled", ["status"]
+)
+
+
+def stage(name: str):
+    """Time a chat pipeline stage: `with stage("retrieval"): ...`"""
+    return STAGE_SECONDS.time(stage=name)
+
+
+def cached_prompt_tokens(usage: Optional[object]) -> int:
+    """Prompt tokens served from the provider's prompt cache (usage.prompt_tokens_details.cached_tokens)"""
+    details = getattr(usage, "prompt_tokens_details", None)
+    if details is None:
+        return 0
+    # Older SDK versions keep the field as an untyped dict
+    cached = details.get("cached_tokens") if isinstance(details, dict) else getattr(details, "cached_tokens", None)
+    return cached or 0
+
+
+def record_usage(deployment: str, usage: Optional[object]):
+    """Count prompt, cached prompt and completion tokens from a response's usage block, when present"""
+    if usage is None:
+        return
+    LLM_TOKENS.inc(usage.prompt_tokens or 0, deployment=deployment, kind="prompt")
+    LLM_TOKENS.inc(cached_prompt_tokens(usage), deployment=deployment, kind="cached_prompt")
+    LLM_TOKENS.inc(usage.completion_tokens or 0, deployment=deployment, kind="completion")
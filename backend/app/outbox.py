@@ -0,0 +1,320 @@
+"""Durable outbox for tool side effects (IT tickets, expense reports).
+
+A tool call records its intent here and returns straight away; a
+background OutboxDispatcher delivers pending entries to the ticketing and
+expense backends in batches, retrying failures with exponential backoff.
+Each entry has a unique idempotency key (conversation id plus the model's
+tool call id): recording the same key twice returns the first entry, and
+the key is passed to the backend so a delivery retried after a timeout
+is not applied twice. Claimed entries are leased rather than locked, so an
+entry whose worker died is picked up again once its lease expires.
+
+Entry ids are ULIDs: a 48-bit millisecond timestamp followed by 80 random
+bits in Crockford base32, so they sort by creation time and do not collide
+across worker processes.
+"""
+import asyncio
+import json
+import logging
+import os
+import random
+import sqlite3
+import threading
+import time
+from contextlib import closing
+from typing import Any, Dict, List, Optional, Tuple
+
+from .config import settings
+from .counters import connect_shared, init_shared_db
+from .metrics import OUTBOX_DELIVERIES
+
+logger = logging.getLogger(__name__)
+
+_COLUMNS = ("id", "idempotency_key", "kind", "payload", "status", "attempts", "next_attempt_at",
+            "created_at", "delivered_at", "last_error", "result")
+_SELECT = f"SELECT {', '.join(_COLUMNS)} FROM outbox"
+
+_CROCKFORD = "0123456789ABCDEFGHJKMNPQRSTVWXYZ"
+_last_ulid = (0, 0)
+# new_ulid() is called from the event loop and from asyncio.to_thread workers
+_ulid_lock = threading.Lock()
+
+
+def new_ulid() -> str:
+    """26-character ULID; ids made in the same millisecond by this process increase monotonically"""
+    global _last_ulid
+    with _ulid_lock:
+        millis = time.time_ns() // 1_000_000
+        last_millis, last_random = _last_ulid
+        if millis <= last_millis:
+            millis, randomness = last_millis, last_random + 1
+        else:
+            randomness = int.from_bytes(os.urandom(10), "big")
+        _last_ulid = (millis, randomness)
+    value = millis << 80 | randomness & ((1 << 80) - 1)
+    return "".join(_CROCKFORD[(value >> shift) & 31] for shift in range(125, -1, -5))
+
+
+class Outbox:
+    """Pending side effects in SQLite, shared by every worker process"""
+
+    def __init__(self, path: str):
+        self.path = path
+        init_shared_db(path)
+        with closing(connect_shared(path)) as conn, conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS outbox ("
+                "id TEXT PRIMARY KEY, idempotency_key TEXT NOT NULL UNIQUE, kind TEXT NOT NULL, "
+                "payload TEXT NOT NULL, status TEXT NOT NULL, attempts INTEGER NOT NULL DEFAULT 0, "
+                "next_attempt_at REAL NOT NULL, created_at REAL NOT NULL, delivered_at REAL, "
+                "last_error TEXT, result TEXT)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS outbox_due ON outbox(status, next_attempt_at)")
+
+    def record(self, kind: str, idempotency_key: str, payload: Dict[str, Any],
+               entry_id: Optional[str] = None) -> Tuple[Dict[str, Any], bool]:
+        """Store a pending side effect; returns (stored entry, created), the earlier entry for a known key"""
+        now = time.time()
+        with closing(connect_shared(self.path)) as conn, conn:
+            created = conn.execute(
+                "INSERT INTO outbox (id, idempotency_key, kind, payload, status, next_attempt_at, created_at) "
+                "VALUES (?, ?, ?, ?, 'pending', ?, ?) ON CONFLICT(idempotency_key) DO NOTHING",
+                (entry_id or new_ulid(), idempotency_key, kind, json.dumps(payload), now, now)
+            ).rowcount == 1
+            row = conn.execute(f"{_SELECT} WHERE idempotency_key = ?", (idempotency_key,)).fetchone()
+            return self._entry(row), created
+
+    def claim(self, limit: int, lease_seconds: float) -> List[Dict[str, Any]]:
+        """Lease up to limit due entries, oldest first, for delivery"""
+        now = time.time()
+        with closing(connect_shared(self.path)) as conn, conn:
+            # Take the write lock before reading, so two workers never lease the same entries
+            conn.execute("BEGIN IMMEDIATE")
+            rows = conn.execute(
+                f"{_SELECT} WHERE status = 'pending' AND next_attempt_at <= ? ORDER BY id LIMIT ?", (now, limit)
+            ).fetchall()
+            conn.executemany(
+                "UPDATE outbox SET attempts = attempts + 1, next_attempt_at = ? WHERE id = ?",
+                [(now + lease_seconds, row[0]) for row in rows]
+            )
+        entries = [self._entry(row) for row in rows]
+        for entry in entries:
+            entry["attempts"] += 1
+        return entries
+
+    def complete(self, entry_id: str, result: Dict[str, Any]):
+        with closing(connect_shared(self.path)) as conn, conn:
+            conn.execute(
+                "UPDATE outbox SET status = 'delivered', delivered_at = ?, result = ?, last_error = NULL WHERE id = ?",
+                (time.time(), json.dumps(result), entry_id)
+            )
+
+    def fail(self, entry_id: str, error: str, retry_at: Optional[float]):
+        """Schedule another attempt at retry_at, or give up on the entry when retry_at is None"""
+        with closing(connect_shared(self.path)) as conn, conn:
+            if retry_at is None:
+                conn.execute("UPDATE outbox SET status = 'failed', last_error = ? WHERE id = ?", (error, entry_id))
+            else:
+                conn.execute(
+                    "UPDATE outbox SET next_attempt_at = ?, last_error = ? WHERE id = ?", (retry_at, error, entry_id)
+                )
+
+    def prune(self, retention_seconds: float) -> int:
+        """Delete entries delivered more than retention_seconds ago"""
+        with closing(connect_shared(self.path)) as conn, conn:
+            return conn.execute(
+                "DELETE FROM outbox WHERE status = 'delivered' AND delivered_at < ?", (time.time() - retention_seconds,)
+            ).rowcount
+
+    def get(self, entry_id: str) -> Optional[Dict[str, Any]]:
+        with closing(sqlite3.connect(self.path, timeout=5.0)) as conn:
+            row = conn.execute(f"{_SELECT} WHERE id = ?", (entry_id,)).fetchone()
+        return self._entry(row) if row else None
+
+    def next_due(self) -> Optional[float]:
+        """When the earliest pending entry becomes due, None if nothing is pending"""
+        with closing(sqlite3.connect(self.path, timeout=5.0)) as conn:
+            return conn.execute("SELECT MIN(next_attempt_at) FROM outbox WHERE status = 'pending'").fetchone()[0]
+
+    def stats(self) -> Dict[str, Any]:
+        with closing(sqlite3.connect(self.path, timeout=5.0)) as conn:
+            counts = dict(conn.execute("SELECT status, COUNT(*) FROM outbox GROUP BY status").fetchall())
+            oldest = conn.execute("SELECT MIN(created_at) FROM outbox WHERE status = 'pending'").fetchone()[0]
+        return {
+            "pending": counts.get("pending", 0),
+            "delivered": counts.get("delivered", 0),
+            "failed": counts.get("failed", 0),
+            "oldest_pending_seconds": round(time.time() - oldest, 3) if oldest else 0.0
+        }
+
+    @staticmethod
+    def _entry(row: Tuple) -> Dict[str, Any]:
+        entry = dict(zip(_COLUMNS, row))
+        entry["payload"] = json.loads(entry["payload"])
+        entry["result"] = json.loads(entry["result"]) if entry["result"] else None
+        return entry
+
+
+class StubBackend:
+    """Local stand-in for ServiceNow and Concur, for offline runs and load tests.
+
+    Deliveries are applied at most once per idempotency key, as the real
+    APIs do with an idempotency header, so redelivered entries get their
+    first result back. failure_rate makes a whole batch fail.
+    """
+
+    def __init__(self, latency_ms: float = 50.0, failure_rate: float = 0.0, seed: Optional[int] = None):
+        self.latency_ms = latency_ms
+        self.failure_rate = failure_rate
+        self._random = random.Random(seed)
+        self.applied: Dict[str, Dict[str, Any]] = {}
+        self.counters = {"batches": 0, "entries": 0, "duplicates": 0, "failures": 0}
+
+    async def deliver(self, kind: str, entries: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Apply a batch of one kind of entry; returns one result per entry, or raises"""
+        await asyncio.sleep(self.latency_ms / 1000)
+        self.counters["batches"] += 1
+        if self._random.random() < self.failure_rate:
+            self.counters["failures"] += 1
+            raise ConnectionError(f"Stub {kind} backend unavailable")
+
+        results = []
+        for entry in entries:
+            key = entry["idempotency_key"]
+            if key in self.applied:
+                self.counters["duplicates"] += 1
+            else:
+                self.counters["entries"] += 1
+                self.applied[key] = {"remote_id": f"{kind}-{len(self.applied) + 1}", "accepted_at": time.time()}
+            results.append(self.applied[key])
+        return results
+
+    def stats(self) -> Dict[str, Any]:
+        return dict(self.counters)
+
+
+class OutboxDispatcher:
+    """Background task delivering due outbox entries in batches, grouped by kind"""
+
+    def __init__(self, outbox: Outbox, backend: StubBackend, batch_size: int, poll_seconds: float,
+                 max_attempts: int, backoff_base_seconds: float, backoff_max_seconds: float,
+                 retention_seconds: float, lease_seconds: float = 60.0):
+        self.outbox = outbox
+        self.backend = backend
+        self.batch_size = max(batch_size, 1)
+        self.poll_seconds = poll_seconds
+        self.max_attempts = max_attempts
+        self.backoff_base_seconds = backoff_base_seconds
+        self.backoff_max_seconds = backoff_max_seconds
+        self.retention_seconds = retention_seconds
+        self.lease_seconds = lease_seconds
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def notify(self):
+        """Deliver newly recorded entries now rather than at the next poll"""
+        self._wakeup.set()
+
+    async def _run(self):
+        while True:
+            try:
+                delivered = await self.dispatch_once()
+            except Exception:
+                logger.exception("Outbox dispatch failed")
+                delivered = 0
+            if delivered:
+                continue
+            self._wakeup.clear()
+            try:
+                await asyncio.to_thread(self.outbox.prune, self.retention_seconds)
+                idle = await self._idle_seconds()
+            except Exception:
+                logger.exception("Outbox maintenance failed")
+                idle = self.poll_seconds
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), idle)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _idle_seconds(self) -> float:
+        next_due = await asyncio.to_thread(self.outbox.next_due)
+        if next_due is None:
+            return self.poll_seconds
+        return min(max(next_due - time.time(), 0.01), self.poll_seconds)
+
+    async def dispatch_once(self) -> int:
+        """Deliver one batch of due entries; returns how many were claimed"""
+        entries = await asyncio.to_thread(self.outbox.claim, self.batch_size, self.lease_seconds)
+        by_kind: Dict[str, List[Dict[str, Any]]] = {}
+        for entry in entries:
+            by_kind.setdefault(entry["kind"], []).append(entry)
+        await asyncio.gather(*(self._deliver(kind, batch) for kind, batch in by_kind.items()))
+        return len(entries)
+
+    async def _deliver(self, kind: str, batch: List[Dict[str, Any]]):
+        try:
+            results = await self.backend.deliver(kind, batch)
+        except Exception as e:
+            for entry in batch:
+                await asyncio.to_thread(self._retry, entry, str(e))
+            return
+        for entry, result in zip(batch, results):
+            await asyncio.to_thread(self.outbox.complete, entry["id"], result)
+            OUTBOX_DELIVERIES.inc(kind=kind, outcome="delivered")
+
+    def _retry(self, entry: Dict[str, Any], error: str):
+        # attempts already counts the attempt that just failed
+        if entry["attempts"] >= self.max_attempts:
+            logger.error("Outbox entry failed permanently", extra={
+                "id": entry["id"], "kind": entry["kind"], "attempts": entry["attempts"], "error": error
+            })
+            self.outbox.fail(entry["id"], error, None)
+            OUTBOX_DELIVERIES.inc(kind=entry["kind"], outcome="failed")
+            return
+        delay = min(self.backoff_base_seconds * 2 ** (entry["attempts"] - 1), self.backoff_max_seconds)
+        self.outbox.fail(entry["id"], error, time.time() + delay * random.uniform(0.5, 1.0))
+        OUTBOX_DELIVERIES.inc(kind=entry["kind"], outcome="retry")
+
+
+outbox_backend = StubBackend(settings.outbox_stub_latency_ms, settings.outbox_stub_failure_rate)
+
+# Process-wide outbox and dispatcher, built on first use so importing the app creates no files
+_outbox: Optional[Outbox] = None
+_dispatcher: Optional[OutboxDispatcher] = None
+
+
+def get_outbox() -> Outbox:
+    """The global outbox, created on first call"""
+    global _outbox
+    if _outbox is None:
+        _outbox = Outbox(settings.outbox_db_path)
+    return _outbox
+
+
+def get_dispatcher() -> OutboxDispatcher:
+    """The global dispatcher delivering the outbox, created on first call"""
+    global _dispatcher
+    if _dispatcher is None:
+        _dispatcher = OutboxDispatcher(
+            get_outbox(), outbox_backend,
+            batch_size=settings.outbox_batch_size,
+            poll_seconds=settings.outbox_poll_seconds,
+            max_attempts=settings.outbox_max_attempts,
+            backoff_base_seconds=settings.outbox_backoff_base_seconds,
+            backoff_max_seconds=settings.outbox_backoff_max_seconds,
+            retention_seconds=settings.outbox_retention_seconds
+        )
+    return _dispatcher
@@ -0,0 +1,51 @@
+"""Per-agent prompt bundles laid out for provider prompt caching.
+
+Azure OpenAI caches the longest previously seen prefix of a prompt (tools
+first, then messages) once it reaches 1024 tokens. Each agent therefore
+gets one bundle, built once at startup: its system prompt with the source
+indentation collapsed, and only the tools that agent uses, serialized in a
+fixed order. Requests are laid out as
+
+    tools | system prompt | conversation history | retrieved context | user message
+
+so everything before the per-request context is byte-identical between
+calls to the same agent, and between turns of the same conversation.
+"""
+import json
+from typing import Any, Dict, List, NamedTuple, Optional
+
+
+class PromptBundle(NamedTuple):
+    system_prompt: str
+    tools: Optional[List[Dict[str, Any]]]  # None when the agent calls no tools
+
+
+def normalise_prompt(text: str) -> str:
+    """Collapse indentation and line breaks inside paragraphs; keep blank-line paragraph breaks"""
+    paragraphs = [" ".join(paragraph.split()) for paragraph in text.split("\n\n")]
+    return "\n\n".join(paragraph for paragraph in paragraphs if paragraph)
+
+
+def build_prompt_bundles(agent_configs: Dict[Any, Dict[str, Any]],
+                         function_definitions: List[Dict[str, Any]]) -> Dict[Any, PromptBundle]:
+    """One bundle per agent from its config's system_prompt and tools (a list of function names)"""
+    by_name = {definition["function"]["name"]: definition for definition in function_definitions}
+    bundles = {}
+    for agent_type, config in agent_configs.items():
+        unknown = [name for name in config.get("tools", []) if name not in by_name]
+        if unknown:
+            raise ValueError(f"Agent {agent_type} lists unknown tools: {unknown}")
+        # A JSON round trip with sorted keys gives every call the same bytes
+        tools = [json.loads(json.dumps(by_name[name], sort_keys=True)) for name in config.get("tools", [])]
+        bundles[agent_type] = PromptBundle(normalise_prompt(config["system_prompt"]), tools or None)
+    return bundles
+
+
+def build_messages(bundle: PromptBundle, history: List[Dict[str, str]], message: str,
+                   context: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Chat messages with the cacheable prefix first and per-request context last"""
+    messages: List[Dict[str, Any]] = [{"role": "system", "content": bundle.system_prompt}, *history]
+    if context:
+        messages.append({"role": "system", "content": context})
+    messages.append({"role": "user", "content": message})
+    return messages
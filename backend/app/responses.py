@@ -0,0 +1,59 @@
+"""JSON encoding for API responses and pre-encoded static payloads.
+
+orjson is used when installed (it is in requirements.txt); the standard
+library encoder is the fallback so the app still starts without it.
+"""
+import hashlib
+import json
+from typing import Any, Callable, Optional
+
+from fastapi.responses import JSONResponse
+from starlette.requests import Request
+from starlette.responses import Response
+
+try:
+    import orjson
+    from fastapi.responses import ORJSONResponse as DefaultJSONResponse
+except ImportError:
+    orjson = None
+    DefaultJSONResponse = JSONResponse
+
+
+def dumps(content: Any) -> bytes:
+    """Encode already JSON-compatible content (see jsonable_encoder) to UTF-8 bytes"""
+    if orjson is not None:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(content, ensure_ascii=False, separators=(",", ":")).encode()
+
+
+def _etag_matches(header: str, etag: str) -> bool:
+    # If-None-Match uses weak comparison: W/"x" matches "x"
+    candidates = [candidate.strip() for candidate in header.split(",")]
+    return "*" in candidates or etag in (candidate.removeprefix("W/") for candidate in candidates)
+
+
+class PrecomputedJSON:
+    """A JSON payload encoded once and served with a strong ETag and 304 revalidation.
+
+    build() returns the payload; it runs on first use and again after
+    refresh(), which callers invoke when the underlying configuration changes.
+    """
+
+    def __init__(self, build: Callable[[], Any], max_age: int):
+        self.build = build
+        self.max_age = max_age
+        self.body: Optional[bytes] = None
+        self.etag = ""
+
+    def refresh(self):
+        self.body = dumps(self.build())
+        self.etag = f'"{hashlib.sha256(self.body).hexdigest()[:32]}"'
+
+    def response(self, request: Request) -> Response:
+        if self.body is None:
+            self.refresh()
+        headers = {"ETag": self.etag, "Cache-Control": f"public, max-age={self.max_age}"}
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match and _etag_matches(if_none_match, self.etag):
+            return Response(status_code=304, headers=headers)
+        return Response(self.body, media_type="application/json", headers=headers)
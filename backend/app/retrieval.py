@@ -0,0 +1,188 @@
+import hashlib
+import json
+import mmap
+import os
+import shutil
+import uuid
+from typing import Any, Dict, List, NamedTuple, Sequence, Tuple
+import numpy as np
+from .conversations import estimate_tokens
+from .search import B, K1, idf, length_norms, term_frequencies, term_score, tokenize
+
+# Field weights used when scoring passages; titles count double
+_FIELDS = {"title": 2, "text": 1}
+
+
+class Passage(NamedTuple):
+    source: Dict[str, Any]
+    score: float
+    confidence: float
+
+
+def _fingerprint(passages: Sequence[Dict[str, Any]]) -> str:
+    payload = json.dumps({"passages": passages, "fields": _FIELDS, "k1": K1, "b": B}, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()[:16]
+
+
+def _write_index(passages: Sequence[Dict[str, Any]], agents: Sequence[str], directory: str):
+    """Write the index files for passages into directory, scored as SearchIndex scores"""
+    counts = [term_frequencies(passage, _FIELDS) for passage in passages]
+
+    n = len(passages)
+    lengths = np.array([sum(c.values()) for c in counts], dtype=np.float64)
+    norms = length_norms(lengths, lengths.mean() if n else 0.0)
+
+    postings: Dict[str, List[Tuple[int, int]]] = {}
+    for doc, terms in enumerate(counts):
+        for term, tf in terms.items():
+            postings.setdefault(term, []).append((doc, tf))
+
+    vocabulary = sorted(postings)
+    indptr = np.zeros(len(vocabulary) + 1, dtype=np.int64)
+    doc_ids, impacts, idfs = [], [], np.zeros(len(vocabulary), dtype=np.float32)
+    for t, term in enumerate(vocabulary):
+        entries = postings[term]
+        idfs[t] = idf(n, len(entries))
+        for doc, tf in entries:
+            doc_ids.append(doc)
+            # The index is static, so the full BM25 contribution is precomputed
+            impacts.append(term_score(idfs[t], tf, norms[doc]))
+        indptr[t + 1] = len(doc_ids)
+
+    agent_masks = np.zeros(n, dtype=np.uint8)
+    for doc, passage in enumerate(passages):
+        for agent in passage["agents"]:
+            agent_masks[doc] |= 1 << agents.index(agent)
+
+    width = max((len(term) for term in vocabulary), default=1)
+    np.save(os.path.join(directory, "terms.npy"), np.array(vocabulary, dtype=f"<U{width}"))
+    np.save(os.path.join(directory, "indptr.npy"), indptr)
+    np.save(os.path.join(directory, "doc_ids.npy"), np.array(doc_ids, dtype=np.int32))
+    np.save(os.path.join(directory, "impacts.npy"), np.array(impacts, dtype=np.float32))
+    np.save(os.path.join(directory, "idf.npy"), idfs)
+    np.save(os.path.join(directory, "agents.npy"), agent_masks)
+
+    # Passage metadata as JSON lines plus byte offsets, so records are read straight from the mapping
+    offsets = [0]
+    with open(os.path.join(directory, "passages.jsonl"), "wb") as f:
+        for passage in passages:
+            line = json.dumps({k: v for k, v in passage.items() if k != "agents"}).encode() + b"\n"
+            f.write(line)
+            offsets.append(offsets[-1] + len(line))
+    np.save(os.path.join(directory, "offsets.npy"), np.array(offsets, dtype=np.int64))
+    with open(os.path.join(directory, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump({"agents": list(agents), "passages": n, "terms": len(vocabulary)}, f)
+
+
+def ensure_index(root: str, passages: Sequence[Dict[str, Any]], agents: Sequence[str]) -> str:
+    """Build the on-disk index for passages unless an identical one exists; returns its directory.
+
+    Each build goes to root/<content fingerprint>, written to a temporary
+    directory first and renamed into place, so concurrent workers either
+    build the same index or pick up the one another worker finished.
+    """
+    path = os.path.join(root, _fingerprint(passages))
+    if os.path.exists(os.path.join(path, "meta.json")):
+        return path
+    os.makedirs(root, exist_ok=True)
+    temp = os.path.join(root, f".build-{uuid.uuid4().hex}")
+    os.makedirs(temp)
+    try:
+        _write_index(passages, agents, temp)
+        os.rename(temp, path)
+    except OSError:
+        # Another worker won the race; its copy is identical
+        if not os.path.exists(os.path.join(path, "meta.json")):
+            raise
+    finally:
+        if os.path.exists(temp):
+            shutil.rmtree(temp, ignore_errors=True)
+    return path
+
+
+class PassageIndex:
+    """Read-only BM25 passage index memory-mapped from an ensure_index directory.
+
+    Every array is opened with np.load(mmap_mode="r") and passage metadata is
+    read from a mapped JSON-lines file, so any number of worker processes
+    share the operating system's single cached copy of the index.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(os.path.join(path, "meta.json"), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        self.agents: List[str] = meta["agents"]
+        self.size: int = meta["passages"]
+
+        def load(name: str) -> np.ndarray:
+            return np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r")
+
+        self.terms = load("terms")
+        self.indptr = load("indptr")
+        self.doc_ids = load("doc_ids")
+        self.impacts = load("impacts")
+        self.idf = load("idf")
+        self.agent_masks = load("agents")
+        self.offsets = load("offsets")
+        with open(os.path.join(path, "passages.jsonl"), "rb") as f:
+            self._records = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if self.size else b""
+
+    def _term_id(self, term: str) -> int:
+        if not len(self.terms) or len(term) > self.terms.dtype.itemsize // 4:
+            return -1
+        position = int(np.searchsorted(self.terms, term))
+        if position < len(self.terms) and self.terms[position] == term:
+            return position
+        return -1
+
+    def passage(self, doc: int) -> Dict[str, Any]:
+        return json.loads(self._records[int(self.offsets[doc]):int(self.offsets[doc + 1])])
+
+    def search(self, query: str, agent: str, top_k: int) -> List[Passage]:
+        """Top-k passages available to agent, with BM25 score and a 0-1 confidence.
+
+        Confidence is the score as a share of the best score any passage
+        could reach for the query's known terms.
+        """
+        if not self.size or agent not in self.agents:
+            return []
+        scores = np.zeros(self.size, dtype=np.float32)
+        ceiling = 0.0
+        for term in set(tokenize(query)):
+            t = self._term_id(term)
+            if t < 0:
+                continue
+            start, end = self.indptr[t], self.indptr[t + 1]
+            scores[self.doc_ids[start:end]] += self.impacts[start:end]
+            # The most a term can add: its score as tf grows without bound
+            ceiling += float(self.idf[t]) * (K1 + 1)
+
+        bit = np.uint8(1 << self.agents.index(agent))
+        scores[(self.agent_masks & bit) == 0] = 0
+        matched = int(np.count_nonzero(scores))
+        if not matched:
+            return []
+        k = min(top_k, matched)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [
+            Passage(self.passage(doc), round(float(scores[doc]), 4), round(min(float(scores[doc]) / ceiling, 1.0), 2))
+            for doc in top.tolist()
+        ]
+
+
+def pack_passages(passages: List[Passage], token_budget: int) -> Tuple[str, List[Passage]]:
+    """Prompt block of the best passages that fit in token_budget, and the passages used"""
+    blocks, used, remaining = [], [], token_budget
+    for passage in passages:
+        source = passage.source
+        block = f"[{len(used) + 1}] {source['title']} ({source['type']})\n{source['text']}"
+        cost = estimate_tokens(block)
+        if cost > remaining:
+            # A long passage may not fit where a shorter, lower-ranked one still does
+            continue
+        blocks.append(block)
+        used.append(passage)
+        remaining -= cost
+    return "\n\n".join(blocks), used
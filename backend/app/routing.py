@@ -0,0 +1,112 @@
+import re
+import string
+from typing import Dict, List, Optional, Sequence, Set, Tuple
+import numpy as np
+from .models import AgentType
+
+# Agent used when no keyword matches
+DEFAULT_AGENT = AgentType.GENERAL
+
+_PUNCTUATION_TO_SPACE = str.maketrans({c: " " for c in string.punctuation})
+
+
+class IntentRouter:
+    """Keyword router compiled once at startup.
+
+    Single-word keywords (and their plural forms) go into one vocabulary
+    set, so a message is tokenised once and intersected with it in a single
+    pass regardless of how many agents or keywords are configured. Matches
+    only count on whole words ("hr" no longer fires inside "three").
+    Multi-word phrases such as "per diem" are matched with one combined
+    word-boundary regex, which only runs when a phrase's first word occurs.
+    route_batch() scores many messages at once as a keyword-presence matrix
+    times a keyword-by-agent weight matrix.
+    """
+
+    def __init__(self, agent_configs: Dict[AgentType, Dict]):
+        # Agent order breaks ties, matching the declaration order of agent_configs
+        self.agents: List[AgentType] = list(agent_configs.keys())
+        self._weights: Dict[str, List[Tuple[AgentType, float]]] = {}
+        # Surface form (keyword or its plural) -> canonical single-word keyword
+        self._forms: Dict[str, str] = {}
+        phrases = set()
+
+        for agent_type, config in agent_configs.items():
+            weights = config.get("keyword_weights", {})
+            for keyword in config["keywords"]:
+                keyword = " ".join(keyword.lower().split())
+                # Multi-word phrases are more specific than single words
+                weight = weights.get(keyword, float(len(keyword.split())))
+                self._weights.setdefault(keyword, []).append((agent_type, weight))
+                if " " in keyword:
+                    phrases.add(keyword)
+                    continue
+                forms = [keyword, keyword + "s", keyword + "es"]
+                if keyword.endswith("y"):
+                    forms.append(keyword[:-1] + "ies")
+                for form in forms:
+                    self._forms.setdefault(form, keyword)
+
+        # Keyword x agent weight matrix for batch scoring
+        self._keyword_ids = {keyword: i for i, keyword in enumerate(self._weights)}
+        self._weight_matrix = np.zeros((len(self._weights), len(self.agents)))
+        agent_ids = {agent_type: i for i, agent_type in enumerate(self.agents)}
+        for keyword, entries in self._weights.items():
+            for agent_type, weight in entries:
+                self._weight_matrix[self._keyword_ids[keyword], agent_ids[agent_type]] += weight
+
+        self._vocabulary = frozenset(self._forms)
+        # Phrases are only searched for when one of their first words is present
+        self._phrase_heads = frozenset(p.split()[0] for p in phrases)
+        self._phrase_pattern = None
+        if phrases:
+            alternatives = "|".join(re.escape(p).replace(r"\ ", r"\s+") for p in sorted(phrases, key=len, reverse=True))
+            self._phrase_pattern = re.compile(rf"\b(?:{alternatives})\b")
+
+    def _matches(self, message: str) -> Set[str]:
+        """Canonical keywords present in a message"""
+        message_lower = message.lower()
+        words = message_lower.translate(_PUNCTUATION_TO_SPACE).split()
+        forms = self._forms
+        matched = {forms[word] for word in self._vocabulary.intersection(words)}
+        if self._phrase_pattern is not None and not self._phrase_heads.isdisjoint(words):
+            matched.update(" ".join(m.split()) for m in self._phrase_pattern.findall(message_lower))
+        return matched
+
+    def scores(self, message: str) -> Dict[AgentType, float]:
+        """Weighted keyword scores for each agent; each keyword counts once per message"""
+        scores = dict.fromkeys(self.agents, 0.0)
+        for keyword in self._matches(message):
+            for agent_type, weight in self._weights[keyword]:
+                scores[agent_type] += weight
+        return scores
+
+    def route(self, message: str, agent_hint: Optional[AgentType] = None) -> AgentType:
+        """Pick the agent for a message; an explicit hint skips scoring entirely"""
+        if agent_hint is not None:
+            return agent_hint
+
+        matched = self._matches(message)
+        if not matched:
+            return DEFAULT_AGENT
+
+        scores = dict.fromkeys(self.agents, 0.0)
+        for keyword in matched:
+            for agent_type, weight in self._weights[keyword]:
+                scores[agent_type] += weight
+        return max(self.agents, key=scores.__getitem__)
+
+    def route_batch(self, messages: Sequence[str]) -> List[AgentType]:
+        """route() for many messages in one vectorized scoring pass"""
+        rows, columns = [], []
+        for row, message in enumerate(messages):
+            for keyword in self._matches(message):
+                rows.append(row)
+                columns.append(self._keyword_ids[keyword])
+        presence = np.zeros((len(messages), len(self._keyword_ids)))
+        presence[rows, columns] = 1.0
+        matched = np.zeros(len(messages), dtype=bool)
+        matched[rows] = True
+        # argmax returns the first maximum, so ties go to the earlier agent as in route()
+        best = (presence @ self._weight_matrix).argmax(axis=1)
+        return [self.agents[b] if m else DEFAULT_AGENT for b, m in zip(best.tolist(), matched.tolist())]
@@ -0,0 +1,142 @@
+"""Priority lanes for model calls.
+
+Every model call is assigned a lane ("urgent", "standard", "routine", ...)
+from the agent handling it, configurable message rules and, once the model
+files an IT ticket, the ticket's priority. LaneScheduler then hands out a
+deployment's concurrency slots with weighted fair queuing: waiting calls
+are ordered by virtual finish tags, so a lane with weight 8 gets about 8
+slots for each slot of a weight-1 lane while both are busy, yet an idle
+lane's share is not lost to anyone. Per-lane caps keep a flood in one lane
+from occupying every slot, leaving room for urgent calls.
+"""
+import asyncio
+import re
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Deque, Dict, List, Optional, Tuple
+
+from .metrics import LLM_QUEUE_WAIT_SECONDS
+
+DEFAULT_LANE = "standard"
+
+
+class LaneRules:
+    """Chooses the lane of a chat turn"""
+
+    def __init__(self, weights: Dict[str, float], agent_lanes: Dict[str, str],
+                 rules: List[Dict[str, str]], ticket_lanes: Dict[str, str]):
+        self.weights = weights
+        self.agent_lanes = agent_lanes
+        self.rules: List[Tuple[re.Pattern, str]] = [
+            (re.compile(rule["pattern"], re.IGNORECASE), rule["lane"]) for rule in rules
+        ]
+        self.ticket_lanes = ticket_lanes
+
+    def _more_urgent(self, lane: str, other: str) -> str:
+        return other if self.weights.get(other, 0) > self.weights.get(lane, 0) else lane
+
+    def classify(self, agent: str, message: str) -> str:
+        """The agent's lane, raised by the most urgent matching rule"""
+        lane = self.agent_lanes.get(agent, DEFAULT_LANE)
+        for pattern, rule_lane in self.rules:
+            if pattern.search(message):
+                lane = self._more_urgent(lane, rule_lane)
+        return lane
+
+    def escalate(self, lane: str, tool_name: str, arguments: Dict[str, Any]) -> str:
+        """Raise the lane for the rest of the turn when the model files a high-priority ticket"""
+        if tool_name != "create_it_ticket":
+            return lane
+        ticket_lane = self.ticket_lanes.get(str(arguments.get("priority", "")).lower())
+        return self._more_urgent(lane, ticket_lane) if ticket_lane else lane
+
+
+class _Waiter:
+    __slots__ = ("tag", "future", "enqueued_at")
+
+    def __init__(self, tag: float, future: asyncio.Future):
+        self.tag = tag
+        self.future = future
+        self.enqueued_at = time.perf_counter()
+
+
+class LaneScheduler:
+    """Weighted fair queuing of a fixed number of concurrency slots across lanes"""
+
+    def __init__(self, capacity: int, weights: Dict[str, float], caps: Optional[Dict[str, int]] = None):
+        self.capacity = capacity
+        self.weights = weights
+        self.caps = caps or {}
+        self.in_flight = 0
+        self._running: Dict[str, int] = {}
+        self._waiting: Dict[str, Deque[_Waiter]] = {}
+        # Start-time fair queuing: lane finish tags advance by 1/weight per call
+        self._virtual_time = 0.0
+        self._finish: Dict[str, float] = {}
+
+    def _weight(self, lane: str) -> float:
+        return self.weights.get(lane, 1.0)
+
+    def _has_room(self, lane: str) -> bool:
+        return self.in_flight < self.capacity and self._running.get(lane, 0) < self.caps.get(lane, self.capacity)
+
+    def _tag(self, lane: str) -> float:
+        tag = max(self._virtual_time, self._finish.get(lane, 0.0)) + 1 / self._weight(lane)
+        self._finish[lane] = tag
+        return tag
+
+    def _start(self, lane: str, tag: float):
+        self.in_flight += 1
+        self._running[lane] = self._running.get(lane, 0) + 1
+        self._virtual_time = max(self._virtual_time, tag - 1 / self._weight(lane))
+
+    def _release(self, lane: str):
+        self.in_flight -= 1
+        self._running[lane] -= 1
+        self._dispatch()
+
+    def _dispatch(self):
+        """Start the waiting calls with the smallest tags while slots are free"""
+        while self.in_flight < self.capacity:
+            best: Optional[str] = None
+            for lane, queue in self._waiting.items():
+                if queue and self._has_room(lane) and (best is None or queue[0].tag < self._waiting[best][0].tag):
+                    best = lane
+            if best is None:
+                return
+            waiter = self._waiting[best].popleft()
+            self._start(best, waiter.tag)
+            waiter.future.set_result(None)
+
+    @asynccontextmanager
+    async def slot(self, lane: str = DEFAULT_LANE) -> AsyncIterator[None]:
+        """Hold one of the deployment's slots for the enclosed model call"""
+        waiting = self._waiting.setdefault(lane, deque())
+        if not waiting and self._has_room(lane):
+            self._start(lane, self._tag(lane))
+            LLM_QUEUE_WAIT_SECONDS.observe(0.0, lane=lane)
+        else:
+            waiter = _Waiter(self._tag(lane), asyncio.get_running_loop().create_future())
+            waiting.append(waiter)
+            try:
+                await waiter.future
+            except asyncio.CancelledError:
+                if waiter.future.done() and not waiter.future.cancelled():
+                    # Granted just as the caller gave up: hand the slot on
+                    self._release(lane)
+                else:
+                    waiting.remove(waiter)
+                raise
+            LLM_QUEUE_WAIT_SECONDS.observe(time.perf_counter() - waiter.enqueued_at, lane=lane)
+        try:
+            yield
+        finally:
+            self._release(lane)
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        lanes = set(self._running) | set(self._waiting)
+        return {
+            lane: {"running": self._running.get(lane, 0), "waiting": len(self._waiting.get(lane, ()))}
+            for lane in sorted(lanes)
+        }
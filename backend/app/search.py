@@ -0,0 +1,253 @@
+import math
+import re
+from typing import Any, Dict, Hashable, Iterable, List, NamedTuple, Optional, Tuple
+import numpy as np
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+# Function words that carry no retrieval signal
+STOPWORDS = frozenset(
+    "a an and are as at be by can do does for from how i in is it me my of on or our "
+    "please should that the this to was we what when where which who why will with you your".split()
+)
+
+
+def _fold_plural(token: str) -> str:
+    """Map simple plurals onto their singular so "policies" finds "policy" """
+    if len(token) > 4 and token.endswith("ies"):
+        return token[:-3] + "y"
+    if len(token) > 3 and token.endswith("s") and not token.endswith(("ss", "us", "is")):
+        return token[:-1]
+    return token
+
+
+def tokenize(text: str) -> List[str]:
+    return [_fold_plural(token) for token in _TOKEN.findall(text.lower()) if token not in STOPWORDS]
+
+
+# BM25 scoring shared by SearchIndex and the memory-mapped passage index (retrieval.py)
+K1 = 1.5
+B = 0.75
+
+
+def term_frequencies(document: Dict[str, Any], fields: Dict[str, int]) -> Dict[str, int]:
+    """Term counts of a document's indexed fields, each field's terms counted `weight` times"""
+    counts: Dict[str, int] = {}
+    for field, weight in fields.items():
+        for term in tokenize(str(document.get(field) or "")):
+            counts[term] = counts.get(term, 0) + weight
+    return counts
+
+
+def idf(documents: int, document_frequency: int) -> float:
+    return math.log(1 + (documents - document_frequency + 0.5) / (document_frequency + 0.5))
+
+
+def length_norms(lengths: np.ndarray, average_length: float, k1: float = K1, b: float = B) -> np.ndarray:
+    """k1 * (1 - b + b * length / average length) for every document"""
+    return k1 * (1 - b + b * lengths / (average_length or 1.0))
+
+
+def term_score(term_idf, tf, norm, k1: float = K1):
+    """A term's BM25 contribution to a document's score (scalars or numpy arrays)"""
+    return term_idf * tf * (k1 + 1) / (tf + norm)
+
+
+class SearchHit(NamedTuple):
+    key: Hashable
+    score: float
+    document: Dict[str, Any]
+
+
+class SearchResult(NamedTuple):
+    hits: List[SearchHit]
+    total: int  # Documents matching at least one query term
+
+
+class SearchIndex:
+    """In-memory inverted index with BM25 ranking and incremental updates.
+
+    Documents are dicts identified by a caller-chosen key; the text of the
+    configured fields is indexed, each field's terms counted `weight` times
+    so that, for example, title matches outrank body matches. Adding,
+    replacing or removing a document only touches that document's postings,
+    and sync() reconciles the index with a fresh copy of the source data by
+    re-indexing only the records whose indexed text changed. Slots freed by
+    removals are reused, so the scoring arrays stay as large as the most
+    documents the index has held at once.
+
+    Queries are scored with numpy: each queried term's postings are turned
+    into (slot, tf) arrays once and reused until the index next changes.
+    """
+
+    def __init__(self, fields: Dict[str, int], k1: float = K1, b: float = B):
+        self.fields = fields
+        self.k1 = k1
+        self.b = b
+        # term -> {slot: weighted term frequency}
+        self._postings: Dict[str, Dict[int, int]] = {}
+        self._lengths: Dict[int, int] = {}
+        self._terms: Dict[int, Tuple[str, ...]] = {}
+        self._documents: Dict[int, Dict[str, Any]] = {}
+        self._fingerprints: Dict[int, int] = {}
+        self._slots: Dict[Hashable, int] = {}
+        self._keys: Dict[int, Hashable] = {}
+        self._total_length = 0
+        self._next_slot = 0
+        self._free_slots: List[int] = []
+        # Scoring arrays, valid until the next add/remove
+        self._norms: Optional[np.ndarray] = None
+        self._term_arrays: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._slots
+
+    def _field_texts(self, document: Dict[str, Any]) -> Tuple[str, ...]:
+        return tuple(str(document.get(field) or "") for field in self.fields)
+
+    def add(self, key: Hashable, document: Dict[str, Any]):
+        """Index a document, replacing any previous document with the same key"""
+        if key in self._slots:
+            self.remove(key)
+        self._invalidate()
+        texts = self._field_texts(document)
+        counts = term_frequencies(document, self.fields)
+
+        if self._free_slots:
+            slot = self._free_slots.pop()
+        else:
+            slot = self._next_slot
+            self._next_slot += 1
+        for term, tf in counts.items():
+            self._postings.setdefault(term, {})[slot] = tf
+        length = sum(counts.values())
+        self._lengths[slot] = length
+        self._total_length += length
+        self._terms[slot] = tuple(counts)
+        self._documents[slot] = document
+        self._fingerprints[slot] = hash(texts)
+        self._slots[key] = slot
+        self._keys[slot] = key
+
+    def remove(self, key: Hashable):
+        slot = self._slots.pop(key, None)
+        if slot is None:
+            return
+        self._invalidate()
+        for term in self._terms.pop(slot):
+            postings = self._postings[term]
+            del postings[slot]
+            if not postings:
+                del self._postings[term]
+        self._total_length -= self._lengths.pop(slot)
+        del self._documents[slot], self._fingerprints[slot], self._keys[slot]
+        self._free_slots.append(slot)
+
+    def sync(self, records: Iterable[Tuple[Hashable, Dict[str, Any]]]) -> Dict[str, int]:
+        """Make the index match records, re-indexing only what changed"""
+        seen = set()
+        added = updated = 0
+        for key, document in records:
+            seen.add(key)
+            slot = self._slots.get(key)
+            if slot is None:
+                self.add(key, document)
+                added += 1
+            elif self._fingerprints[slot] != hash(self._field_texts(document)):
+                self.add(key, document)
+                updated += 1
+            else:
+                # Same indexed text; keep the postings but serve the fresh record
+                self._documents[slot] = document
+        stale = [key for key in self._slots if key not in seen]
+        for key in stale:
+            self.remove(key)
+        return {"added": added, "updated": updated, "removed": len(stale)}
+
+    def documents(self) -> List[Tuple[Hashable, Dict[str, Any]]]:
+        """All documents in insertion order (a replaced document counts as newly inserted)"""
+        return [(key, self._documents[slot]) for key, slot in self._slots.items()]
+
+    def _invalidate(self):
+        self._norms = None
+        self._term_arrays.clear()
+
+    def _length_norms(self) -> np.ndarray:
+        if self._norms is None:
+            lengths = np.zeros(self._next_slot)
+            lengths[list(self._lengths)] = list(self._lengths.values())
+            self._norms = length_norms(lengths, self._total_length / len(self._lengths), self.k1, self.b)
+        return self._norms
+
+    def _postings_arrays(self, term: str) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        arrays = self._term_arrays.get(term)
+        if arrays is None:
+            postings = self._postings.get(term)
+            if not postings:
+                return None
+            arrays = self._term_arrays[term] = (
+                np.fromiter(postings.keys(), dtype=np.int64, count=len(postings)),
+                np.fromiter(postings.values(), dtype=np.float64, count=len(postings))
+            )
+        return arrays
+
+    def search(self, query: str, top_k: int) -> SearchResult:
+        """BM25 top-k for a query"""
+        n = len(self._slots)
+        if not n:
+            return SearchResult([], 0)
+        norms = self._length_norms()
+
+        scores = np.zeros(self._next_slot)
+        for term in set(tokenize(query)):
+            arrays = self._postings_arrays(term)
+            if arrays is None:
+                continue
+            slots, tfs = arrays
+            # A term appears once per slot in its postings, so fancy-index += is safe
+            scores[slots] += term_score(idf(n, len(slots)), tfs, norms[slots], self.k1)
+
+        matched = int(np.count_nonzero(scores))
+        if not matched:
+            return SearchResult([], 0)
+        k = min(top_k, matched)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        hits = [SearchHit(self._keys[slot], round(float(scores[slot]), 4), self._documents[slot]) for slot in top.tolist()]
+        return SearchResult(hits, matched)
+
+
+class KnowledgeBase:
+    """Named BM25 indexes over the assistant's knowledge sources.
+
+    Each source is configured with a loader returning its current records,
+    the record field that identifies a record and the weighted fields to
+    index. Indexes are built once on construction; call refresh() after a
+    source's data changes to re-index just the records that differ.
+    """
+
+    def __init__(self, sources: Dict[str, Dict[str, Any]]):
+        self.sources = sources
+        self.indexes = {name: SearchIndex(source["fields"]) for name, source in sources.items()}
+        self.refresh()
+
+    def refresh(self, name: Optional[str] = None) -> Dict[str, Dict[str, int]]:
+        """Re-sync one source (or all) with its loader; returns the change counts"""
+        names = [name] if name else list(self.sources)
+        changes = {}
+        for source_name in names:
+            source = self.sources[source_name]
+            records = source["loader"]()
+            changes[source_name] = self.indexes[source_name].sync(
+                (record[source["key"]], record) for record in records
+            )
+        return changes
+
+    def search(self, name: str, query: str, top_k: int) -> SearchResult:
+        return self.indexes[name].search(query, top_k)
+
+    def stats(self) -> Dict[str, int]:
+        return {name: len(index) for name, index in self.indexes.items()}
@@ -0,0 +1,66 @@
+"""Production server entry point.
+
+    python -m app.server --workers 4
+
+Runs uvicorn with several worker processes (no reload). Shared read-only
+data is prepared once in the parent before the workers start: the retrieval
+index files are built so that every worker only memory-maps them, and the
+SQLite databases are created and switched to WAL. Uvicorn starts workers as
+fresh processes rather than forked copies, so sharing happens through the
+page cache of those files, not copy-on-write memory.
+
+With more than one worker, in-process state would diverge between workers,
+so conversations, the response cache, shared counters and uploaded-document
+lookups are switched to the SQLite backends automatically.
+"""
+import argparse
+import logging
+import os
+import uvicorn
+from .config import settings
+from .logs import configure_logging
+
+logger = logging.getLogger(__name__)
+
+
+def prepare_shared_state():
+    """Build the shared indexes and databases before any worker starts"""
+    from .cache import create_response_cache
+    from .conversations import create_conversation_store
+    from .models import AgentType
+    from .retrieval import ensure_index
+    from .services import knowledge_passages
+    from .storage import get_upload_store
+
+    path = ensure_index(settings.retrieval_index_dir, knowledge_passages(), [agent.value for agent in AgentType])
+    logger.info("Retrieval index ready", extra={"path": path})
+    create_conversation_store()
+    create_response_cache()
+    logger.info("Upload store ready", extra={"path": get_upload_store().root})
+
+
+def use_shared_backends():
+    """Point this process and the workers it spawns at the SQLite state backends"""
+    for name, attribute in (("STATE_BACKEND", "state_backend"), ("CONVERSATION_BACKEND", "conversation_backend")):
+        if getattr(settings, attribute) != "sqlite":
+            logger.info("Multiple workers: sharing state through SQLite", extra={"setting": name})
+            # Workers are new processes that read their settings from the environment
+            os.environ[name] = "sqlite"
+            setattr(settings, attribute, "sqlite")
+
+
+def run(host: str, port: int, workers: int):
+    configure_logging()
+    if workers > 1:
+        use_shared_backends()
+    prepare_shared_state()
+    uvicorn.run("app.main:app", host=host, port=port, workers=workers, reload=False, log_level="warning")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the API with multiple worker processes")
+    parser.add_argument("--host", default=settings.server_host)
+    parser.add_argument("--port", type=int, default=settings.server_port)
+    parser.add_argument("--workers", type=int, default=settings.server_workers)
+    args = parser.parse_args()
+    run(args.host, args.port, args.workers)
@@ -1,97 +1,184 @@
 from datetime import datetime, timedelta
 import random
+import re
 import string
 from typing import Dict, List, Any
-from .models import TicketResponse, ExpenseReport, DocumentAnalysis
+from .models import AgentType, TicketResponse, ExpenseReport, DocumentAnalysis
+from .search import KnowledgeBase
+from .outbox import new_ulid
+
+# Demo source data, defined once and indexed by the knowledge base below
+HR_POLICIES = [
+    {
+        "title": "Remote Work Policy",
+        "category": "work_arrangements",
+        "content": "Clinical staff may work remotely for administrative tasks up to 2 days per week with supervisor approval.",
+        "source": "Employee Handbook v4.2",
+        "last_updated": "2024-03-15"
+    },
+    {
+        "title": "Vacation Policy",
+        "category": "time_off",
+        "content": "Full-time employees accrue 15 days PTO annually, increasing to 20 days after 5 years of service.",
+        "source": "HR Policy Manual Section 3.1",
+        "last_updated": "2024-01-10"
+    },
+    {
+        "title": "HIPAA Compliance Training",
+        "category": "training",
+        "content": "All staff must complete HIPAA training annually. Next deadline: December 31, 2024.",
+        "source": "Compliance Training Portal",
+        "last_updated": "2024-06-01"
+    }
+]
+
+
+IT_KNOWLEDGE_BASE = [
+    {
+        "issue": "Slow computer performance",
+        "solution": "1. Restart computer 2. Clear browser cache 3. Run disk cleanup 4. Check for malware",
+        "category": "performance",
+        "source": "IT Support Wiki",
+        "success_rate": "85%"
+    },
+    {
+        "issue": "Cannot access patient database",
+        "solution": "Check VPN connection, verify credentials, contact IT if problem persists",
+        "category": "access",
+        "source": "Critical Systems Guide",
+        "success_rate": "92%"
+    },
+    {
+        "issue": "Email not syncing",
+        "solution": "Sign out and back into Outlook, check internet connection, restart email app",
+        "category": "email",
+        "source": "Email Troubleshooting Guide",
+        "success_rate": "78%"
+    }
+]
+
+
+TRAVEL_POLICIES = [
+    {
+        "destination_type": "domestic",
+        "per_diem": "$75/day",
+        "hotel_limit": "$150/night",
+        "approval_required": "Manager approval for trips > 3 days",
+        "source": "Travel Policy 2024",
+        "booking_platform": "Concur Travel"
+    },
+    {
+        "destination_type": "international",
+        "per_diem": "$100/day",
+        "hotel_limit": "$200/night", 
+        "approval_required": "VP approval required",
+        "source": "International Travel Guidelines",
+        "booking_platform": "Corporate Travel Agency"
+    }
+]
+
+
+SHAREPOINT_SOURCES = [
+    {
+        "title": "Employee Handbook 2024",
+        "url": "https://company.sharepoint.com/sites/hr/handbook",
+        "type": "SharePoint",
+        "last_modified": "2024-03-15",
+        "confidence": 0.95
+    },
+    {
+        "title": "IT Security Policies",
+        "url": "https://company.sharepoint.com/sites/it/security",
+        "type": "SharePoint", 
+        "last_modified": "2024-05-20",
+        "confidence": 0.88
+    },
+    {
+        "title": "Clinical Protocols Manual",
+        "url": "https://company.sharepoint.com/sites/clinical/protocols",
+        "type": "SharePoint",
+        "last_modified": "2024-04-10",
+        "confidence": 0.92
+    },
+    {
+        "title": "Corporate Travel Policy 2024",
+        "url": "https://company.sharepoint.com/sites/finance/travel-policy",
+        "type": "SharePoint",
+        "last_modified": "2024-02-01",
+        "confidence": 0.96
+    }
+]
+
+
+SERVICENOW_SOURCES = [
+    {
+        "title": "Password Reset Procedures",
+        "article_id": "KB0001234",
+        "type": "ServiceNow",
+        "category": "IT Support",
+        "last_updated": "2024-05-15",
+        "confidence": 0.97
+    },
+    {
+        "title": "Equipment Request Process",
+        "article_id": "KB0005678",
+        "type": "ServiceNow",
+        "category": "Facilities",
+        "last_updated": "2024-04-22",
+        "confidence": 0.89
+    },
+    {
+        "title": "HIPAA Incident Reporting",
+        "article_id": "KB0009876",
+        "type": "ServiceNow",
+        "category": "Compliance",
+        "last_updated": "2024-06-01",
+        "confidence": 0.94
+    }
+]
+
 
 class MockDataService:
     """Service for generating realistic demo data"""
     
     @staticmethod
     def generate_ticket_id() -> str:
-        """Generate realistic IT ticket ID"""
-        return f"IT-{random.randint(100000, 999999)}"
+        """Generate a unique, time-sortable IT ticket ID"""
+        return f"IT-{new_ulid()}"
     
     @staticmethod
     def generate_expense_id() -> str:
-        """Generate realistic expense report ID"""
-        return f"EXP-{random.randint(10000, 99999)}"
+        """Generate a unique, time-sortable expense report ID"""
+        return f"EXP-{new_ulid()}"
     
     @staticmethod
     def get_hr_policies() -> List[Dict[str, Any]]:
         """Mock HR policy database"""
-        return [
-            {
-                "title": "Remote Work Policy",
-                "category": "work_arrangements",
-                "content": "Clinical staff may work remotely for administrative tasks up to 2 days per week with supervisor approval.",
-                "source": "Employee Handbook v4.2",
-                "last_updated": "2024-03-15"
-            },
-            {
-                "title": "Vacation Policy",
-                "category": "time_off",
-                "content": "Full-time employees accrue 15 days PTO annually, increasing to 20 days after 5 years of service.",
-                "source": "HR Policy Manual Section 3.1",
-                "last_updated": "2024-01-10"
-            },
-            {
-                "title": "HIPAA Compliance Training",
-                "category": "training",
-                "content": "All staff must complete HIPAA training annually. Next deadline: December 31, 2024.",
-                "source": "Compliance Training Portal",
-                "last_updated": "2024-06-01"
-            }
-        ]
+        return HR_POLICIES
     
     @staticmethod
     def get_it_knowledge_base() -> List[Dict[str, Any]]:
         """Mock IT support knowledge base"""
-        return [
-            {
-                "issue": "Slow computer performance",
-                "solution": "1. Restart computer 2. Clear browser cache 3. Run disk cleanup 4. Check for malware",
-                "category": "performance",
-                "source": "IT Support Wiki",
-                "success_rate": "85%"
-            },
-            {
-                "issue": "Cannot access patient database",
-                "solution": "Check VPN connection, verify credentials, contact IT if problem persists",
-                "category": "access",
-                "source": "Critical Systems Guide",
-                "success_rate": "92%"
-            },
-            {
-                "issue": "Email not syncing",
-                "solution": "Sign out and back into Outlook, check internet connection, restart email app",
-                "category": "email",
-                "source": "Email Troubleshooting Guide",
-                "success_rate": "78%"
-            }
-        ]
+        return IT_KNOWLEDGE_BASE
     
     @staticmethod
     def get_travel_policies() -> List[Dict[str, Any]]:
         """Mock travel policy database"""
-        return [
-            {
-                "destination_type": "domestic",
-                "per_diem": "$75/day",
-                "hotel_limit": "$150/night",
-                "approval_required": "Manager approval for trips > 3 days",
-                "source": "Travel Policy 2024",
-                "booking_platform": "Concur Travel"
-            },
-            {
-                "destination_type": "international",
-                "per_diem": "$100/day",
-                "hotel_limit": "$200/night", 
-                "approval_required": "VP approval required",
-                "source": "International Travel Guidelines",
-                "booking_platform": "Corporate Travel Agency"
+        return TRAVEL_POLICIES
+    
+    @staticmethod
+    def get_travel_limits() -> Dict[str, Dict[str, Any]]:
+        """Numeric per-diem and nightly hotel limits by destination type, parsed from the travel policies"""
+        def dollars(text: str) -> float:
+            return float(re.search(r"[\d,.]+", text).group().replace(",", ""))
+        return {
+            policy["destination_type"]: {
+                "per_diem": dollars(policy["per_diem"]),
+                "hotel_per_night": dollars(policy["hotel_limit"]),
+                "source": policy["source"]
             }
-        ]
+            for policy in TRAVEL_POLICIES
+        }
     
     @staticmethod
     def create_mock_ticket(title: str, description: str, priority: str = "medium") -> TicketResponse:
@@ -112,7 +199,7 @@ class MockDataService:
         
         return TicketResponse(
             ticket_id=ticket_id,
-            status="Open",
+            status="Submitted",  # Open once the outbox has delivered it
             created_at=datetime.now(),
             estimated_resolution=f"{hours} hours",
             assigned_to=assigned_to
@@ -137,59 +224,62 @@ class MockDataService:
     @staticmethod
     def get_sharepoint_sources() -> List[Dict[str, Any]]:
         """Mock SharePoint document sources"""
-        return [
-            {
-                "title": "Employee Handbook 2024",
-                "url": "https://company.sharepoint.com/sites/hr/handbook",
-                "type": "SharePoint",
-                "last_modified": "2024-03-15",
-                "confidence": 0.95
-            },
-            {
-                "title": "IT Security Policies",
-                "url": "https://company.sharepoint.com/sites/it/security",
-                "type": "SharePoint", 
-                "last_modified": "2024-05-20",
-                "confidence": 0.88
-            },
-            {
-                "title": "Clinical Protocols Manual",
-                "url": "https://company.sharepoint.com/sites/clinical/protocols",
-                "type": "SharePoint",
-                "last_modified": "2024-04-10",
-                "confidence": 0.92
-            }
-        ]
+        return SHAREPOINT_SOURCES
     
     @staticmethod
     def get_servicenow_sources() -> List[Dict[str, Any]]:
         """Mock ServiceNow knowledge articles"""
-        return [
-            {
-                "title": "Password Reset Procedures",
-                "article_id": "KB0001234",
-                "type": "ServiceNow",
-                "category": "IT Support",
-                "last_updated": "2024-05-15",
-                "confidence": 0.97
-            },
-            {
-                "title": "Equipment Request Process",
-                "article_id": "KB0005678",
-                "type": "ServiceNow",
-                "category": "Facilities",
-                "last_updated": "2024-04-22",
-                "confidence": 0.89
-            },
-            {
-                "title": "HIPAA Incident Reporting",
-                "article_id": "KB0009876",
-                "type": "ServiceNow",
-                "category": "Compliance",
-                "last_updated": "2024-06-01",
-                "confidence": 0.94
-            }
-        ]
+        return SERVICENOW_SOURCES
 
 # Global instance
 mock_service = MockDataService()
+
+# Sources searched by tools: loader, identifying field and indexed fields with their weights.
+# Prompt context for every source comes from the passage index (knowledge_passages below),
+# so only sources a tool queries directly are indexed here
+KNOWLEDGE_SOURCES = {
+    "hr_policies": {
+        "loader": MockDataService.get_hr_policies,
+        "key": "title",
+        "fields": {"title": 2, "category": 1, "content": 1}
+    }
+}
+
+# Built once at startup; call knowledge_base.refresh(name) after a source changes
+knowledge_base = KnowledgeBase(KNOWLEDGE_SOURCES)
+
+
+
+def knowledge_passages() -> List[Dict[str, Any]]:
+    """Passages for the prompt retrieval index, tagged with the agents allowed to cite them"""
+    general = AgentType.GENERAL.value
+    hr, it, travel = AgentType.HR.value, AgentType.IT.value, AgentType.TRAVEL.value
+    passages = []
+    for policy in HR_POLICIES:
+        passages.append({
+            "title": policy["title"], "type": "HR Policy", "text": policy["content"],
+            "source": policy["source"], "last_updated": policy["last_updated"], "agents": [hr, general]
+        })
+    for article in IT_KNOWLEDGE_BASE:
+        passages.append({
+            "title": article["issue"], "type": "IT Knowledge Base", "text": article["solution"],
+            "source": article["source"], "agents": [it, general]
+        })
+    for policy in TRAVEL_POLICIES:
+        passages.append({
+            "title": f"{policy['destination_type'].title()} Travel Policy", "type": "Travel Policy",
+            "text": (f"Per diem {policy['per_diem']}, hotel limit {policy['hotel_limit']}. "
+                     f"{policy['approval_required']}. Book through {policy['booking_platform']}."),
+            "source": policy["source"], "agents": [travel, general]
+        })
+    for document in SHAREPOINT_SOURCES:
+        passages.append({
+            "title": document["title"], "type": "SharePoint", "text": document["title"],
+            "url": document["url"], "last_updated": document["last_modified"], "agents": [hr, it, travel, general]
+        })
+    for article in SERVICENOW_SOURCES:
+        passages.append({
+            "title": article["title"], "type": "ServiceNow", "text": f"{article['title']} ({article['category']})",
+            "article_id": article["article_id"], "last_updated": article["last_updated"], "agents": [hr, it, general]
+        })
+    return passages
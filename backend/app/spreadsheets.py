@@ -0,0 +1,353 @@
+"""Columnar analysis of uploaded spreadsheets (expense exports and similar).
+
+Each sheet is loaded once into a pandas DataFrame and summarised with
+vectorized operations: totals, breakdowns by category, employee and month,
+checks of hotel and meal rows against the travel policy's nightly and
+per-diem limits, and amounts far outside their category's usual range. The
+Document Analyst is given these aggregates as text sections instead of the
+raw rows, so a 100k-row export costs a few hundred prompt tokens.
+
+Columns are recognised by name (Amount, Category, Date, Employee,
+Destination, Nights, ...). This module imports pandas, so it is only
+imported by the extraction worker processes.
+"""
+import zipfile
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+# Column roles and the header keywords that identify them, most specific first
+COLUMN_KEYWORDS = {
+    "amount": ("amount", "total", "cost", "spend", "price", "usd", "value"),
+    "destination": ("destination type", "travel type", "trip type", "destination", "region", "domestic"),
+    "category": ("category", "expense type", "type", "class"),
+    "date": ("date", "posted", "transaction", "day"),
+    "employee": ("employee", "traveler", "traveller", "submitter", "staff", "name"),
+    "nights": ("nights", "days", "quantity", "qty")
+}
+
+_LODGING = r"hotel|lodging|accommodation|motel"
+_MEALS = r"meal|per diem|per-diem|food|dining|m&ie|breakfast|lunch|dinner"
+_INTERNATIONAL = r"international|intl|foreign|abroad|overseas"
+# Amounts above Q3 + UNUSUAL_IQR * IQR of their category are reported as unusual
+UNUSUAL_IQR = 3.0
+
+
+class SpreadsheetError(Exception):
+    """Raised when a workbook cannot be read"""
+
+
+def load_workbook(path: str, file_ext: str) -> Dict[str, pd.DataFrame]:
+    """Every non-empty sheet as a DataFrame, with the first row as the header"""
+    try:
+        sheets = _read_xls(path) if file_ext == ".xls" else _read_xlsx(path)
+    except ImportError as e:
+        raise SpreadsheetError(f"Reading {file_ext} files needs an optional package: {e}")
+    except (ValueError, OSError, KeyError, zipfile.BadZipFile) as e:
+        raise SpreadsheetError(f"Could not read the workbook: {e}")
+    frames = {name: frame.dropna(how="all") for name, frame in sheets.items()}
+    return {name: frame for name, frame in frames.items() if not frame.empty}
+
+
+def _read_xlsx(path: str) -> Dict[str, pd.DataFrame]:
+    # Streams rows from openpyxl's read-only reader into one record list per sheet. The file is
+    # passed as a file object because stored blobs have no extension for openpyxl to check.
+    from openpyxl import load_workbook as open_workbook
+    with open(path, "rb") as f:
+        workbook = open_workbook(f, read_only=True, data_only=True)
+        try:
+            sheets = {}
+            for sheet in workbook.worksheets:
+                rows = sheet.iter_rows(values_only=True)
+                header = next(rows, None)
+                if header is None:
+                    continue
+                names = [str(name).strip() if name is not None else f"Column {i + 1}" for i, name in enumerate(header)]
+                sheets[sheet.title] = pd.DataFrame.from_records(list(rows), columns=names)
+            return sheets
+        finally:
+            workbook.close()
+
+
+def _read_xls(path: str) -> Dict[str, pd.DataFrame]:
+    return {str(name): frame for name, frame in pd.read_excel(path, sheet_name=None, engine="xlrd").items()}
+
+
+def find_columns(frame: pd.DataFrame) -> Dict[str, str]:
+    """Map column roles (amount, category, ...) to header names"""
+    headers = {column: str(column).strip().lower() for column in frame.columns}
+    found: Dict[str, str] = {}
+    for role, keywords in COLUMN_KEYWORDS.items():
+        for keyword in keywords:
+            match = next((column for column, header in headers.items()
+                          if keyword in header and column not in found.values()), None)
+            if match is not None:
+                found[role] = match
+                break
+    if "amount" in found and to_numbers(frame[found["amount"]]).notna().mean() < 0.5:
+        del found["amount"]
+    if "amount" not in found:
+        numeric = [column for column in frame.columns
+                   if column not in found.values() and pd.api.types.is_numeric_dtype(frame[column])]
+        if numeric:
+            found["amount"] = numeric[0]
+    return found
+
+
+def to_numbers(column: pd.Series) -> pd.Series:
+    """Numeric values of a column, accepting text such as "$1,250.00"; unparseable cells become NaN"""
+    if pd.api.types.is_numeric_dtype(column):
+        return column.astype(np.float64)
+    return pd.to_numeric(column.astype(str).str.replace(r"[$,\s]", "", regex=True), errors="coerce")
+
+
+def _labels(column: pd.Series) -> pd.Series:
+    """Text labels as a categorical; cleaning, grouping and matching then work on the distinct values only"""
+    codes, uniques = pd.factorize(column)
+    names = [*pd.Index(uniques).astype(str).str.strip(), "(blank)"]
+    categories, merged = np.unique(np.array(names, dtype=object), return_inverse=True)
+    # Missing cells have code -1, which picks "(blank)" from the end
+    labels = pd.Categorical.from_codes(merged[codes], categories)
+    return pd.Series(labels, index=column.index).cat.remove_unused_categories()
+
+
+def _matches(labels: pd.Series, pattern: str) -> np.ndarray:
+    """Per-row regex match, evaluated once per distinct label"""
+    distinct = labels.cat.categories.to_series().str.contains(pattern, case=False, regex=True).to_numpy()
+    return distinct[labels.cat.codes.to_numpy()]
+
+
+def _per_row(categories: pd.Series, per_category: pd.Series) -> np.ndarray:
+    """Broadcast a value per category to every row via the categorical codes"""
+    return per_category.reindex(categories.cat.categories).to_numpy(dtype=np.float64)[categories.cat.codes.to_numpy()]
+
+
+def _grouped(amounts: pd.Series, keys: pd.Series, top_n: int) -> List[Dict[str, Any]]:
+    groups = amounts.groupby(keys, observed=True).agg(["count", "sum", "mean", "max"])
+    groups = groups.sort_values("sum", ascending=False).head(top_n)
+    return [
+        {"label": str(label), "count": int(row["count"]), "total": float(row["sum"]),
+         "mean": float(row["mean"]), "max": float(row["max"])}
+        for label, row in groups.iterrows()
+    ]
+
+
+def _examples(frame: pd.DataFrame, columns: Dict[str, str], mask: np.ndarray, order: np.ndarray,
+              top_n: int, **extra: np.ndarray) -> List[Dict[str, Any]]:
+    """The top_n flagged rows by order (descending), with their spreadsheet row numbers"""
+    positions = np.flatnonzero(mask)
+    positions = positions[np.argsort(-order[positions], kind="stable")[:top_n]]
+    examples = []
+    for position in positions:
+        example = {"row": int(frame.index[position]) + 2}  # header is row 1, blank rows keep their numbers
+        for role in ("employee", "category", "date", "destination"):
+            if role in columns:
+                value = frame[columns[role]].iat[position]
+                if pd.isna(value):
+                    value = None
+                elif isinstance(value, pd.Timestamp) and value == value.normalize():
+                    value = value.date()
+                example[role] = None if value is None else str(value)
+        for name, values in extra.items():
+            example[name] = values[position].item()
+        examples.append(example)
+    return examples
+
+
+def _policy_checks(frame: pd.DataFrame, columns: Dict[str, str], amounts: np.ndarray, categories: Optional[pd.Series],
+                   limits: Dict[str, Dict[str, Any]], top_n: int) -> Optional[Dict[str, Any]]:
+    """Hotel rows against the nightly limit and meal rows against the per diem"""
+    if categories is None or not limits:
+        return None
+    lodging = _matches(categories, _LODGING)
+    meals = _matches(categories, _MEALS)
+    if not (lodging.any() or meals.any()):
+        return None
+
+    domestic = limits.get("domestic") or next(iter(limits.values()))
+    international = limits.get("international", domestic)
+    if "destination" in columns:
+        abroad = _matches(_labels(frame[columns["destination"]]), _INTERNATIONAL)
+    else:
+        abroad = np.zeros(len(frame), dtype=bool)
+    units = np.ones(len(frame))
+    if "nights" in columns:
+        units = np.clip(np.nan_to_num(to_numbers(frame[columns["nights"]]).to_numpy(), nan=1.0), 1.0, None)
+
+    hotel_limit = np.where(abroad, international["hotel_per_night"], domestic["hotel_per_night"])
+    per_diem = np.where(abroad, international["per_diem"], domestic["per_diem"])
+    limit = np.where(lodging, hotel_limit, np.where(meals, per_diem, np.nan))
+    per_unit = amounts / units
+    checked = (lodging | meals) & ~np.isnan(amounts)
+    over = checked & (per_unit > limit)
+    excess = np.where(over, (per_unit - limit) * units, 0.0)
+
+    def kind(mask: np.ndarray, unit: str) -> Dict[str, Any]:
+        flagged = mask & over
+        return {"checked": int((mask & checked).sum()), "over_limit": int(flagged.sum()),
+                "excess": float(excess[flagged].sum()), "unit": unit}
+
+    return {
+        "limits": {"domestic": domestic, "international": international},
+        "destination_known": "destination" in columns,
+        "units_column": columns.get("nights"),
+        "hotel": kind(lodging, "night"),
+        "meals": kind(meals, "day"),
+        "examples": _examples(frame, columns, over, excess, top_n, amount=amounts, units=units,
+                              unit=np.where(lodging, "night", "day"), limit=limit, excess=excess)
+    }
+
+
+def _unusual(frame: pd.DataFrame, columns: Dict[str, str], amounts: pd.Series, categories: Optional[pd.Series],
+             top_n: int) -> Optional[Dict[str, Any]]:
+    """Amounts far above the interquartile range of their category"""
+    if categories is None:
+        return None
+    grouped = amounts.groupby(categories, observed=True)
+    q1 = _per_row(categories, grouped.quantile(0.25))
+    q3 = _per_row(categories, grouped.quantile(0.75))
+    threshold = q3 + UNUSUAL_IQR * (q3 - q1)
+    values = amounts.to_numpy()
+    mask = (values > threshold) & (q3 > q1)
+    return {
+        "rows": int(mask.sum()),
+        "total": float(values[mask].sum()),
+        "examples": _examples(frame, columns, mask, np.nan_to_num(values / np.where(threshold > 0, threshold, 1.0)),
+                              top_n, amount=values, threshold=threshold)
+    }
+
+
+def summarize_sheet(name: str, frame: pd.DataFrame, limits: Dict[str, Dict[str, Any]], top_n: int = 10) -> Dict[str, Any]:
+    """Aggregates of one sheet; every statistic is computed column-wise over all rows"""
+    columns = find_columns(frame)
+    summary: Dict[str, Any] = {
+        "sheet": name,
+        "rows": len(frame),
+        "columns": [str(column) for column in frame.columns],
+        "roles": {role: str(column) for role, column in columns.items()}
+    }
+    if "amount" not in columns:
+        numeric = frame.select_dtypes("number")
+        summary["numeric"] = {
+            str(column): {"sum": float(values.sum()), "mean": float(values.mean()), "max": float(values.max())}
+            for column, values in numeric.items()
+        }
+        return summary
+
+    amounts = to_numbers(frame[columns["amount"]])
+    values = amounts.to_numpy()
+    valid = ~np.isnan(values)
+    negative = valid & (values < 0)
+    summary["amount"] = {
+        "rows": int(valid.sum()),
+        "total": float(values[valid].sum()),
+        "mean": float(values[valid].mean()) if valid.any() else 0.0,
+        "median": float(np.median(values[valid])) if valid.any() else 0.0,
+        "min": float(values[valid].min()) if valid.any() else 0.0,
+        "max": float(values[valid].max()) if valid.any() else 0.0,
+        "negative_rows": int(negative.sum()),
+        "negative_total": float(values[negative].sum())
+    }
+    labels = {role: _labels(frame[columns[role]]) for role in ("category", "employee") if role in columns}
+    for role, keys in labels.items():
+        summary[f"by_{role}"] = _grouped(amounts, keys, top_n)
+        summary[f"{role}_count"] = int(keys.cat.categories.size)
+    if "date" in columns:
+        dates = pd.to_datetime(frame[columns["date"]], errors="coerce")
+        if dates.notna().any():
+            summary["first_date"] = str(dates.min().date())
+            summary["last_date"] = str(dates.max().date())
+            months = amounts.groupby(dates.dt.to_period("M")).agg(["count", "sum"]).tail(12)
+            summary["by_month"] = [
+                {"label": str(month), "count": int(row["count"]), "total": float(row["sum"])}
+                for month, row in months.iterrows()
+            ]
+    summary["policy"] = _policy_checks(frame, columns, values, labels.get("category"), limits, top_n)
+    summary["unusual"] = _unusual(frame, columns, amounts, labels.get("category"), top_n)
+    return summary
+
+
+def _money(value: float) -> str:
+    return f"-${-value:,.2f}" if value < 0 else f"${value:,.2f}"
+
+
+def _describe_row(example: Dict[str, Any]) -> str:
+    parts = [f"row {example['row']}"]
+    parts.extend(str(example[role]) for role in ("employee", "category", "date") if example.get(role))
+    return ", ".join(parts)
+
+
+def summary_sections(summary: Dict[str, Any]) -> Iterator[Tuple[Dict[str, Any], str]]:
+    """(location, text) sections describing a sheet's aggregates, for indexing and the model prompt"""
+    sheet = summary["sheet"]
+    roles = summary["roles"]
+    overview = [f"Sheet '{sheet}' has {summary['rows']:,} rows with columns: {', '.join(summary['columns'])}."]
+    amount = summary.get("amount")
+    if amount is None:
+        overview.append("No amount column was found; numeric column totals:")
+        overview.extend(f"- {column}: sum {stats['sum']:,.2f}, mean {stats['mean']:,.2f}, max {stats['max']:,.2f}"
+                        for column, stats in summary.get("numeric", {}).items())
+        yield {"sheet": sheet, "section": "Overview"}, "\n".join(overview)
+        return
+
+    overview.append(
+        f"Amounts ('{roles['amount']}') over {amount['rows']:,} rows: total {_money(amount['total'])}, "
+        f"average {_money(amount['mean'])}, median {_money(amount['median'])}, "
+        f"smallest {_money(amount['min'])}, largest {_money(amount['max'])}."
+    )
+    if amount["negative_rows"]:
+        overview.append(f"{amount['negative_rows']:,} rows are refunds or credits totalling {_money(amount['negative_total'])}.")
+    if "first_date" in summary:
+        overview.append(f"Dates ('{roles['date']}') run from {summary['first_date']} to {summary['last_date']}.")
+    for role in ("category", "employee"):
+        if f"{role}_count" in summary:
+            overview.append(f"{summary[f'{role}_count']:,} distinct values of '{roles[role]}'.")
+    yield {"sheet": sheet, "section": "Overview"}, "\n".join(overview)
+
+    for key, title in (("by_category", "Totals by category"), ("by_employee", "Totals by employee"),
+                       ("by_month", "Totals by month")):
+        groups = summary.get(key)
+        if not groups:
+            continue
+        lines = [f"{title} (largest first):" if key != "by_month" else f"{title} (latest 12 months):"]
+        for group in groups:
+            line = f"- {group['label']}: {_money(group['total'])} over {group['count']:,} rows"
+            if "mean" in group:
+                line += f", average {_money(group['mean'])}, largest {_money(group['max'])}"
+            lines.append(line)
+        yield {"sheet": sheet, "section": title}, "\n".join(lines)
+
+    policy = summary.get("policy")
+    if policy:
+        domestic, international = policy["limits"]["domestic"], policy["limits"]["international"]
+        lines = [
+            f"Policy checks against {domestic['source']} (domestic hotel {_money(domestic['hotel_per_night'])}/night, "
+            f"per diem {_money(domestic['per_diem'])}/day) and {international['source']} (international hotel "
+            f"{_money(international['hotel_per_night'])}/night, per diem {_money(international['per_diem'])}/day)."
+        ]
+        if not policy["destination_known"]:
+            lines.append("No destination column was found, so every row was checked against the domestic limits.")
+        if policy["units_column"] is None:
+            lines.append("No nights/days column was found, so each row counts as one night or day.")
+        for kind, label in (("hotel", "Hotel"), ("meals", "Meal")):
+            stats = policy[kind]
+            if stats["checked"]:
+                lines.append(f"{label} rows: {stats['over_limit']:,} of {stats['checked']:,} exceed the limit per "
+                             f"{stats['unit']}, by {_money(stats['excess'])} in total.")
+        if policy["examples"]:
+            lines.append("Largest overages:")
+            lines.extend(
+                f"- {_describe_row(example)}: {_money(example['amount'])} for {example['units']:g} "
+                f"{example['unit']}{'s' if example['units'] != 1 else ''} vs {_money(example['limit'])}/{example['unit']} limit, {_money(example['excess'])} over"
+                for example in policy["examples"]
+            )
+        yield {"sheet": sheet, "section": "Policy checks"}, "\n".join(lines)
+
+    unusual = summary.get("unusual")
+    if unusual and unusual["rows"]:
+        lines = [f"{unusual['rows']:,} rows ({_money(unusual['total'])}) are far above the usual range of their "
+                 f"category (more than {UNUSUAL_IQR:g} interquartile ranges above the upper quartile). Largest:"]
+        lines.extend(f"- {_describe_row(example)}: {_money(example['amount'])} "
+                     f"(usual up to {_money(example['threshold'])})" for example in unusual["examples"])
+        yield {"sheet": sheet, "section": "Unusual amounts"}, "\n".join(lines)
@@ -0,0 +1,206 @@
+import json
+import os
+import sqlite3
+import time
+from contextlib import closing
+from typing import Any, Dict, List, Optional, Set
+from .config import settings
+
+
+class UploadStore:
+    """Content-addressed upload storage with a refcounted name index.
+
+    Files live under blobs/<first two hex chars>/<sha256>, so identical uploads
+    are stored once no matter how many people send them, and two different
+    files with the same name never overwrite each other. Each
+    (conversation_id, filename) points at one blob and holds one reference on
+    it. Extraction results are cached per blob so known content is never
+    parsed twice. When the blobs exceed max_bytes, unreferenced blobs are
+    evicted first and then the least recently used referenced ones. Blobs
+    pinned for a queued or running extraction job are never evicted.
+
+    Every check-and-modify of the blobs runs under the index.db write lock,
+    so worker processes committing and evicting at once cannot delete a
+    blob another one has just committed.
+    """
+
+    def __init__(self, root: str, max_bytes: int):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.blob_dir = os.path.join(root, "blobs")
+        self.extraction_dir = os.path.join(root, "extracted")
+        os.makedirs(self.blob_dir, exist_ok=True)
+        os.makedirs(self.extraction_dir, exist_ok=True)
+        self.index_path = os.path.join(root, "index.db")
+        with closing(self._connect()) as conn, conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS blobs ("
+                "sha256 TEXT PRIMARY KEY, size INTEGER NOT NULL, refcount INTEGER NOT NULL, last_access REAL NOT NULL)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS names ("
+                "conversation_id TEXT NOT NULL, filename TEXT NOT NULL, sha256 TEXT NOT NULL, "
+                "PRIMARY KEY (conversation_id, filename))"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS blobs_lru ON blobs(refcount, last_access)")
+            # Blobs still needed by upload jobs; pins expire in case the job's process dies
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS pins (sha256 TEXT PRIMARY KEY, count INTEGER NOT NULL, expires_at REAL NOT NULL)"
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.index_path, timeout=10.0, isolation_level="IMMEDIATE")
+
+    def blob_path(self, sha256: str) -> str:
+        return os.path.join(self.blob_dir, sha256[:2], sha256)
+
+    def _extraction_path(self, sha256: str, file_ext: str, chunk_words: int) -> str:
+        return os.path.join(self.extraction_dir, f"{sha256}{file_ext}.{chunk_words}.json")
+
+    def commit(self, temp_path: str, sha256: str, size: int, conversation_id: str, filename: str,
+               pin_seconds: float = 0.0) -> str:
+        """Move a streamed upload into the store and point (conversation_id, filename) at it.
+
+        With pin_seconds the blob is also pinned for the job that will extract
+        it: eviction skips it until unpin() or until the pin expires.
+        """
+        path = self.blob_path(sha256)
+        now = time.time()
+        with closing(self._connect()) as conn, conn:
+            # Take the write lock before looking at the file, so no other process evicts it in between
+            conn.execute("BEGIN IMMEDIATE")
+            if os.path.exists(path):
+                # Known content: keep the existing blob and drop the new copy
+                os.remove(temp_path)
+            else:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                os.replace(temp_path, path)
+            conn.execute(
+                "INSERT INTO blobs (sha256, size, refcount, last_access) VALUES (?, ?, 0, ?) "
+                "ON CONFLICT(sha256) DO UPDATE SET last_access = excluded.last_access",
+                (sha256, size, now)
+            )
+            previous = conn.execute(
+                "SELECT sha256 FROM names WHERE conversation_id = ? AND filename = ?", (conversation_id, filename)
+            ).fetchone()
+            if previous is None or previous[0] != sha256:
+                if previous is not None:
+                    conn.execute("UPDATE blobs SET refcount = refcount - 1 WHERE sha256 = ?", (previous[0],))
+                conn.execute(
+                    "INSERT OR REPLACE INTO names (conversation_id, filename, sha256) VALUES (?, ?, ?)",
+                    (conversation_id, filename, sha256)
+                )
+                conn.execute("UPDATE blobs SET refcount = refcount + 1 WHERE sha256 = ?", (sha256,))
+            if pin_seconds:
+                conn.execute(
+                    "INSERT INTO pins (sha256, count, expires_at) VALUES (?, 1, ?) ON CONFLICT(sha256) "
+                    "DO UPDATE SET count = count + 1, expires_at = MAX(expires_at, excluded.expires_at)",
+                    (sha256, now + pin_seconds)
+                )
+            self._evict(conn, protect=sha256, now=now)
+        return path
+
+    def unpin(self, sha256: str):
+        """Release one job's pin on a blob"""
+        with closing(self._connect()) as conn, conn:
+            conn.execute("UPDATE pins SET count = count - 1 WHERE sha256 = ?", (sha256,))
+            conn.execute("DELETE FROM pins WHERE sha256 = ? AND count <= 0", (sha256,))
+
+    def release(self, conversation_id: str, filename: str):
+        """Drop a name; its blob becomes evictable once nothing else references it"""
+        with closing(self._connect()) as conn, conn:
+            row = conn.execute(
+                "SELECT sha256 FROM names WHERE conversation_id = ? AND filename = ?", (conversation_id, filename)
+            ).fetchone()
+            if row is not None:
+                conn.execute("DELETE FROM names WHERE conversation_id = ? AND filename = ?", (conversation_id, filename))
+                conn.execute("UPDATE blobs SET refcount = refcount - 1 WHERE sha256 = ?", (row[0],))
+
+    def release_conversations(self, conversation_ids: List[str]):
+        """release() every file uploaded to these conversations"""
+        for conversation_id in conversation_ids:
+            for filename in self.conversation_files(conversation_id):
+                self.release(conversation_id, filename)
+
+    def conversation_files(self, conversation_id: str) -> Dict[str, str]:
+        """{filename: sha256} of the files currently uploaded to a conversation"""
+        with closing(sqlite3.connect(self.index_path, timeout=10.0)) as conn:
+            rows = conn.execute(
+                "SELECT filename, sha256 FROM names WHERE conversation_id = ?", (conversation_id,)
+            ).fetchall()
+        return dict(rows)
+
+    def load_chunks(self, filename: str, sha256: str) -> Optional[List[Dict[str, Any]]]:
+        """Cached extraction chunks for an uploaded file, or None while it is still being extracted"""
+        cached = self.get_extraction(sha256, os.path.splitext(filename)[1].lower(), settings.document_chunk_words)
+        return cached["chunks"] if cached else None
+
+    def _evict(self, conn: sqlite3.Connection, protect: str, now: float):
+        """Delete blobs until the store fits max_bytes; runs inside the caller's write transaction"""
+        conn.execute("DELETE FROM pins WHERE expires_at < ?", (now,))
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM blobs").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        candidates = conn.execute(
+            "SELECT sha256, size FROM blobs WHERE sha256 != ? AND sha256 NOT IN (SELECT sha256 FROM pins) "
+            "ORDER BY refcount > 0, last_access", (protect,)
+        ).fetchall()
+        evicted = set()
+        for sha256, size in candidates:
+            if total <= self.max_bytes:
+                break
+            evicted.add(sha256)
+            total -= size
+        conn.executemany("DELETE FROM names WHERE sha256 = ?", [(sha256,) for sha256 in evicted])
+        conn.executemany("DELETE FROM blobs WHERE sha256 = ?", [(sha256,) for sha256 in evicted])
+        self._remove_files(evicted)
+
+    def _remove_files(self, evicted: Set[str]):
+        """Delete the blobs and their cached extractions, listing the extraction directory once"""
+        if not evicted:
+            return
+        paths = [self.blob_path(sha256) for sha256 in evicted]
+        # Extraction files are named <sha256><ext>.<chunk words>.json
+        paths.extend(
+            os.path.join(self.extraction_dir, name)
+            for name in os.listdir(self.extraction_dir) if name[:64] in evicted
+        )
+        for path in paths:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def get_extraction(self, sha256: str, file_ext: str, chunk_words: int) -> Optional[Dict[str, Any]]:
+        """Cached extraction result for this content, if any"""
+        try:
+            with open(self._extraction_path(sha256, file_ext, chunk_words), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def put_extraction(self, sha256: str, file_ext: str, chunk_words: int, chunks: List[Dict[str, Any]], error: Optional[str] = None):
+        path = self._extraction_path(sha256, file_ext, chunk_words)
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump({"chunks": chunks, "error": error}, f)
+        os.replace(temp_path, path)
+
+    def stats(self) -> Dict[str, Any]:
+        with closing(sqlite3.connect(self.index_path, timeout=10.0)) as conn:
+            blobs, total = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM blobs").fetchone()
+            names = conn.execute("SELECT COUNT(*) FROM names").fetchone()[0]
+        return {"blobs": blobs, "names": names, "bytes": total, "max_bytes": self.max_bytes}
+
+
+# Process-wide store, built on first use so importing the app creates no files
+_upload_store: Optional[UploadStore] = None
+
+
+def get_upload_store() -> UploadStore:
+    """The global upload store, created on first call"""
+    global _upload_store
+    if _upload_store is None:
+        _upload_store = UploadStore(settings.upload_dir, settings.upload_store_max_bytes)
+    return _upload_store
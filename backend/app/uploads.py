@@ -0,0 +1,80 @@
+import codecs
+import hashlib
+import os
+import uuid
+from typing import NamedTuple
+import aiofiles
+from fastapi import UploadFile
+
+# Read size for streaming uploads to disk
+UPLOAD_CHUNK_SIZE = 64 * 1024
+
+
+class UploadTooLargeError(Exception):
+    """Raised as soon as an upload crosses the configured size limit"""
+
+    def __init__(self, max_bytes: int):
+        super().__init__(f"Upload exceeds {max_bytes} bytes")
+        self.max_bytes = max_bytes
+
+
+class IngestedUpload(NamedTuple):
+    path: str
+    size: int
+    sha256: str
+    word_count: int
+
+
+class WordCounter:
+    """Counts whitespace-separated words across arbitrarily split byte chunks"""
+
+    def __init__(self):
+        self._decoder = codecs.getincrementaldecoder("utf-8")(errors="ignore")
+        self._in_word = False
+        self.count = 0
+
+    def feed(self, chunk: bytes, final: bool = False):
+        text = self._decoder.decode(chunk, final)
+        if not text:
+            return
+        words = len(text.split())
+        # A word split across the chunk boundary was already counted once
+        if words and self._in_word and not text[0].isspace():
+            words -= 1
+        self.count += words
+        self._in_word = not text[-1].isspace()
+
+
+async def stream_to_disk(file: UploadFile, directory: str, max_bytes: int,
+                         chunk_size: int = UPLOAD_CHUNK_SIZE) -> IngestedUpload:
+    """Copy an upload to a temporary file in fixed-size chunks.
+
+    Size, SHA-256 and word count are computed in the same pass, and the copy
+    is abandoned the moment the running size crosses max_bytes, so memory use
+    per upload stays at one chunk regardless of the declared file size.
+    The caller decides where the temporary file finally lives.
+    """
+    path = os.path.join(directory, f".upload-{uuid.uuid4().hex}.part")
+    hasher = hashlib.sha256()
+    words = WordCounter()
+    size = 0
+
+    try:
+        async with aiofiles.open(path, "wb") as out:
+            while True:
+                chunk = await file.read(chunk_size)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > max_bytes:
+                    raise UploadTooLargeError(max_bytes)
+                hasher.update(chunk)
+                words.feed(chunk)
+                await out.write(chunk)
+        words.feed(b"", final=True)
+    except BaseException:
+        if os.path.exists(path):
+            os.remove(path)
+        raise
+
+    return IngestedUpload(path=path, size=size, sha256=hasher.hexdigest(), word_count=words.count)
@@ -0,0 +1,61 @@
+"""Benchmark for micro-batched intent routing and MinHash signatures.
+
+Fires bursts of concurrent requests at the scoring functions, first one
+call per request and then through MicroBatcher (vectorized route_batch and
+MinHasher.signatures), and reports time per request and the batch sizes
+achieved. Batched routing is checked to agree with per-message routing.
+
+Run from the backend directory:
+    python -m benchmarks.bench_batching --messages 20000 --concurrency 64
+"""
+import argparse
+import asyncio
+import time
+
+from app.agents import get_orchestrator
+from app.batching import MicroBatcher
+from app.cache import MinHasher, normalise_message
+from benchmarks.bench_routing import build_corpus
+
+orchestrator = get_orchestrator()
+
+
+async def drive(fn, corpus, concurrency: int) -> float:
+    """Seconds per item when corpus is submitted in bursts of `concurrency`"""
+    start = time.perf_counter()
+    for offset in range(0, len(corpus), concurrency):
+        await asyncio.gather(*(fn(message) for message in corpus[offset:offset + concurrency]))
+    return (time.perf_counter() - start) / len(corpus)
+
+
+async def main(args):
+    router = orchestrator.router
+    hasher = MinHasher()
+    corpus = build_corpus(orchestrator.agent_configs, args.messages)
+    normalised = [normalise_message(message) for message in corpus]
+
+    mismatches = sum(a != b for a, b in zip(router.route_batch(corpus), map(router.route, corpus)))
+    print(f"{args.messages} messages, bursts of {args.concurrency}; batched routing mismatches: {mismatches}")
+    print(f"{'':24}{'single us':>11}{'batched us':>12}{'speedup':>9}{'avg batch':>11}")
+
+    for name, single, batch_fn, items in (
+        ("intent routing", router.route, router.route_batch, corpus),
+        ("minhash signatures", hasher.signature, hasher.signatures, normalised),
+    ):
+        async def one(item, single=single):
+            return single(item)
+
+        batcher = MicroBatcher(batch_fn, args.concurrency, args.wait_ms)
+        single_time = await drive(one, items, args.concurrency)
+        batched_time = await drive(batcher.submit, items, args.concurrency)
+        stats = batcher.stats()
+        print(f"{name:24}{single_time * 1e6:11.1f}{batched_time * 1e6:12.1f}"
+              f"{single_time / batched_time:8.2f}x{stats['average_batch_size']:11}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--messages", type=int, default=20000)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--wait-ms", type=float, default=2.0)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,98 @@
+"""Latency and model cost of a realistic message mix, with and without the model cascade.
+
+Runs greetings, one-line policy questions, tool requests and long
+multi-part questions through AgentOrchestrator.chat against the offline
+fake backend. The fake simulates both deployments: the small one starts
+answering sooner, generates faster and returns low-confidence logprobs
+for a share of its answers (FAKE_LLM_SMALL_* settings). Reported per
+mode: turn latency, estimated cost from the configured per-million-token
+prices, which tier answered, and why turns escalated.
+
+Run from the backend directory:
+    python -m benchmarks.bench_cascade --rounds 10 --latency-ms 300
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+from collections import Counter
+
+os.environ.setdefault("LLM_BACKEND", "fake")
+os.environ.setdefault("RESPONSE_CACHE_ENABLED", "false")
+os.environ.setdefault("COALESCING_ENABLED", "false")
+os.environ.setdefault("CASCADE_SMALL_DEPLOYMENT", "gpt-4o-mini")
+os.environ.setdefault("UPLOAD_DIR", tempfile.mkdtemp(prefix="bench-cascade-"))
+os.environ.setdefault("OUTBOX_DB_PATH", os.path.join(tempfile.mkdtemp(prefix="bench-cascade-"), "outbox.db"))
+
+from app.agents import get_orchestrator  # noqa: E402
+from app.config import settings  # noqa: E402
+from app.fake_llm import FakeLLMBackend  # noqa: E402
+from app.llm import LLMClient  # noqa: E402
+
+orchestrator = get_orchestrator()
+
+MESSAGES = [
+    "Hi", "Hello there!", "thanks", "Thank you!",
+    "What is the vacation policy?", "How many PTO days do I get after five years?",
+    "What is the hotel limit for domestic travel?", "Can I work remotely?",
+    "When is the HIPAA training deadline?", "I have a question about company policies",
+    "I need to plan a business trip", "Who approves international travel?",
+    "I need to create an expense report", "Please open a ticket, my laptop is very slow",
+    "I'm having a technical issue", "My password expired and I cannot sign in",
+    ("I'm moving from the day shift to nights next month and want to understand how that affects my PTO "
+     "accrual, whether I can still work remotely on admin days, what training I need to complete first, "
+     "and who I should talk to about changing my parking permit and badge access hours."),
+]
+
+
+async def run(args, cascade: bool):
+    settings.cascade_enabled = cascade
+    orchestrator.llm = LLMClient(FakeLLMBackend(
+        latency_distribution="constant", latency_ms=args.latency_ms, tokens_per_second=args.tokens_per_second,
+        tool_call_rate=args.tool_call_rate, model_profiles={settings.cascade_small_deployment: {
+            "latency_scale": settings.fake_llm_small_latency_scale,
+            "speed_scale": settings.fake_llm_small_speed_scale,
+            "low_confidence_rate": settings.fake_llm_small_low_confidence_rate
+        }}
+    ))
+    latencies, cost, tiers, escalations = [], 0.0, Counter(), Counter()
+
+    async def ask(message: str):
+        nonlocal cost
+        start = time.perf_counter()
+        response = await orchestrator.chat(message)
+        latencies.append(time.perf_counter() - start)
+        cost += sum(response.metadata.get("tier_cost_usd", {}).values())
+        tiers[response.metadata.get("model_tier", "none")] += 1
+        for attempt in response.metadata.get("tiers", []):
+            if "escalated" in attempt:
+                escalations[f"{attempt['tier']}:{attempt['escalated']}"] += 1
+
+    for _ in range(args.rounds):
+        await asyncio.gather(*(ask(message) for message in MESSAGES))
+    return latencies, cost, tiers, escalations
+
+
+async def main(args):
+    print(f"{args.rounds} rounds of {len(MESSAGES)} messages, {args.latency_ms:.0f} ms large-model latency, "
+          f"small deployment '{settings.cascade_small_deployment}'")
+    print(f"{'mode':10}{'mean ms':>9}{'p50 ms':>8}{'p95 ms':>8}{'cost $':>10}  tiers / escalations")
+    baseline = None
+    for name, cascade in (("large", False), ("cascade", True)):
+        latencies, cost, tiers, escalations = await run(args, cascade)
+        ordered = sorted(latencies)
+        baseline = baseline or cost
+        print(f"{name:10}{statistics.mean(latencies) * 1000:9.0f}{statistics.median(latencies) * 1000:8.0f}"
+              f"{ordered[int(len(ordered) * 0.95)] * 1000:8.0f}{cost:10.4f}  {dict(tiers)} {dict(escalations)}")
+    print(f"cascade cost: {cost / baseline:.0%} of large-only")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rounds", type=int, default=10)
+    parser.add_argument("--latency-ms", type=float, default=300.0)
+    parser.add_argument("--tokens-per-second", type=float, default=80.0)
+    parser.add_argument("--tool-call-rate", type=float, default=0.5)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,69 @@
+"""Upstream model calls for a burst of identical questions, with and without coalescing.
+
+Simulates a shift change: --burst users press the same quick-action button
+at once. Each burst runs through AgentOrchestrator.chat and chat_stream
+against the offline fake backend (constant latency), with the response
+cache off so only in-flight coalescing can save calls. The number of
+upstream calls and the burst's wall time are reported. A second pass makes
+the model call a tool on (by default) every turn, the worst case: tool
+turns are not shared, so requests that joined the first call wait for it
+and then run their own.
+
+Run from the backend directory:
+    python -m benchmarks.bench_coalescing --burst 50 --latency-ms 200
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+os.environ.setdefault("LLM_BACKEND", "fake")
+os.environ.setdefault("RESPONSE_CACHE_ENABLED", "false")
+os.environ.setdefault("UPLOAD_DIR", tempfile.mkdtemp(prefix="bench-coalescing-"))
+
+from app.agents import get_orchestrator  # noqa: E402
+from app.config import settings  # noqa: E402
+from app.fake_llm import FakeLLMBackend  # noqa: E402
+from app.llm import LLMClient  # noqa: E402
+
+orchestrator = get_orchestrator()
+
+MESSAGE = "I have a question about company policies"
+
+
+async def ask(streamed: bool):
+    if not streamed:
+        await orchestrator.chat(MESSAGE)
+        return
+    async for _ in orchestrator.chat_stream(MESSAGE):
+        pass
+
+
+async def burst(args, streamed: bool, coalescing: bool, tool_call_rate: float):
+    settings.coalescing_enabled = coalescing
+    backend = FakeLLMBackend(latency_distribution="constant", latency_ms=args.latency_ms,
+                             tokens_per_second=args.tokens_per_second, tool_call_rate=tool_call_rate)
+    orchestrator.llm = LLMClient(backend)
+    start = time.perf_counter()
+    await asyncio.gather(*(ask(streamed) for _ in range(args.burst)))
+    return backend.stats()["requests"], time.perf_counter() - start
+
+
+async def main(args):
+    print(f"Burst of {args.burst} identical questions, {args.latency_ms:.0f} ms model latency")
+    print(f"{'mode':10}{'tool rate':>10}{'calls off':>11}{'calls on':>10}{'wall s off':>12}{'wall s on':>11}")
+    for tool_call_rate in (0.0, args.tool_call_rate):
+        for mode, streamed in (("blocking", False), ("stream", True)):
+            calls_off, wall_off = await burst(args, streamed, False, tool_call_rate)
+            calls_on, wall_on = await burst(args, streamed, True, tool_call_rate)
+            print(f"{mode:10}{tool_call_rate:10.2f}{calls_off:11}{calls_on:10}{wall_off:12.2f}{wall_on:11.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--burst", type=int, default=50)
+    parser.add_argument("--latency-ms", type=float, default=200.0)
+    parser.add_argument("--tokens-per-second", type=float, default=400.0)
+    parser.add_argument("--tool-call-rate", type=float, default=1.0)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,153 @@
+"""Import time and cold start of the API, with an enforced budget.
+
+Each run starts a fresh interpreter. The import pass runs
+`python -X importtime -c "import app.main"` and reads the cumulative time of
+app.main and its heaviest dependencies from the report. It also checks that
+modules only the model client or optional features need (openai, httpx,
+pandas, ...) were not imported. The cold start pass imports the app, runs
+its lifespan startup (with and without STARTUP_WARMUP) and sends one chat
+request through the ASGI stack against the offline fake backend.
+
+The process exits with status 1 when the median import time exceeds
+--budget-ms or a deferred module was imported, so it can gate CI.
+
+Run from the backend directory:
+    python -m benchmarks.bench_import --runs 5 --budget-ms 1500
+"""
+import argparse
+import asyncio
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+# Modules that must not load just because app.main was imported
+DEFERRED_MODULES = ("openai", "httpx", "uvicorn", "pandas", "requests", "azure.identity", "jose")
+
+_IMPORTTIME = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$")
+
+
+def child_env(**overrides) -> dict:
+    state = tempfile.mkdtemp(prefix="bench-import-")
+    return {
+        **os.environ,
+        "LLM_BACKEND": "fake",
+        "FAKE_LLM_LATENCY_MS": "0",
+        "FAKE_LLM_TOKENS_PER_SECOND": "0",
+        "UPLOAD_DIR": os.path.join(state, "uploads"),
+        "OUTBOX_DB_PATH": os.path.join(state, "outbox.db"),
+        "RETRIEVAL_INDEX_DIR": os.path.join(state, "retrieval"),
+        "LOG_LEVEL": "WARNING",
+        **overrides
+    }
+
+
+def measure_import() -> dict:
+    """Cumulative import times (ms) from one -X importtime run, plus the deferred modules that loaded"""
+    probe = f"import json, sys, app.main; print(json.dumps([m for m in {DEFERRED_MODULES!r} if m in sys.modules]))"
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", probe],
+                            capture_output=True, text=True, env=child_env(), check=True)
+    modules = {}
+    for line in result.stderr.splitlines():
+        match = _IMPORTTIME.match(line)
+        if match:
+            modules[match.group(4)] = int(match.group(2)) / 1000
+    return {"modules": modules, "loaded": json.loads(result.stdout.strip().splitlines()[-1])}
+
+
+async def cold_start_child():
+    """Runs inside the child interpreter: import, lifespan startup, first request"""
+    start = time.perf_counter()
+    from app.main import app
+    imported = time.perf_counter()
+
+    body = json.dumps({"message": "How many vacation days do I get?"}).encode()
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "POST",
+        "scheme": "http", "path": "/api/chat", "raw_path": b"/api/chat", "query_string": b"",
+        "root_path": "", "headers": [(b"host", b"bench"), (b"content-type", b"application/json")],
+        "client": ("127.0.0.1", 50000), "server": ("bench", 80)
+    }
+    status = {}
+
+    async def receive():
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            status["code"] = message["status"]
+
+    async with app.router.lifespan_context(app):
+        started = time.perf_counter()
+        await app(scope, receive, send)
+        answered = time.perf_counter()
+    print(json.dumps({
+        "import_ms": (imported - start) * 1000,
+        "startup_ms": (started - imported) * 1000,
+        "first_request_ms": (answered - started) * 1000,
+        "status": status.get("code")
+    }))
+
+
+def measure_cold_start(warmup: bool) -> dict:
+    env = child_env(STARTUP_WARMUP=str(warmup).lower())
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, "-m", "benchmarks.bench_import", "--cold-start-child"],
+                            capture_output=True, text=True, env=env, check=True)
+    timings = json.loads(result.stdout.strip().splitlines()[-1])
+    timings["process_ms"] = (time.perf_counter() - start) * 1000
+    return timings
+
+
+def main(args) -> int:
+    runs = [measure_import() for _ in range(args.runs)]
+    totals = [run["modules"].get("app.main", 0.0) for run in runs]
+    median = statistics.median(totals)
+    print(f"import app.main over {args.runs} fresh interpreters: median {median:.0f} ms, "
+          f"min {min(totals):.0f} ms, max {max(totals):.0f} ms (budget {args.budget_ms:.0f} ms)")
+
+    top_level = {name: ms for name, ms in runs[0]["modules"].items() if "." not in name and name != "app"}
+    print("heaviest top-level imports (cumulative ms):")
+    for name, ms in sorted(top_level.items(), key=lambda item: -item[1])[:args.top]:
+        print(f"  {name:24}{ms:8.1f}")
+
+    print(f"{'warm-up':10}{'import ms':>11}{'startup ms':>12}{'first req ms':>14}{'process ms':>12}")
+    for warmup in (False, True):
+        samples = [measure_cold_start(warmup) for _ in range(args.cold_runs)]
+        if any(sample["status"] != 200 for sample in samples):
+            print(f"first request failed: {[sample['status'] for sample in samples]}")
+            return 1
+        row = {key: statistics.median(sample[key] for sample in samples)
+               for key in ("import_ms", "startup_ms", "first_request_ms", "process_ms")}
+        print(f"{'on' if warmup else 'off':10}{row['import_ms']:11.0f}{row['startup_ms']:12.0f}"
+              f"{row['first_request_ms']:14.0f}{row['process_ms']:12.0f}")
+
+    failed = False
+    loaded = sorted({module for run in runs for module in run["loaded"]})
+    if loaded:
+        print(f"FAIL: importing app.main loaded deferred modules {loaded}")
+        failed = True
+    if median > args.budget_ms:
+        print(f"FAIL: median import time {median:.0f} ms is over the {args.budget_ms:.0f} ms budget")
+        failed = True
+    if not failed:
+        print("OK: within budget")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--cold-runs", type=int, default=3)
+    parser.add_argument("--budget-ms", type=float, default=1500.0)
+    parser.add_argument("--top", type=int, default=8)
+    parser.add_argument("--cold-start-child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.cold_start_child:
+        asyncio.run(cold_start_child())
+        sys.exit(0)
+    sys.exit(main(args))
@@ -0,0 +1,71 @@
+"""Urgent-call latency behind a flood of routine model calls.
+
+Drives LLMClient against the offline fake backend (constant model latency):
+a routine flood keeps every deployment slot busy while urgent calls arrive
+one by one, and the time each call waited for a slot is reported per lane,
+first with all calls in one FIFO queue (priority disabled) and then with
+the weighted priority lanes.
+
+Run from the backend directory:
+    python -m benchmarks.bench_priority --routine 400 --urgent 20 --latency-ms 50
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+from app.config import settings
+from app.fake_llm import FakeLLMBackend
+from app.llm import LLMClient
+
+
+def percentile(values, fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)]
+
+
+async def run(args, priority: bool):
+    settings.priority_enabled = priority
+    client = LLMClient(FakeLLMBackend(latency_distribution="constant", latency_ms=args.latency_ms, tokens_per_second=0))
+    waits = {"routine": [], "urgent": []}
+
+    async def call(lane: str):
+        start = time.perf_counter()
+        await client.chat_completion(
+            lane=lane if priority else "standard", model="bench",
+            messages=[{"role": "user", "content": "hello"}], max_tokens=5
+        )
+        # Everything beyond the model latency was spent waiting for a slot
+        waits[lane].append(time.perf_counter() - start - args.latency_ms / 1000)
+
+    async def urgent_arrivals():
+        await asyncio.sleep(args.latency_ms / 1000)
+        calls = []
+        for _ in range(args.urgent):
+            calls.append(asyncio.create_task(call("urgent")))
+            await asyncio.sleep(args.latency_ms / 1000)
+        await asyncio.gather(*calls)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(call("routine") for _ in range(args.routine)), urgent_arrivals())
+    elapsed = time.perf_counter() - started
+    return waits, elapsed
+
+
+async def main(args):
+    print(f"{args.routine} routine + {args.urgent} urgent calls, {settings.llm_max_concurrency_per_deployment} slots, "
+          f"{args.latency_ms:.0f} ms model latency; slot wait in ms")
+    print(f"{'':10}{'lane':>9}{'p50':>9}{'p95':>9}{'max':>9}{'total s':>9}")
+    for name, priority in (("fifo", False), ("lanes", True)):
+        waits, elapsed = await run(args, priority)
+        for lane, values in waits.items():
+            print(f"{name:10}{lane:>9}{statistics.median(values) * 1000:9.1f}{percentile(values, 0.95) * 1000:9.1f}"
+                  f"{max(values) * 1000:9.1f}{elapsed:9.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--routine", type=int, default=400)
+    parser.add_argument("--urgent", type=int, default=20)
+    parser.add_argument("--latency-ms", type=float, default=50.0)
+    asyncio.run(main(parser.parse_args()))
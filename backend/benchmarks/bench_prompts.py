@@ -0,0 +1,94 @@
+"""Prompt tokens per agent before and after the prompt bundles.
+
+"Before" is the original request layout: the indented triple-quoted system
+prompt and all four tool definitions on every call (none for the Document
+Analyst). "After" is each agent's PromptBundle. Tokens are counted with
+tiktoken's o200k_base encoding (the gpt-4o tokenizer) when tiktoken is
+installed, and with the app's chars/4 estimate otherwise; tool definitions
+are counted as their JSON, which approximates how the service renders them.
+
+A multi-turn conversation per agent is then run against the offline
+fake backend, which reports cached prompt tokens the way the service does
+(prefixes of 1024+ tokens, in 128-token steps), to show how much of each
+prompt the stable prefix lets the provider reuse.
+
+Run from the backend directory:
+    pip install tiktoken  # optional, for exact counts
+    python -m benchmarks.bench_prompts --turns 20
+"""
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+
+os.environ.setdefault("LLM_BACKEND", "fake")
+os.environ.setdefault("FAKE_LLM_LATENCY_MS", "1")
+os.environ.setdefault("FAKE_LLM_TOKENS_PER_SECOND", "0")
+os.environ.setdefault("RESPONSE_CACHE_ENABLED", "false")
+os.environ.setdefault("UPLOAD_DIR", tempfile.mkdtemp(prefix="bench-prompts-"))
+
+from app.agents import get_orchestrator  # noqa: E402
+from app.conversations import estimate_tokens  # noqa: E402
+from app.models import AgentType  # noqa: E402
+
+orchestrator = get_orchestrator()
+
+QUESTIONS = {
+    AgentType.HR: "How many vacation days do new employees get and how do I request leave?",
+    AgentType.IT: "My laptop is very slow since the last update and Outlook keeps freezing.",
+    AgentType.TRAVEL: "What is the hotel limit for a conference trip to Chicago?",
+    AgentType.DOC_CHAT: "Summarise the uploaded document.",
+    AgentType.GENERAL: "Who should I talk to about parking at the main campus?",
+}
+
+
+def tokenizer():
+    try:
+        import tiktoken
+    except ImportError:
+        return "chars/4 estimate", estimate_tokens
+    encoding = tiktoken.get_encoding("o200k_base")
+    return "tiktoken o200k_base", lambda text: len(encoding.encode(text))
+
+
+def static_report(count):
+    print(f"{'agent':10}{'system before':>15}{'after':>7}{'tools before':>14}{'after':>7}"
+          f"{'prefix before':>15}{'after':>7}{'saved':>8}")
+    all_tools = json.dumps(orchestrator.function_definitions)
+    totals = [0, 0]
+    for agent_type, config in orchestrator.agent_configs.items():
+        bundle = orchestrator.prompt_bundles[agent_type]
+        system_before, system_after = count(config["system_prompt"]), count(bundle.system_prompt)
+        tools_before = count(all_tools) if agent_type != AgentType.DOC_CHAT else 0
+        tools_after = count(json.dumps(bundle.tools)) if bundle.tools else 0
+        before, after = system_before + tools_before, system_after + tools_after
+        totals[0] += before
+        totals[1] += after
+        print(f"{agent_type.value:10}{system_before:15}{system_after:7}{tools_before:14}{tools_after:7}"
+              f"{before:15}{after:7}{1 - after / before:8.0%}")
+    print(f"{'all':10}{'':43}{totals[0]:15}{totals[1]:7}{1 - totals[1] / totals[0]:8.0%}")
+
+
+async def conversation_report(turns: int):
+    print(f"\n{turns}-turn conversation per agent on the fake backend (provider-style prompt caching)")
+    print(f"{'agent':10}{'prompt tokens':>15}{'cached':>8}{'cached %':>10}")
+    for agent_type, question in QUESTIONS.items():
+        prompt = cached = 0
+        conversation_id = None
+        for turn in range(turns):
+            response = await orchestrator.chat(f"{question} (follow-up {turn})", conversation_id, agent_hint=agent_type)
+            conversation_id = response.conversation_id
+            prompt += response.metadata.get("prompt_tokens", 0)
+            cached += response.metadata.get("cached_tokens", 0)
+        print(f"{agent_type.value:10}{prompt:15}{cached:8}{cached / prompt if prompt else 0:10.0%}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--turns", type=int, default=20)
+    args = parser.parse_args()
+    name, count = tokenizer()
+    print(f"Static prompt prefix per call ({name})")
+    static_report(count)
+    asyncio.run(conversation_report(args.turns))
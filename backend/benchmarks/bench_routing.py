@@ -0,0 +1,95 @@
+"""Micro-benchmark for intent routing.
+
+Compares the original per-keyword substring scan with the compiled
+IntentRouter over a corpus of synthetic messages, first with the shipped
+agent keywords and then with each agent's keyword list padded to show how
+both approaches scale as routing rules grow.
+
+Run from the backend directory:
+    python -m benchmarks.bench_routing --messages 100000
+"""
+import argparse
+import random
+import time
+
+from app.agents import get_orchestrator
+from app.models import AgentType
+from app.routing import IntentRouter
+
+orchestrator = get_orchestrator()
+
+FILLER = (
+    "i need some help with my account today please could you check three things "
+    "for the team before the shift change on ward seven thanks a lot"
+).split()
+
+
+def legacy_detect(agent_configs, message: str) -> AgentType:
+    """The substring scan detect_agent_intent used before the compiled router"""
+    message_lower = message.lower()
+    scores = {}
+    for agent_type, config in agent_configs.items():
+        scores[agent_type] = sum(1 for keyword in config["keywords"] if keyword in message_lower)
+    best_agent = max(scores.items(), key=lambda x: x[1])
+    return best_agent[0] if best_agent[1] > 0 else AgentType.GENERAL
+
+
+def build_corpus(agent_configs, size: int, seed: int = 7):
+    rng = random.Random(seed)
+    keywords = [k for config in agent_configs.values() for k in config["keywords"]]
+    corpus = []
+    for _ in range(size):
+        words = rng.choices(FILLER, k=rng.randint(5, 40))
+        for _ in range(rng.randint(0, 3)):
+            words.insert(rng.randrange(len(words) + 1), rng.choice(keywords))
+        corpus.append(" ".join(words))
+    return corpus
+
+
+def time_per_call(fn, corpus) -> float:
+    start = time.perf_counter()
+    for message in corpus:
+        fn(message)
+    return (time.perf_counter() - start) / len(corpus) * 1e6
+
+
+def padded_configs(agent_configs, keywords_per_agent: int):
+    """Copy of agent_configs with synthetic keywords appended to each agent"""
+    padded = {}
+    for agent_type, config in agent_configs.items():
+        extra = [f"{agent_type.value}term{i}" for i in range(keywords_per_agent - len(config["keywords"]))]
+        padded[agent_type] = {**config, "keywords": config["keywords"] + extra}
+    return padded
+
+
+def report(label: str, agent_configs, corpus):
+    router = IntentRouter(agent_configs)
+    keywords = sum(len(config["keywords"]) for config in agent_configs.values())
+    legacy_us = time_per_call(lambda m: legacy_detect(agent_configs, m), corpus)
+    router_us = time_per_call(router.route, corpus)
+    print(f"{label} ({keywords} keywords)")
+    print(f"  legacy substring:   {legacy_us:8.2f} us/call")
+    print(f"  compiled router:    {router_us:8.2f} us/call")
+    print(f"  speedup:            {legacy_us / router_us:8.2f}x")
+    return router
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=100_000)
+    parser.add_argument("--padded-keywords", type=int, default=200, help="keywords per agent in the scaling run")
+    args = parser.parse_args()
+
+    agent_configs = orchestrator.agent_configs
+    corpus = build_corpus(agent_configs, args.messages)
+    print(f"messages: {len(corpus):,}")
+
+    router = report("shipped keywords", agent_configs, corpus)
+    report("padded keywords", padded_configs(agent_configs, args.padded_keywords), corpus)
+
+    changed = sum(1 for m in corpus if legacy_detect(agent_configs, m) != router.route(m))
+    print(f"routing changed: {changed:,} messages ({changed / len(corpus):.1%}), mostly substring false positives")
+
+
+if __name__ == "__main__":
+    main()
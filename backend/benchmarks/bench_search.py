@@ -0,0 +1,98 @@
+"""Benchmark for the BM25 knowledge-base index.
+
+Builds a synthetic handbook of policy sections (50k by default) and
+compares the original substring scan used by search_hr_policies with the
+SearchIndex: build time, incremental refresh time after editing a small
+share of the sections, per-query latency, and how many multi-word queries
+each approach answers at all.
+
+Run from the backend directory:
+    python -m benchmarks.bench_search --documents 50000 --queries 500
+"""
+import argparse
+import random
+import statistics
+import time
+
+from app.search import SearchIndex
+
+TOPICS = (
+    "vacation leave overtime remote parking badge training hipaa benefits dental vision "
+    "retirement payroll scheduling shift holiday sick maternity bereavement travel expense "
+    "reimbursement laptop password vpn email onboarding offboarding conduct harassment safety"
+).split()
+FILLER = (
+    "employees staff must may should request approval manager supervisor within days weeks "
+    "annual policy procedure department clinical administrative eligible accrue submit form "
+    "portal compliance review record system access team unit hospital patient care"
+).split()
+
+
+def build_corpus(size: int, rng: random.Random):
+    corpus = []
+    for i in range(size):
+        topic = rng.sample(TOPICS, 2)
+        corpus.append({
+            "title": f"{topic[0].title()} {topic[1].title()} Policy {i}",
+            "category": topic[0],
+            "content": " ".join(rng.choices(FILLER + topic * 3, k=rng.randint(30, 120)))
+        })
+    return corpus
+
+
+def build_queries(count: int, rng: random.Random):
+    return [" ".join(rng.sample(TOPICS, 1) + rng.sample(FILLER, rng.randint(0, 2))) for _ in range(count)]
+
+
+def legacy_search(policies, query: str):
+    """The substring test search_hr_policies used before the index"""
+    query = query.lower()
+    return [p for p in policies if query in p["title"].lower() or query in p["content"].lower()]
+
+
+def timed(fn, queries):
+    latencies, answered = [], 0
+    for query in queries:
+        start = time.perf_counter()
+        found = fn(query)
+        latencies.append(time.perf_counter() - start)
+        answered += bool(found)
+    latencies.sort()
+    return statistics.median(latencies) * 1000, latencies[int(len(latencies) * 0.95)] * 1000, answered
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--documents", type=int, default=50000)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--edit-share", type=float, default=0.01, help="Share of sections changed before refresh")
+    parser.add_argument("--seed", type=int, default=11)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    corpus = build_corpus(args.documents, rng)
+    queries = build_queries(args.queries, rng)
+    print(f"{args.documents} documents, {args.queries} queries")
+
+    index = SearchIndex({"title": 2, "category": 1, "content": 1})
+    start = time.perf_counter()
+    index.sync((doc["title"], doc) for doc in corpus)
+    print(f"index build:          {time.perf_counter() - start:8.2f} s")
+
+    # Edit a few sections in place and refresh the index from the full source list
+    for doc in rng.sample(corpus, int(args.documents * args.edit_share)):
+        doc["content"] += " updated guidance effective immediately"
+    start = time.perf_counter()
+    changes = index.sync((doc["title"], doc) for doc in corpus)
+    print(f"incremental refresh:  {time.perf_counter() - start:8.2f} s  ({changes['updated']} sections re-indexed)")
+
+    legacy = timed(lambda q: legacy_search(corpus, q), queries)
+    indexed = timed(lambda q: index.search(q, 3).hits, queries)
+    print(f"{'':22}{'p50 ms':>10}{'p95 ms':>10}{'answered':>10}")
+    print(f"{'substring scan':22}{legacy[0]:10.3f}{legacy[1]:10.3f}{legacy[2]:10}")
+    print(f"{'bm25 index':22}{indexed[0]:10.3f}{indexed[1]:10.3f}{indexed[2]:10}")
+    print(f"p50 speedup: {legacy[0] / indexed[0]:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
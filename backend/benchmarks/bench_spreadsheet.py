@@ -0,0 +1,141 @@
+"""Spreadsheet analysis on a synthetic expense export (1M rows by default).
+
+Builds an expense sheet (date, employee, category, destination, nights,
+amount) and compares two ways of producing the same figures: totals,
+breakdowns by category, employee and month, and hotel and meal rows
+checked against the travel policy limits. One is a row-at-a-time Python
+loop, as a reader iterating over cells would do. The other is the columnar
+pandas/NumPy summary used by the upload pipeline. The totals are checked to
+agree. Also reported: the prompt size of the raw rows as text (what the
+Document Analyst saw before) against the precomputed summary sections.
+
+--xlsx-rows additionally writes a real workbook of that many rows and times
+loading it. Parsing the XML is usually the larger cost for big files.
+
+Run from the backend directory:
+    python -m benchmarks.bench_spreadsheet --rows 1000000 --xlsx-rows 100000
+"""
+import argparse
+import math
+import os
+import statistics
+import tempfile
+import time
+from collections import defaultdict
+
+import numpy as np
+import pandas as pd
+
+os.environ.setdefault("OUTBOX_DB_PATH", os.path.join(tempfile.mkdtemp(prefix="bench-spreadsheet-"), "outbox.db"))
+
+from app.conversations import estimate_tokens  # noqa: E402
+from app.services import MockDataService  # noqa: E402
+from app.spreadsheets import load_workbook, summarize_sheet, summary_sections  # noqa: E402
+
+CATEGORIES = ("Hotel", "Lodging", "Meals", "Per Diem", "Airfare", "Rail", "Taxi", "Mileage",
+              "Parking", "Conference", "Training", "Supplies")
+LODGING = {"Hotel", "Lodging"}
+MEALS = {"Meals", "Per Diem"}
+
+
+def make_sheet(rows: int, seed: int) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    employees = np.array([f"EMP{i:05d}" for i in range(2000)], dtype=object)
+    return pd.DataFrame({
+        "Date": pd.Timestamp("2024-01-01") + pd.to_timedelta(rng.integers(0, 366, rows), unit="D"),
+        "Employee": employees[rng.integers(0, len(employees), rows)],
+        "Category": np.array(CATEGORIES, dtype=object)[rng.integers(0, len(CATEGORIES), rows)],
+        "Destination": np.where(rng.random(rows) < 0.15, "International", "Domestic").astype(object),
+        "Nights": rng.integers(1, 5, rows),
+        "Amount": np.round(rng.lognormal(4.6, 0.6, rows), 2)
+    })
+
+
+def row_at_a_time(frame: pd.DataFrame, limits) -> dict:
+    """The same aggregates computed one row at a time"""
+    total, by_category, by_employee, by_month = 0.0, defaultdict(float), defaultdict(float), defaultdict(float)
+    over_rows, excess = 0, 0.0
+    for date, employee, category, destination, nights, amount in frame.itertuples(index=False, name=None):
+        total += amount
+        by_category[category] += amount
+        by_employee[employee] += amount
+        by_month[(date.year, date.month)] += amount
+        policy = limits["international" if destination == "International" else "domestic"]
+        if category in LODGING or category in MEALS:
+            limit = policy["hotel_per_night"] if category in LODGING else policy["per_diem"]
+            units = max(nights, 1)
+            if amount / units > limit:
+                over_rows += 1
+                excess += amount - limit * units
+    return {"total": total, "categories": len(by_category), "employees": len(by_employee),
+            "months": len(by_month), "over_rows": over_rows, "excess": excess}
+
+
+def timed(fn, repeat: int):
+    times, result = [], None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times), result
+
+
+def write_xlsx(frame: pd.DataFrame, path: str):
+    from openpyxl import Workbook
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet("Expenses")
+    sheet.append(list(frame.columns))
+    for row in frame.itertuples(index=False, name=None):
+        sheet.append([row[0].to_pydatetime(), *row[1:]])
+    workbook.save(path)
+
+
+def main(args):
+    limits = MockDataService.get_travel_limits()
+    frame = make_sheet(args.rows, args.seed)
+    print(f"Synthetic expense sheet: {len(frame):,} rows, {len(CATEGORIES)} categories, "
+          f"{frame['Employee'].nunique():,} employees")
+
+    loop_seconds, expected = timed(lambda: row_at_a_time(frame, limits), 1)
+    vector_seconds, summary = timed(lambda: summarize_sheet("Expenses", frame, limits), args.repeat)
+    policy = summary["policy"]
+    over_rows = policy["hotel"]["over_limit"] + policy["meals"]["over_limit"]
+    excess = policy["hotel"]["excess"] + policy["meals"]["excess"]
+    assert math.isclose(summary["amount"]["total"], expected["total"], rel_tol=1e-9)
+    assert over_rows == expected["over_rows"] and math.isclose(excess, expected["excess"], rel_tol=1e-9)
+    assert summary["category_count"] == expected["categories"] and len(summary["by_month"]) == min(expected["months"], 12)
+
+    print(f"{'method':16}{'seconds':>10}{'rows/s':>14}")
+    print(f"{'row at a time':16}{loop_seconds:10.2f}{len(frame) / loop_seconds:14,.0f}")
+    print(f"{'columnar':16}{vector_seconds:10.2f}{len(frame) / vector_seconds:14,.0f}   "
+          f"{loop_seconds / vector_seconds:.1f}x faster, totals agree")
+    print(f"policy: {over_rows:,} hotel/meal rows over the limit, ${excess:,.2f} in excess; "
+          f"{summary['unusual']['rows']:,} unusual amounts")
+
+    sample = min(len(frame), 100_000)
+    raw_chars = sum(len(" | ".join(map(str, row))) + 1 for row in frame.head(sample).itertuples(index=False, name=None))
+    raw_tokens = raw_chars * len(frame) // sample // 4
+    summary_text = "\n\n".join(text for _, text in summary_sections(summary))
+    print(f"prompt size: raw rows ~{raw_tokens:,} tokens (extrapolated from {sample:,} rows), "
+          f"summary {estimate_tokens(summary_text):,} tokens")
+
+    if args.xlsx_rows:
+        path = os.path.join(tempfile.mkdtemp(prefix="bench-spreadsheet-"), "expenses.xlsx")
+        write_xlsx(frame.head(args.xlsx_rows), path)
+        start = time.perf_counter()
+        sheets = load_workbook(path, ".xlsx")
+        loaded = time.perf_counter() - start
+        start = time.perf_counter()
+        summarize_sheet("Expenses", sheets["Expenses"], limits)
+        summarized = time.perf_counter() - start
+        print(f"xlsx of {args.xlsx_rows:,} rows ({os.path.getsize(path) / 1e6:.1f} MB): load {loaded:.2f}s, "
+              f"summary {summarized:.2f}s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--xlsx-rows", type=int, default=0, help="Also time loading a workbook of this many rows")
+    parser.add_argument("--seed", type=int, default=7)
+    main(parser.parse_args())
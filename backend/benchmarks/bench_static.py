@@ -0,0 +1,109 @@
+"""Requests per second on /api/agents and /api/quick-actions.
+
+Compares the original handlers (payload rebuilt and encoded with the
+standard JSON encoder on every request) with the precomputed responses,
+both for a full 200 response and for a 304 revalidation with If-None-Match.
+The handlers are called through the app's real ASGI stack (routing and
+middleware) with an in-memory driver, so HTTP client overhead is left out.
+
+Run from the backend directory:
+    python -m benchmarks.bench_static --requests 20000
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+os.environ.setdefault("LLM_BACKEND", "fake")
+os.environ.setdefault("UPLOAD_DIR", tempfile.mkdtemp(prefix="bench-static-"))
+
+from fastapi.responses import JSONResponse  # noqa: E402
+
+from app.agents import get_orchestrator  # noqa: E402
+from app.main import QUICK_ACTIONS, app  # noqa: E402
+
+orchestrator = get_orchestrator()
+
+
+async def legacy_agents():
+    return JSONResponse({
+        "agents": [
+            {
+                "type": agent_type.value,
+                "name": config["name"],
+                "icon": config["icon"],
+                "color": config["color"],
+                "description": config["system_prompt"][:100] + "..."
+            }
+            for agent_type, config in orchestrator.agent_configs.items()
+        ]
+    })
+
+
+async def legacy_quick_actions():
+    # The original handler built the literal on every call
+    return JSONResponse({"actions": [dict(action) for action in QUICK_ACTIONS]})
+
+
+async def get(path: str, headers=()):
+    """Run one GET through the ASGI app and return (status, headers)"""
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+        "scheme": "http", "path": path, "raw_path": path.encode(), "query_string": b"",
+        "root_path": "", "headers": [(b"host", b"bench"), *headers],
+        "client": ("127.0.0.1", 50000), "server": ("bench", 80)
+    }
+    received = False
+    result = {}
+
+    async def receive():
+        nonlocal received
+        if received:
+            await asyncio.sleep(3600)
+        received = True
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            result["status"] = message["status"]
+            result["headers"] = dict(message["headers"])
+
+    await app(scope, receive, send)
+    return result["status"], result["headers"]
+
+
+async def rps(path: str, requests: int, headers=()) -> float:
+    start = time.perf_counter()
+    for _ in range(requests):
+        await get(path, headers)
+    return requests / (time.perf_counter() - start)
+
+
+async def main(args):
+    app.add_api_route("/legacy/agents", legacy_agents)
+    app.add_api_route("/legacy/quick-actions", legacy_quick_actions)
+
+    print(f"{args.requests} sequential requests each, through the ASGI stack")
+    print(f"{'endpoint':20}{'legacy rps':>12}{'precomputed':>13}{'speedup':>9}{'304 rps':>10}")
+    for name, legacy_path, path in (
+        ("/api/agents", "/legacy/agents", "/api/agents"),
+        ("/api/quick-actions", "/legacy/quick-actions", "/api/quick-actions"),
+    ):
+        status, headers = await get(path)
+        etag = headers[b"etag"]
+        assert status == 200 and (await get(path, [(b"if-none-match", etag)]))[0] == 304
+        # Warm up both paths
+        await rps(legacy_path, 200)
+        await rps(path, 200)
+
+        legacy = await rps(legacy_path, args.requests)
+        precomputed = await rps(path, args.requests)
+        revalidated = await rps(path, args.requests, [(b"if-none-match", etag)])
+        print(f"{name:20}{legacy:12.0f}{precomputed:13.0f}{precomputed / legacy:8.2f}x{revalidated:10.0f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=20000)
+    asyncio.run(main(parser.parse_args()))
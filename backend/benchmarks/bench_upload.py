@@ -0,0 +1,118 @@
+"""Peak memory benchmark for /api/upload.
+
+Sends N parallel maximum-size uploads through the ASGI app in-process and
+reports the peak resident set size, once with the original whole-file
+read-and-split handler and once with the streaming ingestion path. Each
+mode runs in a fresh interpreter so peak RSS is not shared between them.
+
+Run from the backend directory:
+    python -m benchmarks.bench_upload --parallel 50
+"""
+import argparse
+import asyncio
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+WORDS = b"patient admission discharge summary medication dosage schedule review\n"
+
+
+def rss_mb() -> float:
+    with open("/proc/self/status") as status:
+        for line in status:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def legacy_app(upload_dir: str):
+    """Replica of the upload handler before streaming ingestion"""
+    import aiofiles
+    from fastapi import FastAPI, File, UploadFile
+
+    app = FastAPI()
+
+    @app.post("/api/upload")
+    async def upload_document(file: UploadFile = File(...)):
+        file_path = os.path.join(upload_dir, file.filename)
+        async with aiofiles.open(file_path, "wb") as f:
+            content = await file.read()
+            await f.write(content)
+        return {"file_size": len(content), "words": len(content.decode("utf-8", errors="ignore").split())}
+
+    return app
+
+
+async def drive(app, sample_path: str, parallel: int):
+    import httpx
+
+    async def one(i: int):
+        with open(sample_path, "rb") as f:
+            response = await client.post("/api/upload", files={"file": (f"sample-{i}.txt", f, "text/plain")})
+        response.raise_for_status()
+
+    transport = httpx.ASGITransport(app=app)
+    # ASGITransport does not send lifespan events; startup starts the upload job runners
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            await asyncio.gather(*(one(i) for i in range(parallel)))
+
+
+def worker(mode: str, parallel: int, size: int):
+    workdir = tempfile.mkdtemp(prefix="bench-upload-")
+    sample_path = os.path.join(workdir, "sample.txt")
+    with open(sample_path, "wb") as f:
+        f.write(WORDS * (size // len(WORDS)))
+
+    os.environ["UPLOAD_DIR"] = os.path.join(workdir, "uploads")
+    os.environ["MAX_FILE_SIZE"] = str(size)
+    os.environ["UPLOAD_JOBS_DB_PATH"] = os.path.join(workdir, "jobs.db")
+    # Every upload is queued at once; this measures ingestion, not queue backpressure
+    os.environ["UPLOAD_JOB_MAX_PENDING"] = str(parallel)
+    os.makedirs(os.environ["UPLOAD_DIR"], exist_ok=True)
+    if mode == "legacy":
+        app = legacy_app(os.environ["UPLOAD_DIR"])
+    else:
+        from app.main import app
+
+    baseline = rss_mb()
+    start = time.perf_counter()
+    asyncio.run(drive(app, sample_path, parallel))
+    elapsed = time.perf_counter() - start
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(json.dumps({"mode": mode, "baseline_mb": baseline, "peak_mb": peak, "seconds": elapsed}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--parallel", type=int, default=50)
+    parser.add_argument("--size", type=int, default=None, help="bytes per upload (default: MAX_FILE_SIZE)")
+    parser.add_argument("--worker", choices=["legacy", "streaming"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.size is None:
+        from app.config import settings
+        args.size = settings.max_file_size
+
+    if args.worker:
+        worker(args.worker, args.parallel, args.size)
+        return
+
+    print(f"{args.parallel} parallel uploads of {args.size / (1024 * 1024):.1f} MB")
+    for mode in ("legacy", "streaming"):
+        output = subprocess.run(
+            [sys.executable, "-m", "benchmarks.bench_upload", "--worker", mode,
+             "--parallel", str(args.parallel), "--size", str(args.size)],
+            check=True, capture_output=True, text=True
+        ).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        print(f"  {mode:<10} peak RSS {result['peak_mb']:8.1f} MB "
+              f"(+{result['peak_mb'] - result['baseline_mb']:.1f} MB over baseline) in {result['seconds']:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""Throughput scaling of the multi-worker server against the fake LLM backend.
+
+Starts `python -m app.server` with 1, 2, ... N workers on the offline fake
+model (LLM_BACKEND=fake) with shared SQLite state in a temporary directory,
+drives /api/chat with benchmarks.loadtest at a fixed concurrency and reports
+throughput and latency per worker count. Scaling needs as many free CPU
+cores as workers; the model latency is kept low so the app's own CPU work
+dominates.
+
+Run from the backend directory:
+    python -m benchmarks.bench_workers --max-workers 4 --requests 2000 --concurrency 64
+"""
+import argparse
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+from benchmarks import loadtest
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_until_healthy(url: str, process: subprocess.Popen, timeout: float = 60.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError("server exited during startup")
+        try:
+            if httpx.get(f"{url}/", timeout=1.0).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError("server did not become healthy")
+
+
+def measure(workers: int, args) -> dict:
+    port = free_port()
+    url = f"http://127.0.0.1:{port}"
+    state = tempfile.mkdtemp(prefix=f"bench-workers-{workers}-")
+    env = {
+        **os.environ,
+        "LLM_BACKEND": "fake",
+        "FAKE_LLM_LATENCY_MS": str(args.model_latency_ms),
+        "FAKE_LLM_LATENCY_DISTRIBUTION": "constant",
+        "FAKE_LLM_TOKENS_PER_SECOND": "0",
+        "RATE_LIMIT_ENABLED": "false",
+        "STATE_BACKEND": "sqlite",
+        "CONVERSATION_BACKEND": "sqlite",
+        "STATE_DB_PATH": os.path.join(state, "state.db"),
+        "CONVERSATION_DB_PATH": os.path.join(state, "conversations.db"),
+        "UPLOAD_DIR": os.path.join(state, "uploads"),
+        "RETRIEVAL_INDEX_DIR": os.path.join(state, "retrieval"),
+    }
+    process = subprocess.Popen(
+        [sys.executable, "-m", "app.server", "--host", "127.0.0.1", "--port", str(port), "--workers", str(workers)],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        wait_until_healthy(url, process)
+        load_args = loadtest.parse_args([
+            "--url", url, "--scenario", "chat", "--requests", str(args.requests),
+            "--concurrency", str(args.concurrency)
+        ])
+        # Warm up connections and worker caches before measuring
+        asyncio.run(loadtest.main(loadtest.parse_args([
+            "--url", url, "--scenario", "chat", "--requests", str(args.concurrency * 2),
+            "--concurrency", str(args.concurrency)
+        ])))
+        return asyncio.run(loadtest.main(load_args))["/api/chat"]
+    finally:
+        process.terminate()
+        process.wait(timeout=30)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--model-latency-ms", type=float, default=5.0)
+    args = parser.parse_args()
+
+    counts = sorted({1, *[2 ** i for i in range(1, 8) if 2 ** i < args.max_workers], args.max_workers})
+    print(f"{os.cpu_count()} CPUs, {args.requests} chat requests at concurrency {args.concurrency}")
+    print(f"{'workers':>8}{'rps':>10}{'scaling':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'errors':>8}")
+    baseline = None
+    for workers in counts:
+        stats = measure(workers, args)
+        baseline = baseline or stats["rps"]
+        print(f"{workers:>8}{stats['rps']:>10}{stats['rps'] / baseline:>8.2f}x{stats['p50_ms']:>9}"
+              f"{stats['p95_ms']:>9}{stats['p99_ms']:>9}{stats['errors']:>8}")
+
+
+if __name__ == "__main__":
+    main()
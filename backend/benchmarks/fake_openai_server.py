@@ -0,0 +1,48 @@
+"""Local fake of the Azure OpenAI chat completions API.
+
+Serves POST /openai/deployments/{deployment}/chat/completions (JSON or SSE)
+backed by app.fake_llm.FakeLLMBackend, so the backend's HTTP client layer
+(connection pool, retries, circuit breaker) can be exercised without network
+access, including throttling and server errors. Point the backend at it with
+AZURE_OPENAI_ENDPOINT=http://127.0.0.1:9000 and any API key.
+
+To skip HTTP entirely, run the backend with LLM_BACKEND=fake instead.
+
+Run from the backend directory:
+    FAKE_LLM_THROTTLE_RATE=0.2 uvicorn benchmarks.fake_openai_server:app --port 9000
+
+Knobs are the FAKE_LLM_* settings (see .env.example): latency distribution,
+token rate, tool-call rate, throttle rate and error rate.
+"""
+import openai
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+from app.fake_llm import FakeLLMBackend
+
+app = FastAPI(title="Fake Azure OpenAI")
+backend = FakeLLMBackend.from_settings()
+
+
+@app.post("/openai/deployments/{deployment}/chat/completions")
+async def chat_completions(deployment: str, request: Request):
+    body = await request.json()
+    body["model"] = deployment
+    try:
+        result = await backend.create(**body)
+    except openai.APIStatusError as e:
+        return JSONResponse(e.body, status_code=e.status_code, headers=dict(e.response.headers))
+
+    if body.get("stream"):
+        async def events():
+            async for chunk in result:
+                yield f"data: {chunk.model_dump_json(exclude_none=True)}\n\n"
+            yield "data: [DONE]\n\n"
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    return JSONResponse(result.model_dump(mode="json", exclude_none=True))
+
+
+@app.get("/stats")
+async def stats():
+    return backend.stats()
@@ -0,0 +1,222 @@
+"""Load test for /api/chat and /api/upload.
+
+Drives the API at a fixed concurrency and reports p50/p95/p99 latency and
+throughput per endpoint. By default the app runs in-process on the offline
+fake model backend (LLM_BACKEND=fake) with uploads in a temporary
+directory, so no network access or credentials are needed. Pass --url to
+load a running server instead (start it with LLM_BACKEND=fake for app-only
+numbers).
+
+Thresholds turn it into a CI regression gate: the script exits with status
+1 if any is exceeded.
+
+Run from the backend directory:
+    python -m benchmarks.loadtest --scenario mixed --concurrency 32 --requests 2000
+    python -m benchmarks.loadtest --scenario chat --max-p95-ms 800 --min-rps 50
+    python -m benchmarks.loadtest --url http://127.0.0.1:8000 --duration 60
+
+The fake backend's behaviour is set with the FAKE_LLM_* environment
+variables (latency distribution, token rate, tool-call and error rates).
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional
+
+import httpx
+
+CHAT_MESSAGES = [
+    "What is the vacation policy for new employees?",
+    "My laptop will not connect to the VPN, can you help?",
+    "I need to book a flight to Chicago next week",
+    "How do I submit a travel expense report?",
+    "Reset my password please",
+    "What health benefits do we offer?",
+    "Create a ticket for my broken monitor",
+    "What is the per diem for London?",
+]
+
+UPLOAD_WORDS = ("policy employee travel expense ticket laptop benefits hotel meal "
+                "approval manager network password reimbursement deadline").split()
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of an unsorted list"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(math.ceil(pct / 100 * len(ordered)) - 1, 0)
+    return ordered[rank]
+
+
+class Recorder:
+    """Latencies and failures per endpoint"""
+
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = {}
+        self.errors: Dict[str, Dict[str, int]] = {}
+
+    def record(self, endpoint: str, seconds: float, status: Optional[int]):
+        if status == 200:
+            self.latencies.setdefault(endpoint, []).append(seconds)
+        else:
+            errors = self.errors.setdefault(endpoint, {})
+            key = str(status) if status is not None else "exception"
+            errors[key] = errors.get(key, 0) + 1
+
+    def summary(self, elapsed: float) -> Dict[str, Dict[str, float]]:
+        report = {}
+        for endpoint in sorted(set(self.latencies) | set(self.errors)):
+            latencies = self.latencies.get(endpoint, [])
+            failed = sum(self.errors.get(endpoint, {}).values())
+            total = len(latencies) + failed
+            report[endpoint] = {
+                "requests": total,
+                "errors": failed,
+                "error_rate": round(failed / total, 4) if total else 0.0,
+                "rps": round(len(latencies) / elapsed, 2),
+                "p50_ms": round(percentile(latencies, 50) * 1000, 1),
+                "p95_ms": round(percentile(latencies, 95) * 1000, 1),
+                "p99_ms": round(percentile(latencies, 99) * 1000, 1),
+                "mean_ms": round(statistics.fmean(latencies) * 1000, 1) if latencies else 0.0,
+                "error_codes": self.errors.get(endpoint, {})
+            }
+        return report
+
+
+def make_document(index: int, words: int, rng: random.Random) -> bytes:
+    """Distinct plain-text document so uploads are not deduplicated"""
+    body = [f"Document {index}."]
+    for line in range(0, words, 20):
+        body.append(" ".join(rng.choice(UPLOAD_WORDS) for _ in range(min(20, words - line))))
+        if line % 200 == 180:
+            body.append("")
+    return "\n".join(body).encode()
+
+
+async def chat_request(client: httpx.AsyncClient, index: int, args) -> Optional[int]:
+    message = CHAT_MESSAGES[index % len(CHAT_MESSAGES)]
+    if not args.repeat:
+        # A unique suffix defeats the response cache so every request reaches the model
+        message = f"{message} (request {index})"
+    response = await client.post("/api/chat", json={"message": message})
+    return response.status_code
+
+
+async def upload_request(client: httpx.AsyncClient, index: int, args, rng: random.Random) -> Optional[int]:
+    content = make_document(0 if args.repeat else index, args.upload_words, rng)
+    response = await client.post(
+        "/api/upload", files={"file": (f"loadtest-{index}.txt", content, "text/plain")}
+    )
+    return response.status_code
+
+
+async def run(client: httpx.AsyncClient, args) -> Dict[str, Dict[str, float]]:
+    recorder = Recorder()
+    rng = random.Random(args.seed)
+    counter = iter(range(sys.maxsize))
+    deadline = time.perf_counter() + args.duration if args.duration else None
+
+    def next_index() -> Optional[int]:
+        index = next(counter)
+        if deadline is not None:
+            return index if time.perf_counter() < deadline else None
+        return index if index < args.requests else None
+
+    async def worker():
+        while (index := next_index()) is not None:
+            if args.scenario == "mixed":
+                endpoint = "upload" if rng.random() < args.upload_share else "chat"
+            else:
+                endpoint = args.scenario
+            started = time.perf_counter()
+            try:
+                if endpoint == "chat":
+                    status = await chat_request(client, index, args)
+                else:
+                    status = await upload_request(client, index, args, rng)
+            except httpx.HTTPError:
+                status = None
+            recorder.record(f"/api/{endpoint}", time.perf_counter() - started, status)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+    return recorder.summary(time.perf_counter() - started)
+
+
+async def main(args) -> Dict[str, Dict[str, float]]:
+    timeout = httpx.Timeout(args.timeout)
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    if args.url:
+        async with httpx.AsyncClient(base_url=args.url, timeout=timeout, limits=limits) as client:
+            return await run(client, args)
+
+    from app.main import app
+    transport = httpx.ASGITransport(app=app)
+    # ASGITransport does not send lifespan events; run startup (upload job runners, outbox) and shutdown here
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://loadtest", timeout=timeout) as client:
+            return await run(client, args)
+
+
+def check_thresholds(report: Dict[str, Dict[str, float]], args) -> List[str]:
+    failures = []
+    for endpoint, stats in report.items():
+        for field, limit in (("p95_ms", args.max_p95_ms), ("p99_ms", args.max_p99_ms), ("error_rate", args.max_error_rate)):
+            if limit is not None and stats[field] > limit:
+                failures.append(f"{endpoint} {field} {stats[field]} > {limit}")
+        if args.min_rps is not None and stats["rps"] < args.min_rps:
+            failures.append(f"{endpoint} rps {stats['rps']} < {args.min_rps}")
+    return failures
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", help="Base URL of a running server (default: run the app in-process)")
+    parser.add_argument("--scenario", choices=("chat", "upload", "mixed"), default="mixed")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=500, help="Total requests (ignored with --duration)")
+    parser.add_argument("--duration", type=float, help="Run for this many seconds instead of a fixed request count")
+    parser.add_argument("--upload-share", type=float, default=0.2, help="Share of uploads in the mixed scenario")
+    parser.add_argument("--upload-words", type=int, default=2000, help="Words per generated upload")
+    parser.add_argument("--repeat", action="store_true", help="Reuse identical messages/files to exercise caches")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--timeout", type=float, default=60.0, help="Per-request timeout in seconds")
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    parser.add_argument("--max-p95-ms", type=float)
+    parser.add_argument("--max-p99-ms", type=float)
+    parser.add_argument("--max-error-rate", type=float)
+    parser.add_argument("--min-rps", type=float)
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    if not args.url:
+        # In-process runs never need the network or real credentials
+        os.environ.setdefault("LLM_BACKEND", "fake")
+        # Every simulated user shares one address, so per-client limits would cap the run
+        os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+        os.environ.setdefault("UPLOAD_DIR", tempfile.mkdtemp(prefix="loadtest-uploads-"))
+        os.environ.setdefault("UPLOAD_JOBS_DB_PATH", os.path.join(tempfile.mkdtemp(prefix="loadtest-jobs-"), "jobs.db"))
+
+    report = asyncio.run(main(args))
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print(f"{'endpoint':<14}{'requests':>9}{'errors':>8}{'rps':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}")
+        for endpoint, stats in report.items():
+            print(f"{endpoint:<14}{stats['requests']:>9}{stats['errors']:>8}{stats['rps']:>9}"
+                  f"{stats['p50_ms']:>9}{stats['p95_ms']:>9}{stats['p99_ms']:>9}")
+
+    failures = check_thresholds(report, args)
+    for failure in failures:
+        print(f"FAIL: {failure}", file=sys.stderr)
+    sys.exit(1 if failures else 0)
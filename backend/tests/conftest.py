@@ -0,0 +1,39 @@
+"""Shared test setup: offline model backend and throwaway state paths.
+
+The environment is set before app.config is imported, so every store the
+app builds during the tests lives in a temporary directory.
+"""
+import asyncio
+import os
+import tempfile
+
+import httpx
+import pytest
+
+_state = tempfile.mkdtemp(prefix="backend-tests-")
+os.environ.setdefault("LLM_BACKEND", "fake")
+os.environ.setdefault("STARTUP_WARMUP", "false")
+os.environ.setdefault("UPLOAD_DIR", os.path.join(_state, "uploads"))
+os.environ.setdefault("UPLOAD_JOBS_DB_PATH", os.path.join(_state, "jobs.db"))
+os.environ.setdefault("STATE_DB_PATH", os.path.join(_state, "state.db"))
+os.environ.setdefault("OUTBOX_DB_PATH", os.path.join(_state, "outbox.db"))
+os.environ.setdefault("CONVERSATION_DB_PATH", os.path.join(_state, "conversations.db"))
+os.environ.setdefault("RETRIEVAL_INDEX_DIR", os.path.join(_state, "retrieval"))
+
+
+@pytest.fixture
+def status_error():
+    """Build the openai SDK error a deployment answers with for a status code"""
+    import openai
+    errors = {404: openai.NotFoundError, 400: openai.BadRequestError, 500: openai.InternalServerError}
+
+    def build(status_code: int) -> Exception:
+        response = httpx.Response(status_code, request=httpx.Request("POST", "https://example.invalid"))
+        return errors[status_code](f"HTTP {status_code}", response=response, body=None)
+    return build
+
+
+@pytest.fixture
+def run():
+    """Run a coroutine to completion on a fresh event loop"""
+    return asyncio.run
@@ -0,0 +1,158 @@
+import asyncio
+import os
+import time
+
+import pytest
+
+from app import admission
+from app.admission import AdmissionController, AdmissionRejected, MemoryBuckets, SQLiteBuckets
+
+
+class Clock:
+    """Stands in for the time module inside app.admission, moved on by hand"""
+
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+    def time(self) -> float:
+        return self.now
+
+    def perf_counter(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(admission, "time", clock)
+    return clock
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def buckets(request, tmp_path):
+    if request.param == "memory":
+        return MemoryBuckets()
+    return SQLiteBuckets(os.path.join(tmp_path, "state.db"))
+
+
+def test_bucket_refills_at_its_rate(buckets, clock):
+    # Two requests of burst, refilling one per second
+    costs = [("requests:alice", 2, 1.0, 1)]
+    assert buckets.acquire(costs) == 0
+    assert buckets.acquire(costs) == 0
+    assert buckets.acquire(costs) == pytest.approx(1.0)
+
+    clock.now += 0.5
+    assert buckets.acquire(costs) == pytest.approx(0.5)
+    clock.now += 0.5
+    assert buckets.acquire(costs) == 0
+
+    # Refilling stops at capacity
+    clock.now += 60
+    assert buckets.acquire(costs) == 0
+    assert buckets.acquire(costs) == 0
+    assert buckets.acquire(costs) > 0
+
+
+def test_costs_are_taken_all_or_nothing(buckets, clock):
+    requests = ("requests:alice", 10, 1.0, 1)
+    tokens = ("tokens:alice", 100, 10.0, 80)
+    assert buckets.acquire([requests, tokens]) == 0
+    # The token bucket is short by 60, so neither bucket is charged
+    assert buckets.acquire([requests, tokens]) == pytest.approx(6.0)
+    clock.now += 6
+    assert buckets.acquire([requests, tokens]) == 0
+    assert buckets.acquire([requests]) == 0
+
+
+def test_clients_have_separate_buckets(buckets, clock):
+    assert buckets.acquire([("requests:alice", 1, 1.0, 1)]) == 0
+    assert buckets.acquire([("requests:alice", 1, 1.0, 1)]) > 0
+    assert buckets.acquire([("requests:bob", 1, 1.0, 1)]) == 0
+
+
+def test_queued_request_is_admitted_once_its_bucket_refills(buckets, run):
+    # One request of burst, refilling ten per second
+    controller = AdmissionController(buckets, requests_per_minute=600, request_burst=1, tokens_per_minute=0,
+                                     queue_per_client=1, max_wait_seconds=2)
+
+    async def scenario():
+        await controller.admit("alice")
+        start = time.perf_counter()
+        waiting = asyncio.ensure_future(controller.admit("alice"))
+        await asyncio.sleep(0.01)
+        # Alice already has a request waiting
+        with pytest.raises(AdmissionRejected):
+            await controller.admit("alice")
+        await waiting
+        return time.perf_counter() - start
+
+    assert 0.05 < run(scenario()) < 1.0
+    assert controller.stats()["waiting"] == 0
+
+
+def test_wait_beyond_the_limit_is_rejected_with_retry_after(run):
+    controller = AdmissionController(MemoryBuckets(), requests_per_minute=1, request_burst=1, tokens_per_minute=0,
+                                     max_wait_seconds=5)
+
+    async def scenario():
+        await controller.admit("alice")
+        await controller.admit("alice")
+
+    with pytest.raises(AdmissionRejected) as rejected:
+        run(scenario())
+    assert rejected.value.retry_after == pytest.approx(60, rel=0.01)
+
+
+def test_refund_gives_tokens_back_up_to_capacity(buckets, clock):
+    costs = [("tokens:alice", 100, 1.0, 80)]
+    assert buckets.acquire(costs) == 0
+    assert buckets.acquire(costs) > 0
+    buckets.refund(costs)
+    assert buckets.acquire(costs) == 0
+    buckets.refund(costs)
+    buckets.refund(costs)
+    # Never above capacity
+    assert buckets.acquire(costs) == 0
+    assert buckets.acquire(costs) > 0
+
+
+class SlowBuckets(MemoryBuckets):
+    """Memory buckets whose take() is slow after the first few calls, recording what is given back"""
+
+    def __init__(self, fast_calls: int, delay: float):
+        super().__init__()
+        self.fast_calls = fast_calls
+        self.delay = delay
+        self.refunded = []
+
+    async def take(self, costs):
+        if self.fast_calls:
+            self.fast_calls -= 1
+        else:
+            await asyncio.sleep(self.delay)
+        return self.acquire(costs)
+
+    async def give_back(self, costs):
+        self.refunded.append(costs)
+        await super().give_back(costs)
+
+
+def test_tokens_taken_for_a_waiter_that_timed_out_are_given_back(run):
+    # admit() takes quickly twice; the scheduler's take() then outlasts the waiter's patience
+    buckets = SlowBuckets(fast_calls=2, delay=0.3)
+    controller = AdmissionController(buckets, requests_per_minute=600, request_burst=1, tokens_per_minute=0,
+                                     max_wait_seconds=0.2)
+
+    async def scenario():
+        await controller.admit("alice")
+        with pytest.raises(AdmissionRejected):
+            await controller.admit("alice")
+        await asyncio.sleep(0.2)
+
+    run(scenario())
+    assert buckets.refunded == [controller._costs("alice", 0)]
+    assert controller.stats()["waiting"] == 0
@@ -0,0 +1,62 @@
+import pytest
+
+from app.agents import AgentOrchestrator
+from app.config import settings
+from app.fake_llm import FakeLLMBackend
+from app.llm import LLMClient
+
+
+class MissingSmallDeployment(FakeLLMBackend):
+    """Fake backend without the small deployment: calls to it answer 404"""
+
+    def __init__(self, small: str, not_found):
+        super().__init__(latency_distribution="constant", latency_ms=0, tokens_per_second=0)
+        self.small = small
+        self.not_found = not_found
+        self.models = []
+
+    async def create(self, **kwargs):
+        self.models.append(kwargs["model"])
+        if kwargs["model"] == self.small:
+            raise self.not_found(404)
+        return await super().create(**kwargs)
+
+
+@pytest.fixture
+def cascade(monkeypatch):
+    monkeypatch.setattr(settings, "cascade_enabled", True)
+    monkeypatch.setattr(settings, "cascade_small_deployment", "gpt-4o-mini")
+    monkeypatch.setattr(settings, "response_cache_enabled", False)
+    monkeypatch.setattr(settings, "coalescing_enabled", False)
+
+
+def test_cascade_is_off_by_default():
+    assert settings.cascade_enabled is False
+    assert settings.cascade_small_deployment == ""
+
+
+def test_missing_small_deployment_is_skipped_after_the_first_404(cascade, status_error, run):
+    orchestrator = AgentOrchestrator()
+    backend = MissingSmallDeployment("gpt-4o-mini", status_error)
+    orchestrator.llm = LLMClient(backend)
+
+    first = run(orchestrator.chat("What is the vacation policy?"))
+    small, large = first.metadata["tiers"]
+    assert (small["tier"], small["escalated"], large["tier"]) == ("small", "error", "large")
+    assert orchestrator.small_tier_missing
+
+    second = run(orchestrator.chat("Can I work remotely?"))
+    assert [attempt["tier"] for attempt in second.metadata["tiers"]] == ["large"]
+    assert backend.models.count("gpt-4o-mini") == 1
+    assert orchestrator.llm.breaker("gpt-4o-mini").failures == 1
+
+
+def test_templates_answer_without_a_small_deployment(cascade, monkeypatch, run):
+    monkeypatch.setattr(settings, "cascade_small_deployment", "")
+    orchestrator = AgentOrchestrator()
+    orchestrator.llm = LLMClient(FakeLLMBackend(latency_distribution="constant", latency_ms=0, tokens_per_second=0))
+
+    greeting = run(orchestrator.chat("Hello there!"))
+    assert greeting.metadata["model_tier"] == "template"
+    question = run(orchestrator.chat("What is the vacation policy?"))
+    assert [attempt["tier"] for attempt in question.metadata["tiers"]] == ["large"]
@@ -0,0 +1,24 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from app.conversations import SQLiteConversationStore
+
+
+def test_concurrent_appends_from_several_workers_are_all_kept(tmp_path):
+    path = os.path.join(tmp_path, "conversations.db")
+    # One store per worker process, all sharing the database file
+    stores = [SQLiteConversationStore(path, token_budget=100_000, max_conversations=100, ttl_seconds=3600)
+              for _ in range(4)]
+
+    def append(worker: int):
+        for turn in range(25):
+            stores[worker]._append_sync("conv-1", [{"role": "user", "content": f"worker {worker} turn {turn}"}])
+
+    with ThreadPoolExecutor(len(stores)) as pool:
+        list(pool.map(append, range(len(stores))))
+
+    history = stores[0]._get_history_sync("conv-1")
+    assert len(history) == 100
+    assert {message["content"] for message in history} == {
+        f"worker {worker} turn {turn}" for worker in range(4) for turn in range(25)
+    }
@@ -0,0 +1,78 @@
+import asyncio
+from typing import Dict, List
+
+from app.documents import DocumentStore
+
+
+def chunks_of(*texts: str) -> List[Dict]:
+    return [{"section": number, "chunk": number, "text": text} for number, text in enumerate(texts)]
+
+
+class Source:
+    """Stands in for the shared UploadStore: files each worker process has uploaded"""
+
+    def __init__(self):
+        self.files: Dict[str, Dict[str, str]] = {}
+        self.chunks: Dict[str, List[Dict]] = {}
+
+    def conversation_files(self, conversation_id: str) -> Dict[str, str]:
+        return dict(self.files.get(conversation_id, {}))
+
+    def load_chunks(self, filename: str, sha256: str):
+        return self.chunks.get(sha256)
+
+
+def test_files_uploaded_elsewhere_are_picked_up_replaced_and_removed(run):
+    source = Source()
+    store = DocumentStore(max_conversations=10, source=source, sync_seconds=0)
+    source.files["conv-1"] = {"policy.txt": "v1", "notes.txt": "n1"}
+    source.chunks["v1"] = chunks_of("Employees get fifteen vacation days", "Parking permits are free")
+    source.chunks["n1"] = chunks_of("Remote work is allowed two days a week")
+
+    async def scenario():
+        assert await store.has_documents("conv-1")
+        hits = await store.search("conv-1", "vacation days", 1)
+        assert (hits[0]["filename"], hits[0]["chunk"]) == ("policy.txt", 0)
+
+        source.files["conv-1"] = {"policy.txt": "v2"}
+        source.chunks["v2"] = chunks_of("Employees get twenty vacation days")
+        hits = await store.search("conv-1", "vacation remote parking", 5)
+        return hits
+
+    hits = run(scenario())
+    assert [(hit["filename"], hit["text"]) for hit in hits] == [("policy.txt", "Employees get twenty vacation days")]
+
+
+def test_searches_keep_the_previous_index_while_a_file_is_indexed(run):
+    store = DocumentStore(max_conversations=10)
+    texts = [f"passage {number} about travel expenses and hotel limits" for number in range(3000)]
+
+    async def scenario():
+        await store._replace_file("conv-1", "old.txt", chunks_of("The hotel limit is 200 dollars"))
+        replacing = asyncio.ensure_future(store._replace_file("conv-1", "new.txt", chunks_of(*texts)))
+        await asyncio.sleep(0)
+        # The loop is free to answer from the installed index while the new one is built
+        during = await store.search("conv-1", "hotel limit", 10)
+        await replacing
+        after = await store.search("conv-1", "hotel limit", 10)
+        return during, after
+
+    during, after = run(scenario())
+    assert [hit["filename"] for hit in during] == ["old.txt"]
+    assert {hit["filename"] for hit in after} == {"old.txt", "new.txt"}
+
+
+def test_reuploading_a_file_replaces_its_chunks(run):
+    store = DocumentStore(max_conversations=1)
+
+    async def scenario():
+        await store.add("conv-1", "policy.txt", chunks_of("Old mileage rate", "Old hotel limit"), "v1")
+        await store.add("conv-1", "policy.txt", chunks_of("New mileage rate"), "v2")
+        hits = await store.search("conv-1", "mileage hotel", 5)
+        # Only the most recent conversation is kept
+        await store.add("conv-2", "other.txt", chunks_of("Anything"))
+        return hits, await store.has_documents("conv-1")
+
+    hits, kept = run(scenario())
+    assert [hit["text"] for hit in hits] == ["New mileage rate"]
+    assert not kept
@@ -0,0 +1,112 @@
+import asyncio
+import os
+import time
+
+import pytest
+
+from app.jobs import JobQueue, JobQueueFullError, JobStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    return JobStore(os.path.join(tmp_path, "jobs.db"))
+
+
+def queue_for(store: JobStore, workers: int = 1, max_pending: int = 4) -> JobQueue:
+    return JobQueue(store, stages=("extract", "analyze"), workers=workers, max_pending=max_pending,
+                    poll_seconds=0.05, retention_seconds=3600)
+
+
+async def wait_finished(queue: JobQueue, job_id: str):
+    async for job in queue.watch(job_id):
+        last = job
+    return last
+
+
+def test_job_runs_its_stages_and_completes(store, run):
+    async def handler(job, payload, progress):
+        async with progress.stage("extract"):
+            pass
+        async with progress.stage("analyze"):
+            pass
+        return {"chunks": payload["chunks"]}
+
+    async def scenario():
+        queue = queue_for(store)
+        queue.start(handler)
+        job = await queue.submit("conv-1", "notes.txt", {"chunks": 3}, {"receive": 1.0})
+        finished = await wait_finished(queue, job["id"])
+        await queue.stop()
+        return finished
+
+    job = run(scenario())
+    assert job["status"] == "completed"
+    assert job["progress"] == 1.0
+    assert job["result"] == {"chunks": 3}
+    assert {"receive", "queued", "extract", "analyze", "total"} <= set(job["timings_ms"])
+
+
+def test_cancel_stops_running_and_queued_jobs(store, run):
+    started = asyncio.Event()
+
+    async def handler(job, payload, progress):
+        async with progress.stage("extract"):
+            started.set()
+            await asyncio.sleep(30)
+        return {}
+
+    async def scenario():
+        queue = queue_for(store, workers=1)
+        queue.start(handler)
+        running = await queue.submit("conv-1", "a.txt", {}, {})
+        queued = await queue.submit("conv-1", "b.txt", {}, {})
+        await started.wait()
+        assert (await queue.cancel(queued["id"]))["status"] == "cancelled"
+        await queue.cancel(running["id"])
+        finished = await wait_finished(queue, running["id"])
+        await queue.stop()
+        return finished
+
+    assert run(scenario())["status"] == "cancelled"
+    assert store.stats()["cancelled"] == 2
+
+
+def test_full_queue_rejects_new_jobs(store, run):
+    async def handler(job, payload, progress):
+        await asyncio.sleep(30)
+
+    async def scenario():
+        queue = queue_for(store, workers=1, max_pending=1)
+        queue.start(handler)
+        await queue.submit("conv-1", "a.txt", {}, {})
+        await asyncio.sleep(0.05)  # the runner takes the first job
+        await queue.submit("conv-1", "b.txt", {}, {})
+        assert queue.full()
+        with pytest.raises(JobQueueFullError):
+            await queue.submit("conv-1", "c.txt", {}, {})
+        await queue.stop()
+
+    run(scenario())
+    # Shutdown cancels the running job and fails the queued one rather than leaving them unfinished
+    stats = store.stats()
+    assert (stats["cancelled"], stats["failed"], stats["queued"], stats["running"]) == (1, 1, 0, 0)
+
+
+def test_orphaned_and_expired_jobs_are_cleaned_up(store):
+    orphan = store.create("conv-1", "a.txt", {})
+    store.update(orphan["id"], owner="999999999:gone")
+    done = store.create("conv-1", "b.txt", {})
+    store.update(done["id"], status="completed")
+    mine = store.create("conv-1", "c.txt", {})
+
+    assert store.fail_orphans() == 1
+    assert store.get(orphan["id"])["status"] == "failed"
+    assert store.get(mine["id"])["status"] == "queued"
+    assert store.request_cancel(done["id"])["cancel_requested"] is False
+
+    assert store.prune(3600) == 0
+    time.sleep(0.01)
+    # Both finished jobs go; the unfinished one stays
+    assert store.prune(0) == 2
+    assert store.get(done["id"]) is None
+    assert store.get(mine["id"]) is not None
@@ -0,0 +1,117 @@
+import asyncio
+
+import pytest
+
+from app.config import settings
+from app.fake_llm import FakeLLMBackend
+from app.llm import CircuitBreaker, LLMClient, LLMUnavailableError
+
+MESSAGES = [{"role": "user", "content": "What is the vacation policy?"}]
+
+
+class ScriptedBackend(FakeLLMBackend):
+    """Fake backend whose next calls raise the scripted errors, or hang on "hang" until cancelled"""
+
+    def __init__(self, *outcomes):
+        super().__init__(latency_distribution="constant", latency_ms=0, tokens_per_second=0)
+        self.outcomes = list(outcomes)
+        self.started = asyncio.Event()
+
+    async def create(self, **kwargs):
+        self.started.set()
+        outcome = self.outcomes.pop(0) if self.outcomes else None
+        if outcome == "hang":
+            await asyncio.Event().wait()
+        if isinstance(outcome, Exception):
+            raise outcome
+        return await super().create(**kwargs)
+
+
+def open_breaker(client: LLMClient, deployment: str = "gpt-4o") -> CircuitBreaker:
+    """Open the deployment's circuit and let its reset period pass, so the next call is the probe"""
+    breaker = client.breaker(deployment)
+    for _ in range(breaker.failure_threshold):
+        breaker.record_failure()
+    breaker.opened_at -= breaker.reset_seconds
+    assert breaker.state == "half_open"
+    return breaker
+
+
+def test_breaker_opens_after_consecutive_failures():
+    breaker = CircuitBreaker(failure_threshold=2, reset_seconds=30)
+    breaker.record_failure()
+    assert breaker.state == "closed"
+    breaker.record_failure()
+    assert breaker.state == "open"
+    with pytest.raises(LLMUnavailableError) as raised:
+        breaker.before_call()
+    assert raised.value.retry_after > 0
+
+
+def test_half_open_probe_success_closes_circuit(run):
+    client = LLMClient(ScriptedBackend())
+    breaker = open_breaker(client)
+
+    response = run(client.chat_completion(model="gpt-4o", messages=MESSAGES))
+
+    assert response.choices[0].message.content
+    assert breaker.state == "closed"
+    assert breaker.failures == 0
+
+
+def test_half_open_lets_one_probe_through_and_reopens_on_failure(run, status_error, monkeypatch):
+    monkeypatch.setattr(settings, "llm_max_retries", 0)
+    backend = ScriptedBackend("hang")
+    client = LLMClient(backend)
+    breaker = open_breaker(client)
+
+    async def scenario():
+        probe = asyncio.ensure_future(client.chat_completion(model="gpt-4o", messages=MESSAGES))
+        await backend.started.wait()
+        # While the probe is out, everyone else is turned away
+        with pytest.raises(LLMUnavailableError):
+            await client.chat_completion(model="gpt-4o", messages=MESSAGES)
+        probe.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await probe
+
+    run(scenario())
+    # A cancelled probe proved nothing: the circuit is open again, for a full reset period
+    assert breaker.state == "open"
+
+    breaker.opened_at -= breaker.reset_seconds
+    backend.outcomes = [status_error(500)]
+    with pytest.raises(LLMUnavailableError):
+        run(client.chat_completion(model="gpt-4o", messages=MESSAGES))
+    assert breaker.state == "open"
+
+
+def test_caller_cancelling_a_closed_call_is_not_a_failure(run):
+    backend = ScriptedBackend("hang")
+    client = LLMClient(backend)
+
+    async def scenario():
+        call = asyncio.ensure_future(client.chat_completion(model="gpt-4o", messages=MESSAGES))
+        await backend.started.wait()
+        call.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await call
+
+    run(scenario())
+    assert client.breaker("gpt-4o").failures == 0
+    assert client.scheduler("gpt-4o").in_flight == 0
+
+
+def test_missing_deployment_counts_as_failure_but_bad_request_does_not(run, status_error):
+    client = LLMClient(ScriptedBackend(status_error(404), status_error(400)))
+    breaker = client.breaker("gpt-4o")
+
+    with pytest.raises(Exception) as missing:
+        run(client.chat_completion(model="gpt-4o", messages=MESSAGES))
+    assert missing.value.status_code == 404
+    assert breaker.failures == 1
+
+    with pytest.raises(Exception) as bad_request:
+        run(client.chat_completion(model="gpt-4o", messages=MESSAGES))
+    assert bad_request.value.status_code == 400
+    assert breaker.failures == 0
@@ -0,0 +1,85 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from app.agents import AgentOrchestrator
+from app.outbox import Outbox, OutboxDispatcher, StubBackend, new_ulid
+
+
+@pytest.fixture
+def outbox(tmp_path):
+    return Outbox(os.path.join(tmp_path, "outbox.db"))
+
+
+def dispatcher_for(outbox: Outbox, backend: StubBackend) -> OutboxDispatcher:
+    return OutboxDispatcher(outbox, backend, batch_size=10, poll_seconds=1, max_attempts=3,
+                            backoff_base_seconds=0, backoff_max_seconds=0, retention_seconds=3600)
+
+
+def test_same_idempotency_key_is_recorded_once(outbox):
+    first, created = outbox.record("it_ticket", "conv-1:call_1", {"title": "VPN down"})
+    assert created
+    again, created = outbox.record("it_ticket", "conv-1:call_1", {"title": "VPN down (retried)"})
+    assert not created
+    assert again["id"] == first["id"]
+    assert again["payload"] == {"title": "VPN down"}
+    assert outbox.stats()["pending"] == 1
+
+
+def test_tool_calls_without_an_id_share_a_key_per_conversation():
+    call = {"id": "", "name": "create_it_ticket", "arguments": '{"title": "VPN down"}'}
+    key = AgentOrchestrator._idempotency_key("conv-1", call)
+    assert AgentOrchestrator._idempotency_key("conv-1", dict(call)) == key
+    assert AgentOrchestrator._idempotency_key("conv-2", call) != key
+    assert AgentOrchestrator._idempotency_key("conv-1", {**call, "id": "call_1"}) == "conv-1:call_1"
+
+
+def test_entries_are_delivered_once(outbox, run):
+    backend = StubBackend(latency_ms=0)
+    dispatcher = dispatcher_for(outbox, backend)
+    entry, _ = outbox.record("it_ticket", "conv-1:call_1", {"title": "VPN down"})
+    outbox.record("it_ticket", "conv-1:call_1", {"title": "VPN down"})
+
+    assert run(dispatcher.dispatch_once()) == 1
+    assert run(dispatcher.dispatch_once()) == 0
+    delivered = outbox.get(entry["id"])
+    assert delivered["status"] == "delivered"
+    assert delivered["result"]["remote_id"] == "it_ticket-1"
+    assert backend.stats()["entries"] == 1
+
+
+def test_redelivery_after_a_failed_batch_is_not_applied_twice(outbox, run):
+    backend = StubBackend(latency_ms=0)
+    dispatcher = dispatcher_for(outbox, backend)
+    entry, _ = outbox.record("expense_report", "conv-1:call_2", {"amount": 120})
+    # The remote side applied the entry but the response was lost
+    remote = run(backend.deliver("expense_report", [outbox.get(entry["id"])]))[0]
+
+    assert run(dispatcher.dispatch_once()) == 1
+    delivered = outbox.get(entry["id"])
+    assert delivered["result"] == remote
+    assert delivered["attempts"] == 1
+    assert backend.stats()["duplicates"] == 1
+
+
+def test_failed_batches_are_retried_then_given_up(outbox, run):
+    backend = StubBackend(latency_ms=0, failure_rate=1.0)
+    dispatcher = dispatcher_for(outbox, backend)
+    entry, _ = outbox.record("it_ticket", "conv-1:call_3", {"title": "Printer jam"})
+
+    for attempt in range(1, 4):
+        assert run(dispatcher.dispatch_once()) == 1
+        assert outbox.get(entry["id"])["attempts"] == attempt
+    failed = outbox.get(entry["id"])
+    assert failed["status"] == "failed"
+    assert "unavailable" in failed["last_error"]
+
+
+def test_ulids_are_unique_and_ordered_across_threads():
+    with ThreadPoolExecutor(8) as pool:
+        batches = list(pool.map(lambda _: [new_ulid() for _ in range(500)], range(8)))
+    ids = [ulid for batch in batches for ulid in batch]
+    assert len(set(ids)) == len(ids)
+    for batch in batches:
+        assert batch == sorted(batch)
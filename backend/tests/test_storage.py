@@ -0,0 +1,31 @@
+import hashlib
+import os
+
+from app.storage import UploadStore
+
+
+def commit(store: UploadStore, tmp_path, content: bytes, conversation_id: str, filename: str, **kwargs) -> str:
+    sha256 = hashlib.sha256(content).hexdigest()
+    temp_path = os.path.join(tmp_path, f"upload-{sha256}")
+    with open(temp_path, "wb") as f:
+        f.write(content)
+    store.commit(temp_path, sha256, len(content), conversation_id, filename, **kwargs)
+    store.put_extraction(sha256, ".txt", 200, [{"chunk": 0, "text": content.decode()}], None)
+    return sha256
+
+
+def test_eviction_removes_blobs_and_their_extractions_oldest_first(tmp_path):
+    store = UploadStore(os.path.join(tmp_path, "uploads"), max_bytes=350)
+    old = [commit(store, tmp_path, bytes([65 + n]) * 100, "conv-1", f"old-{n}.txt") for n in range(2)]
+    pinned = commit(store, tmp_path, b"p" * 100, "conv-2", "pinned.txt", pin_seconds=60)
+    newest = commit(store, tmp_path, b"n" * 200, "conv-3", "new.txt")
+
+    # The newest upload evicts both old blobs in one pass; the pinned one is kept although it is older
+    assert store.stats()["blobs"] == 2
+    for sha256 in old:
+        assert not os.path.exists(store.blob_path(sha256))
+        assert store.get_extraction(sha256, ".txt", 200) is None
+    for sha256 in (pinned, newest):
+        assert os.path.exists(store.blob_path(sha256))
+        assert store.get_extraction(sha256, ".txt", 200) is not None
+    assert store.conversation_files("conv-1") == {}
@@ -0,0 +1,42 @@
+import pytest
+
+from app.agents import AgentOrchestrator
+from app.config import settings
+from app.fake_llm import FakeLLMBackend
+from app.llm import LLMClient
+
+
+@pytest.fixture
+def orchestrator(monkeypatch):
+    monkeypatch.setattr(settings, "response_cache_enabled", False)
+    monkeypatch.setattr(settings, "coalescing_enabled", False)
+    orchestrator = AgentOrchestrator()
+    orchestrator.llm = LLMClient(FakeLLMBackend(latency_distribution="constant", latency_ms=0, tokens_per_second=0))
+    return orchestrator
+
+
+def collect(orchestrator: AgentOrchestrator, message: str, run):
+    async def scenario():
+        return [event async for event in orchestrator.chat_stream(message)]
+    return run(scenario())
+
+
+def test_stream_ends_with_done(orchestrator, run):
+    events = collect(orchestrator, "What is the vacation policy?", run)
+    assert any(event["event"] == "delta" for event in events)
+    assert events[-1]["event"] == "done"
+    assert not events[-1]["data"]["metadata"].get("error")
+
+
+def test_throttling_is_an_error_event_with_retry_after_not_answer_text(orchestrator, run):
+    breaker = orchestrator.llm.breaker(settings.azure_openai_deployment_name)
+    for _ in range(breaker.failure_threshold):
+        breaker.record_failure()
+
+    events = collect(orchestrator, "What is the vacation policy?", run)
+
+    assert not [event for event in events if event["event"] == "delta"]
+    error, done = events[-2:]
+    assert error["event"] == "error"
+    assert 0 < error["data"]["retry_after"] <= settings.llm_circuit_reset_seconds
+    assert done["event"] == "done" and done["data"]["metadata"]["error"]
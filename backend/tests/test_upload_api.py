@@ -0,0 +1,30 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from app.main import app
+
+
+@pytest.fixture(scope="module")
+def client():
+    # One client for the module: the app's background workers live on its event loop
+    with TestClient(app) as client:
+        yield client
+
+
+def test_malformed_content_length_is_a_bad_request(client):
+    response = client.post("/api/upload", files={"file": ("notes.txt", b"Vacation policy")},
+                           headers={"Content-Length": "lots"})
+    assert response.status_code == 400
+    assert "Content-Length" in response.json()["detail"]
+
+
+def test_upload_is_processed_as_a_background_job(client):
+    response = client.post("/api/upload", files={"file": ("notes.txt", b"Employees get 15 days PTO.")})
+    assert response.status_code == 200
+    job_id = response.json()["metadata"]["job_id"]
+    with client.stream("GET", f"/api/upload/{job_id}", headers={"Accept": "text/event-stream"}) as events:
+        for _ in events.iter_lines():
+            pass
+    job = client.get(f"/api/upload/{job_id}").json()
+    assert job["status"] == "completed"
+    assert job["result"]["metadata"]["chunks_indexed"] == 1
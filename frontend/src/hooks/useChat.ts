@@ -136,6 +136,24 @@ export const useChat = () => {
       
       setMessages(prev => [...prev, uploadMessage, analysisMessage]);
       
+      // The analysis runs in the background; replace the placeholder when the job finishes
+      const jobId = data.metadata?.job_id;
+      if (jobId) {
+        const events = new EventSource(`${API_BASE}/upload/${jobId}`);
+        events.addEventListener('done', (event) => {
+          events.close();
+          const job = JSON.parse((event as MessageEvent).data);
+          const result: ChatResponse | null = job.result;
+          setMessages(prev => prev.map(message => message.id !== analysisMessage.id ? message : {
+            ...message,
+            content: result ? result.message : `Sorry, the document could not be processed (${job.error || job.status}).`,
+            sources: result ? result.sources : message.sources,
+            metadata: result ? result.metadata : { ...message.metadata, job_status: job.status },
+          }));
+        });
+        events.onerror = () => events.close();
+      }
+      
     } catch (error) {
       console.error('Error uploading file:', error);
       